@@ -0,0 +1,58 @@
+# cache.py
+"""Versioned cache of serialized read responses.
+
+Each cached body remembers the version of every collection it was built
+from. Writes bump the version of the collections they touch, which makes
+exactly the dependent entries stale. ETags are content hashes, so every
+replica hands out the same tag for the same data and clients can revalidate
+against whichever node the gateway picks.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+
+class ResponseCache:
+
+    def __init__(self, max_entries: int = 1024):
+        self._versions: Dict[str, int] = {}
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple[int, ...], bytes, str]]" = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def bump(self, *collections: str):
+        """Invalidate everything built from any of ``collections``."""
+        with self._lock:
+            for c in collections:
+                self._versions[c] = self._versions.get(c, 0) + 1
+
+    def bump_all(self):
+        with self._lock:
+            for c in self._versions:
+                self._versions[c] += 1
+            self._entries.clear()
+
+    def version(self, collections: Tuple[str, ...]) -> Tuple[int, ...]:
+        return tuple(self._versions.get(c, 0) for c in collections)
+
+    def lookup(self, key: Hashable, collections: Tuple[str, ...]) -> Optional[Tuple[bytes, str]]:
+        """Cached (body, etag) if still current, else None."""
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None or hit[0] != self.version(collections):
+                return None
+            self._entries.move_to_end(key)
+            return hit[1], hit[2]
+
+    def store(self, key: Hashable, version: Tuple[int, ...], payload) -> Tuple[bytes, str]:
+        """Serialize ``payload`` (built at ``version``) and cache it."""
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        with self._lock:
+            self._entries[key] = (version, body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return body, etag
@@ -0,0 +1,177 @@
+# clock.py
+"""Hybrid logical clocks, and background clock synchronisation with the coordinator.
+
+A hybrid logical clock (HLC) timestamp is one integer: wall-clock
+milliseconds shifted left by LOGICAL_BITS, plus a counter in the low bits
+that orders events within a millisecond, or after a message from a node
+whose clock runs ahead. Each local event and outgoing message takes
+``HybridClock.now()``, and each incoming message is folded in with
+``observe``. Timestamps then never contradict causality (a reply is later
+than the request that caused it), stay close to real time, and need no
+network traffic of their own. A remote timestamp more than ``max_ahead``
+beyond the local clock is logged and ignored rather than adopted: one bad
+message would otherwise drag every later timestamp with it.
+
+The physical part is the local clock corrected by ``ClockSync``. Every
+``interval`` it estimates this node's offset from the coordinator the
+Cristian/NTP way: a few ``/time`` probes, keeping the one with the shortest
+round trip and assuming the server read its clock halfway through it. A
+least-squares line through the recent offsets gives the drift rate, so the
+correction keeps up with a fast or slow clock between syncs.
+"""
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import requests
+
+LOGICAL_BITS = 16
+SYNC_INTERVAL = 10.0
+SYNC_PROBES = 4
+SYNC_WINDOW = 8    # offset samples the drift estimate is fitted to
+SYNC_TIMEOUT = 0.5
+MAX_AHEAD = 5.0    # seconds a remote timestamp may lead the local clock by
+
+
+def wall_time(ts: int) -> float:
+    """The wall-clock part of an HLC timestamp, in seconds."""
+    return (ts >> LOGICAL_BITS) / 1000.0
+
+
+class HybridClock:
+
+    def __init__(self, physical: Callable[[], float] = time.time, max_ahead: float = MAX_AHEAD,
+                 log_prefix: str = ""):
+        self._physical = physical
+        self._max_ahead = int(max_ahead * 1000) << LOGICAL_BITS
+        self._log_prefix = log_prefix
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def _wall(self) -> int:
+        return int(self._physical() * 1000) << LOGICAL_BITS
+
+    def now(self) -> int:
+        """Timestamp for a local event or an outgoing message; strictly increasing."""
+        wall = self._wall()
+        with self._lock:
+            self._last = max(self._last + 1, wall)
+            return self._last
+
+    def observe(self, remote: int) -> int:
+        """Fold in a timestamp received from another node; the result is later than both.
+
+        A timestamp too far ahead of the local clock is not adopted, only logged.
+        """
+        wall = self._wall()
+        if remote > wall + self._max_ahead:
+            print(f"{self._log_prefix}Ignoring HLC timestamp {remote}: "
+                  f"{((remote - wall) >> LOGICAL_BITS) / 1000:.3f} s ahead of the local clock")
+            return self.now()
+        with self._lock:
+            self._last = max(self._last + 1, remote + 1, wall)
+            return self._last
+
+
+class ClockSync:
+    """Offset and drift of the local clock relative to the coordinator's, kept up to date in the background."""
+
+    def __init__(self, port: int, reference: Callable[[], Optional[int]], interval: float = SYNC_INTERVAL,
+                 probes: int = SYNC_PROBES, window: int = SYNC_WINDOW, timeout: float = SYNC_TIMEOUT,
+                 log_prefix: str = ""):
+        self.port = port
+        self._reference = reference  # port of the node to follow; None while unknown
+        self.interval = interval
+        self.probes = probes
+        self.timeout = timeout
+        self._log_prefix = log_prefix
+        self._samples = deque(maxlen=window)  # (local time, offset)
+        self._base = 0.0     # local time of the latest estimate
+        self._offset = 0.0   # seconds to add to the local clock at _base
+        self._drift = 0.0    # change in offset per second of local time
+        self._rtt: Optional[float] = None
+        self._synced_at: Optional[float] = None
+        self._following: Optional[int] = None  # node the samples were taken against
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="clock-sync", daemon=True)
+            self._thread.start()
+
+    def offset(self, local: Optional[float] = None) -> float:
+        local = time.time() if local is None else local
+        with self._lock:
+            return self._offset + self._drift * (local - self._base)
+
+    def physical(self) -> float:
+        """The local clock, corrected towards the coordinator's."""
+        local = time.time()
+        return local + self.offset(local)
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {"offset_ms": round(self._offset * 1000, 3), "drift_ppm": round(self._drift * 1e6, 2),
+                    "rtt_ms": round(self._rtt * 1000, 3) if self._rtt is not None else None,
+                    "samples": len(self._samples),
+                    "synced_ago": round(time.time() - self._synced_at, 1) if self._synced_at else None}
+
+    # ---------- Background loop ----------
+    def _run(self):
+        while True:
+            reference = self._reference()
+            if reference == self.port:
+                self._hold()
+            elif reference is not None:
+                try:
+                    self._sync(reference)
+                except (requests.RequestException, ValueError, KeyError):
+                    pass  # keep extrapolating from the last estimate
+            time.sleep(self.interval if self._synced_at or reference == self.port else 1.0)
+
+    def _hold(self):
+        """This node is the reference now: keep its current correction, stop extrapolating drift."""
+        local = time.time()
+        with self._lock:
+            self._offset = self._offset + self._drift * (local - self._base)
+            self._base = local
+            self._drift = 0.0
+            self._samples.clear()
+            self._following = self.port
+
+    def _sync(self, reference: int):
+        best = None
+        for _ in range(self.probes):
+            t0 = time.time()
+            r = requests.get(f"http://127.0.0.1:{reference}/time", timeout=self.timeout)
+            t1 = time.time()
+            r.raise_for_status()
+            if best is None or t1 - t0 < best[0]:
+                best = (t1 - t0, r.json()["time"], t1)
+        rtt, server, local = best
+        offset = server + rtt / 2 - local
+        with self._lock:
+            first = reference != self._following
+            if first:
+                self._samples.clear()  # drift against the old reference says nothing about this one
+                self._following = reference
+            self._samples.append((local, offset))
+            self._base, self._offset, self._rtt, self._synced_at = local, offset, rtt, local
+            self._drift = self._fit_drift()
+        if first:
+            print(f"{self._log_prefix}Clock synced with {reference}: offset {offset * 1000:+.3f} ms "
+                  f"(rtt {rtt * 1000:.3f} ms)")
+
+    def _fit_drift(self) -> float:
+        """Least-squares slope of offset over local time. Caller holds `_lock`."""
+        if len(self._samples) < 3:
+            return 0.0
+        n = len(self._samples)
+        mean_t = sum(t for t, _ in self._samples) / n
+        mean_o = sum(o for _, o in self._samples) / n
+        var = sum((t - mean_t) ** 2 for t, _ in self._samples)
+        if var == 0:
+            return 0.0
+        return sum((t - mean_t) * (o - mean_o) for t, o in self._samples) / var
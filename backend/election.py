@@ -0,0 +1,222 @@
+# election.py
+"""Coordinator election: heartbeat failure detection, leases and a bully election.
+
+The coordinator sends every peer a heartbeat each HEARTBEAT_INTERVAL. A
+heartbeat grants it a lease of LEASE_DURATION on that peer: while the lease
+holds, the peer takes the coordinator to be alive and will not start an
+election. When a peer's lease runs out it suspects the coordinator and runs
+an election:
+
+1. ask every peer, in parallel, for its term, log position and leader
+2. if a reachable coordinator still holds a lease, follow it
+3. otherwise the reachable node with the highest (last log term, log seq,
+   port) wins. This is the bully rule with the most up-to-date log ranked
+   first: a later term beats a longer log, so neither a restarted node nor
+   a deposed coordinator holding unreplicated writes from an older term can
+   take over with stale state. The winner starts a
+   new term and announces itself with an immediate heartbeat; the others
+   nudge it to do so at once.
+
+Terms only grow, and survive restarts in ``term_path``. A node that hears of
+a higher term, or of a stronger coordinator in the same term, steps down.
+The coordinator only takes writes while a majority of the group has renewed
+its lease (``has_majority_lease``), so a deposed one stops before anyone
+else can be elected. Everything runs on one background thread, so requests
+never wait on a probe, and a failed coordinator is replaced within
+LEASE_DURATION plus two probe rounds.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+
+HEARTBEAT_INTERVAL = 0.2
+LEASE_DURATION = 1.0
+PROBE_TIMEOUT = 0.25
+
+
+class Election:
+
+    def __init__(self, port: int, peers, last_seq: Callable[[], int],
+                 on_change: Callable[[Optional[int]], None], log_prefix: str = "",
+                 heartbeat_interval: float = HEARTBEAT_INTERVAL, lease_duration: float = LEASE_DURATION,
+                 probe_timeout: float = PROBE_TIMEOUT, clock: Optional[Callable[[], int]] = None,
+                 term_path: Optional[str] = None, last_term: Callable[[], int] = lambda: 0):
+        self.port = port
+        self.peers = list(peers)
+        self._last_seq = last_seq
+        self._last_term = last_term  # term of the last log entry
+        self._on_change = on_change
+        self._log_prefix = log_prefix
+        self.heartbeat_interval = heartbeat_interval
+        self.lease_duration = lease_duration
+        self.probe_timeout = probe_timeout
+        self._clock = clock  # stamps heartbeats, so followers' clocks keep up with the coordinator's
+        self._term_path = term_path
+        self.term = self._load_term()
+        self.leader: Optional[int] = None
+        self._lease_until = 0.0  # follower: the coordinator's lease on this node
+        self._acked_until = 0.0  # coordinator: lease renewed by a majority of the group
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.peers)), thread_name_prefix="election")
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="election", daemon=True)
+            self._thread.start()
+
+    def is_leader(self) -> bool:
+        return self.leader == self.port
+
+    def _log_position(self) -> Tuple[int, int]:
+        """(last log term, last log seq): how up to date this node's log is."""
+        return self._last_term(), self._last_seq()
+
+    def has_majority_lease(self) -> bool:
+        """Whether this node is the coordinator and a majority of the group renewed its lease lately."""
+        with self._lock:
+            return self.is_leader() and (not self.peers or time.monotonic() < self._acked_until)
+
+    def _load_term(self) -> int:
+        try:
+            with open(self._term_path, encoding="utf-8") as f:
+                return int(f.read())
+        except (TypeError, OSError, ValueError):
+            return 0
+
+    def _set_term(self, term: int):
+        """Caller holds `_lock`. Durable before anyone hears of the new term."""
+        if term == self.term:
+            return
+        self.term = term
+        if self._term_path:
+            tmp = self._term_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(str(term))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._term_path)
+
+    def _set_leader(self, leader: Optional[int]):
+        """Caller holds `_lock`."""
+        if leader != self.leader:
+            self.leader = leader
+            if leader is not None:
+                print(f"{self._log_prefix}Coordinator is {leader} (term {self.term})")
+            self._on_change(leader)
+
+    # ---------- Messages from peers ----------
+    def on_heartbeat(self, term: int, leader: int, seq: int, last_term: int = 0) -> Dict:
+        with self._lock:
+            stronger = self.is_leader() and term == self.term and \
+                (*self._log_position(), self.port) > (last_term, seq, leader)
+            if term < self.term or stronger:
+                return {"ok": False, "term": self.term, "leader": self.leader}
+            self._set_term(term)
+            self._lease_until = time.monotonic() + self.lease_duration
+            self._set_leader(leader)
+            return {"ok": True, "term": self.term}
+
+    def status(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            last_term, seq = self._log_position()
+            return {"port": self.port, "term": self.term, "leader": self.leader, "seq": seq, "last_term": last_term,
+                    "lease_valid": self.is_leader() or now < self._lease_until,
+                    "majority_lease": self.is_leader() and (not self.peers or now < self._acked_until)}
+
+    def nominate(self):
+        """A peer found this node the strongest candidate: elect now instead of waiting out the lease."""
+        with self._lock:
+            self._lease_until = 0.0
+        self._wake.set()
+
+    def suspect(self, port: int):
+        """Report a failed call to `port`; if it is the coordinator, re-check it now."""
+        with self._lock:
+            if port != self.leader or self.is_leader():
+                return
+            self._lease_until = 0.0
+        self._wake.set()
+
+    # ---------- Background loop ----------
+    def _run(self):
+        while True:
+            if self.is_leader():
+                self._send_heartbeats()
+                timeout = self.heartbeat_interval
+            else:
+                timeout = self._lease_until - time.monotonic()
+                if timeout <= 0:
+                    self._elect()
+                    continue
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def _post(self, port: int, path: str, payload: Optional[Dict] = None):
+        r = requests.post(f"http://127.0.0.1:{port}{path}", json=payload, timeout=self.probe_timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def _get(self, port: int, path: str):
+        r = requests.get(f"http://127.0.0.1:{port}{path}", timeout=self.probe_timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def _gather(self, fn, *args) -> Dict[int, Dict]:
+        """Call `fn(port, *args)` on every peer in parallel; replies of those that answered."""
+        futures = {self._pool.submit(fn, p, *args): p for p in self.peers}
+        done, _ = wait(futures, timeout=self.probe_timeout * 2)
+        return {futures[f]: f.result() for f in done if f.exception() is None}
+
+    def _send_heartbeats(self):
+        started = time.monotonic()
+        term = self.term
+        last_term, seq = self._log_position()
+        heartbeat = {"term": term, "leader": self.port, "seq": seq, "last_term": last_term}
+        if self._clock is not None:
+            heartbeat["hlc"] = self._clock()
+        replies = self._gather(self._post, "/election/heartbeat", heartbeat)
+        with self._lock:
+            if self.term != term or not self.is_leader():
+                return
+            for reply in replies.values():
+                if not reply["ok"] and (reply["term"] > self.term or reply.get("leader") not in (None, self.port)):
+                    print(f"{self._log_prefix}Stepping down: {reply.get('leader')} leads term {reply['term']}")
+                    self._set_term(max(self.term, reply["term"]))
+                    self._lease_until = 0.0
+                    self._set_leader(None)
+                    return
+            acks = 1 + sum(1 for reply in replies.values() if reply["ok"])
+            if acks * 2 > len(self.peers) + 1:
+                self._acked_until = started + self.lease_duration
+
+    def _elect(self):
+        replies = self._gather(self._get, "/election/status")
+        with self._lock:
+            self._set_term(max([self.term] + [st["term"] for st in replies.values()]))
+            live = [st["leader"] for st in replies.values()
+                    if st["lease_valid"] and st["leader"] in replies and replies[st["leader"]]["leader"] == st["leader"]]
+            if live:
+                self._lease_until = time.monotonic() + self.lease_duration
+                self._set_leader(live[0])
+                return
+            candidates = {p: (st.get("last_term", 0), st["seq"], p) for p, st in replies.items()}
+            candidates[self.port] = (*self._log_position(), self.port)
+            winner = max(candidates, key=candidates.get)
+            if winner == self.port:
+                self._set_term(self.term + 1)
+                self._acked_until = 0.0
+                print(f"{self._log_prefix}Elected coordinator for term {self.term} "
+                      f"(reachable: {sorted(candidates)})")
+                self._set_leader(self.port)
+                return
+            # wait for the winner's heartbeat; elect again if it does not come
+            self._lease_until = time.monotonic() + self.lease_duration
+            self._set_leader(None)
+        self._pool.submit(self._post, winner, "/election/nominate")
@@ -1,10 +1,17 @@
 # gateway.py
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import requests
-from typing import List, Optional
-import threading
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+import asyncio
+import httpx
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+import paging
+import sharding
 
 app = FastAPI(title="API Gateway")
 
@@ -18,248 +25,420 @@ app.add_middleware(
 )
 
 # ---------- Backend server list ----------
-BACKEND_PORTS = [8001, 8002, 8003]
+# MEDCARE_SHARDS (see sharding.py) splits the backends into shards, each with
+# its own coordinator; without it all backends form a single shard.
+SHARDS = sharding.load_shards() or [[8001, 8002, 8003]]
+BACKEND_PORTS = [p for group in SHARDS for p in group]
+SHARD_OF = {p: i for i, group in enumerate(SHARDS) for p in group}
+RING = sharding.HashRing(len(SHARDS))
+GATEWAY_PORT = int(os.environ.get("GATEWAY_PORT", 8004))
 rr_index = 0
-lock = threading.Lock()
-
-# ---------- Pydantic Models ----------
-class BuyItem(BaseModel):
-    medicine_id: int
-    quantity: int
-
-class BuyBulkRequest(BaseModel):
-    user_id: int
-    items: List[BuyItem]
-
-class BuyRequest(BaseModel):
-    name: str
-    medicine_id: int
-    quantity: int
-
-class SignupRequest(BaseModel):
-    username: str
-    password: str
-
-class LoginRequest(BaseModel):
-    username: str
-    password: str
-
-class BookRequest(BaseModel):
-    user_id: int
-    doctor_id: int
-    time_slot: str
-
-class ConsultRequest(BaseModel):
-    appointment_id: int
-    symptoms: List[str]
-
-class BuyPrescriptionRequest(BaseModel):
-    appointment_id: int
-
-class RatingRequest(BaseModel):
-    user_id: int
-    rating: int  # 1-5
-
-class RescheduleRequest(BaseModel):
-    new_time_slot: str
-# ---------- Helper Functions ----------
-def get_alive_server():
-    global rr_index
-    checked = 0
-    total_servers = len(BACKEND_PORTS)
-    while checked < total_servers:
-        with lock:
-            port = BACKEND_PORTS[rr_index]
-            rr_index = (rr_index + 1) % total_servers
+
+# ---------- Connection pool settings ----------
+# One keep-alive pool per backend; tune with environment variables.
+POOL_MAX_CONNECTIONS = int(os.environ.get("GATEWAY_POOL_MAX_CONNECTIONS", 100))
+POOL_MAX_KEEPALIVE = int(os.environ.get("GATEWAY_POOL_MAX_KEEPALIVE", 20))
+POOL_KEEPALIVE_EXPIRY = float(os.environ.get("GATEWAY_POOL_KEEPALIVE_EXPIRY", 30.0))
+CONNECT_TIMEOUT = float(os.environ.get("GATEWAY_CONNECT_TIMEOUT", 1.0))
+REQUEST_TIMEOUT = float(os.environ.get("GATEWAY_REQUEST_TIMEOUT", 5.0))
+POOL_TIMEOUT = float(os.environ.get("GATEWAY_POOL_TIMEOUT", 2.0))
+HEALTH_TIMEOUT = 1.0
+
+clients: Dict[int, httpx.AsyncClient] = {}
+
+@app.on_event("startup")
+async def open_backend_pools():
+    limits = httpx.Limits(max_connections=POOL_MAX_CONNECTIONS,
+                          max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                          keepalive_expiry=POOL_KEEPALIVE_EXPIRY)
+    timeout = httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT, pool=POOL_TIMEOUT)
+    for port in BACKEND_PORTS:
+        clients[port] = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=timeout)
+    asyncio.create_task(health_loop())
+
+@app.on_event("shutdown")
+async def close_backend_pools():
+    for client in clients.values():
+        await client.aclose()
+    clients.clear()
+
+# ---------- Route table ----------
+# How each backend route is treated by the proxy. Routes not listed here are
+# still forwarded: GET/HEAD count as reads, anything else as a write. Reads
+# are safe to retry on another backend if the first one cannot be reached.
+#
+# The last column says which shard serves the route (it only matters in
+# sharded mode): "any", "global" (medicines, sales, ratings), "all" (asked of
+# every shard and merged, see FANOUT_MERGE), "split" (a batch split by shard),
+# or "<key>:<path|body|query>.<field>" for the shard owning that key.
+ROUTE_TABLE = [
+    ("POST", "/signup", "write", "user:body.username"),
+    ("POST", "/login", "read", "user:body.username"),
+    ("GET", "/users/{user_id}", "read", "id:path.user_id"),
+    ("GET", "/doctors", "read", "any"),
+    ("GET", "/doctors/{doctor_id}/available", "read", "doctor:path.doctor_id"),
+    ("GET", "/doctors/availability", "read", "all"),
+    ("GET", "/doctors/next_available", "read", "all"),
+    ("POST", "/ratings/{doctor_id}", "write", "global"),
+    ("GET", "/ratings/{doctor_id}", "read", "global"),
+    ("POST", "/book", "write", "doctor:body.doctor_id"),
+    ("GET", "/appointments/{appointment_id}", "read", "id:path.appointment_id"),
+    ("DELETE", "/appointments/{appointment_id}", "write", "id:path.appointment_id"),
+    ("POST", "/appointments/{appointment_id}/reschedule", "write", "id:path.appointment_id"),
+    ("POST", "/consult", "write", "id:body.appointment_id"),
+    ("POST", "/consult/batch", "write", "split"),
+    ("GET", "/users/{user_id}/appointments", "read", "all"),
+    ("GET", "/users/{user_id}/prescriptions", "read", "all"),
+    ("GET", "/medicines", "read", "global"),
+    ("GET", "/medicines/search", "read", "global"),
+    ("POST", "/medicines/{medicine_id}/restock", "write", "global"),
+    ("POST", "/buy", "write", "global"),
+    ("POST", "/buy_bulk", "write", "global"),
+    ("POST", "/buy_prescription", "write", "global"),
+    ("GET", "/reports/sales", "read", "global"),
+    ("GET", "/reports/sales/by_medicine", "read", "global"),
+    ("GET", "/reports/sales/by_window", "read", "global"),
+    ("GET", "/reports/sales/top", "read", "global"),
+]
+_COMPILED_ROUTES = [
+    (method, re.compile("^" + re.sub(r"\{([^/]+)\}", r"(?P<\1>[^/]+)", path) + "$"), path, kind, shard_by)
+    for method, path, kind, shard_by in ROUTE_TABLE
+]
+
+# "all" routes: (list field, sort key, count parameter and its backend default or None)
+FANOUT_MERGE = {
+    "/users/{user_id}/appointments": ("appointments", "id", None, None),
+    "/users/{user_id}/prescriptions": ("prescriptions", "appointment_id", None, None),
+    "/doctors/availability": ("doctors", "doctor_id", None, None),
+    "/doctors/next_available": ("slots", "time_slot", "n", 5),
+}
+
+def route_info(method: str, path: str) -> Tuple[str, str, Optional[str], Dict[str, str]]:
+    """(kind, shard_by, route template, path parameters) for a request."""
+    for m, pattern, template, kind, shard_by in _COMPILED_ROUTES:
+        match = pattern.match(path) if m == method else None
+        if match:
+            return kind, shard_by, template, match.groupdict()
+    return ("read" if method in ("GET", "HEAD") else "write"), "any", None, {}
+
+def target_shard(shard_by: str, params: Dict[str, str], request: Request, body: bytes) -> Optional[int]:
+    """Shard that must serve a request, or None if any shard can."""
+    if shard_by == "global":
+        return sharding.GLOBAL_SHARD
+    if ":" not in shard_by:
+        return None
+    key, _, source = shard_by.partition(":")
+    where, _, field = source.partition(".")
+    if where == "path":
+        value = params.get(field)
+    elif where == "query":
+        value = request.query_params.get(field)
+    else:
         try:
-            r = requests.get(f"http://127.0.0.1:{port}/health", timeout=1)
-            if r.status_code == 200:
-                return port
-        except:
-            print(f"[Gateway] Backend {port} not reachable")
-        checked += 1
-    return None
+            value = json.loads(body).get(field)
+        except (ValueError, AttributeError):
+            value = None
+    if value is None:
+        return None  # let any backend reject the malformed request
+    return RING.shard_for(f"{key}:{value}")
+
+# Per-connection headers that must not be copied between the client and backend legs
+HOP_BY_HOP = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+              "te", "trailers", "transfer-encoding", "upgrade", "host", "content-length"}
+# Headers only nodes may send each other (X-HLC on forwarded writes); never taken from a client
+INTERNAL_HEADERS = {"x-hlc"}
+
+# ---------- Backend health tracking ----------
+# Liveness is tracked in the background so routing never waits on a probe.
+# Live backends are probed every HEALTH_INTERVAL; a backend that fails a
+# probe, refuses a connection, or fails REQUEST_ERRORS_BEFORE_DOWN forwarded
+# requests in a row is marked down and re-probed with exponential backoff
+# until it answers again. A single timeout only means one request was slow.
+HEALTH_INTERVAL = 1.0
+HEALTH_MAX_BACKOFF = 30.0
+REQUEST_ERRORS_BEFORE_DOWN = 3
+backend_health: Dict[int, Dict] = {
+    p: {"alive": True, "failures": 0, "errors": 0, "next_probe": 0.0} for p in BACKEND_PORTS
+}
+
+def mark_up(port: int):
+    state = backend_health[port]
+    if not state["alive"]:
+        print(f"[Gateway] Backend {port} is back up")
+    state.update(alive=True, failures=0, next_probe=time.monotonic() + HEALTH_INTERVAL)
+
+def mark_down(port: int):
+    state = backend_health[port]
+    if state["alive"]:
+        print(f"[Gateway] Backend {port} marked down")
+    state["alive"] = False
+    state["failures"] += 1
+    state["errors"] = 0
+    backoff = min(HEALTH_MAX_BACKOFF, HEALTH_INTERVAL * 2 ** (state["failures"] - 1))
+    state["next_probe"] = time.monotonic() + backoff
+
+def request_failed(port: int, error: httpx.TransportError):
+    """A forwarded request to `port` failed: down at once if it could not connect, else once errors repeat."""
+    state = backend_health[port]
+    state["errors"] += 1
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)) or state["errors"] >= REQUEST_ERRORS_BEFORE_DOWN:
+        mark_down(port)
+
+def request_succeeded(port: int):
+    backend_health[port]["errors"] = 0
+
+async def probe(port: int):
+    try:
+        r = await clients[port].get("/health", timeout=HEALTH_TIMEOUT)
+        if r.status_code == 200:
+            mark_up(port)
+            learn_coordinator(r.headers.get("x-coordinator"))
+            return
+    except httpx.HTTPError:
+        pass
+    mark_down(port)
+
+async def health_loop():
+    while True:
+        now = time.monotonic()
+        due = [p for p, state in backend_health.items() if state["next_probe"] <= now]
+        if due:
+            await asyncio.gather(*(probe(p) for p in due))
+        await asyncio.sleep(0.1)
+
+# ---------- Backend selection ----------
+# Writes go straight to their shard's coordinator (learned from the
+# X-Coordinator header every backend response carries) so they skip the
+# backend-side forwarding hop. Reads go to the live backend of the shard with
+# the fewest requests in flight.
+coordinators: Dict[int, int] = {}  # shard -> coordinator port
+outstanding: Dict[int, int] = {p: 0 for p in BACKEND_PORTS}
+
+def learn_coordinator(value: Optional[str]):
+    try:
+        port = int(value)
+    except (TypeError, ValueError):
+        return
+    shard = SHARD_OF.get(port)
+    if shard is not None and coordinators.get(shard) != port:
+        print(f"[Gateway] Coordinator of shard {shard} is now backend {port}")
+        coordinators[shard] = port
+
+def pick_backend(kind: str, shard: Optional[int] = None, exclude=()) -> Optional[int]:
+    """Choose a live backend of `shard` (None: any backend) for a request; no network I/O."""
+    global rr_index
+    ports = BACKEND_PORTS if shard is None else SHARDS[shard]
+    alive = [p for p in ports if backend_health[p]["alive"] and p not in exclude]
+    if not alive:
+        return None
+    coordinator = coordinators.get(sharding.GLOBAL_SHARD if shard is None else shard)
+    if kind == "write" and coordinator in alive:
+        return coordinator
+    # rotate the starting point so ties are spread round-robin
+    rr_index = (rr_index + 1) % len(alive)
+    ordered = alive[rr_index:] + alive[:rr_index]
+    return min(ordered, key=lambda p: outstanding[p])
+
+async def release(port: int, resp: httpx.Response):
+    await resp.aclose()
+    outstanding[port] -= 1
 
 # ---------- Health check endpoint ----------
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "alive", "service": "API Gateway"}
 
-# ---------- Gateway endpoints (proxy to backends) ----------
-@app.post("/signup")
-def signup(req: SignupRequest):
-    port = get_alive_server()
-    if not port: raise HTTPException(status_code=500, detail="No backends")
-    try:
-        r = requests.post(f"http://127.0.0.1:{port}/signup", json=req.dict(), timeout=5)
-        print(f"[Gateway] Forwarded /signup request to backend {port}")
-        return r.json()
-    except Exception as e:
-        print(f"[Gateway] Error in signup: {e}")
-        raise HTTPException(status_code=500, detail=f"Backend error: {str(e)}")
-
-@app.post("/login")
-def login(req: LoginRequest):
-    port = get_alive_server()
-    if not port: raise HTTPException(status_code=500, detail="No backends")
+@app.get("/gateway/backends")
+async def backend_status():
+    """Cached liveness table used for routing."""
+    return {"coordinator": coordinators.get(sharding.GLOBAL_SHARD),
+            "shards": [{"ports": group, "coordinator": coordinators.get(i)} for i, group in enumerate(SHARDS)],
+            "backends": {p: {"alive": s["alive"], "consecutive_failures": s["failures"],
+                             "request_errors": s["errors"], "outstanding": outstanding[p]}
+                         for p, s in backend_health.items()}}
+
+# ---------- Generic proxy ----------
+# Method, path, query string and body bytes go to the backend untouched and
+# the backend's response is streamed back without being parsed; validation
+# stays with the backends.
+@app.api_route("/{path:path}", methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE"])
+async def proxy(path: str, request: Request):
+    path = "/" + path
+    kind, shard_by, template, params = route_info(request.method, path)
+    url = path + ("?" + request.url.query if request.url.query else "")
+    headers = [(k, v) for k, v in request.headers.items()
+               if k.lower() not in HOP_BY_HOP and k.lower() not in INTERNAL_HEADERS]
+    body = await request.body()
+    if len(SHARDS) > 1 and shard_by == "all":
+        return await fan_out(request, url, headers, FANOUT_MERGE[template])
+    if len(SHARDS) > 1 and shard_by == "split":
+        return await split_consult_batch(url, headers, body)
+    shard = target_shard(shard_by, params, request, body) if len(SHARDS) > 1 else None
+    tried = []
+    port = None
+    for _ in range(len(BACKEND_PORTS)):
+        port = pick_backend(kind, shard, exclude=tried)
+        if not port:
+            break
+        tried.append(port)
+        upstream = clients[port].build_request(request.method, url, headers=headers, content=body)
+        outstanding[port] += 1
+        try:
+            resp = await clients[port].send(upstream, stream=True)
+        except httpx.TransportError as e:
+            outstanding[port] -= 1
+            request_failed(port, e)
+            print(f"[Gateway] Error forwarding {request.method} {path} to backend {port}: {e}")
+            # a write is only retried if it provably never reached the backend
+            if kind == "read" or isinstance(e, httpx.ConnectError):
+                continue
+            break
+        request_succeeded(port)
+        learn_coordinator(resp.headers.get("x-coordinator"))
+        if kind == "read" and resp.status_code == 503 and "x-version-behind" in resp.headers \
+                and pick_backend(kind, shard, exclude=tried) is not None:
+            # that node has not caught up to the client's X-Min-Version; another one may have
+            await release(port, resp)
+            continue
+        print(f"[Gateway] Forwarded {request.method} {path} ({kind}) request to backend {port}")
+        # the gateway's own server/CORS middleware set these on the way out
+        resp_headers = {k: v for k, v in resp.headers.items()
+                        if k.lower() not in HOP_BY_HOP and k.lower() not in ("date", "server")
+                        and not k.lower().startswith("access-control-")}
+        if "content-length" in resp.headers:
+            resp_headers["content-length"] = resp.headers["content-length"]
+        return StreamingResponse(resp.aiter_raw(), status_code=resp.status_code,
+                                 headers=resp_headers, background=BackgroundTask(release, port, resp))
+    raise HTTPException(status_code=502 if port else 500, detail="Backend error" if port else "No backends")
+
+# ---------- Cross-shard requests (sharded mode) ----------
+async def read_from_shard(shard: int, url: str, headers, stream: bool = False) -> Tuple[int, httpx.Response]:
+    """GET from a live backend of `shard`, trying its other backends on connection errors.
+
+    A streamed response is the caller's to `release`.
+    """
+    tried = []
+    while True:
+        port = pick_backend("read", shard, exclude=tried)
+        if port is None:
+            raise HTTPException(status_code=502, detail=f"No backend reachable for shard {shard}")
+        tried.append(port)
+        outstanding[port] += 1
+        try:
+            resp = await clients[port].send(clients[port].build_request("GET", url, headers=headers), stream=stream)
+        except httpx.TransportError as e:
+            outstanding[port] -= 1
+            request_failed(port, e)
+            print(f"[Gateway] Error forwarding GET {url} to backend {port}: {e}")
+            continue
+        request_succeeded(port)
+        if not stream:
+            outstanding[port] -= 1
+        learn_coordinator(resp.headers.get("x-coordinator"))
+        return port, resp
+
+def merge_lists(bodies: List[Dict], spec, request: Request) -> Dict:
+    """Merge per-shard list bodies into one, sorted by the route's key.
+
+    Pages are merged by key too: each shard returned its first `limit` items
+    after the cursor, so the first `limit` of the merge are the global page.
+    """
+    field, key, count_param, count_default = spec
+    merged = dict(bodies[0])
+    items = sorted((item for b in bodies for item in b[field]), key=lambda item: item[key])
+    if count_param:
+        items = items[:int(request.query_params.get(count_param, count_default))]
+    limit = request.query_params.get("limit")
+    if limit is not None and "next_cursor" in merged:
+        more = len(items) > int(limit) or any(b.get("next_cursor") for b in bodies)
+        items = items[:int(limit)]
+        merged["next_cursor"] = paging.encode_cursor(items[-1][key]) if more and items else None
+    merged[field] = items
+    return merged
+
+async def fan_out(request: Request, url: str, headers, spec):
+    """Ask every shard and merge the answers; NDJSON streams are relayed shard after shard."""
+    stream = paging.wants_stream(request.headers.get("accept", ""), request.query_params.get("format"))
+    replies = await asyncio.gather(*(read_from_shard(shard, url, headers, stream) for shard in range(len(SHARDS))),
+                                   return_exceptions=True)
+    opened = [r for r in replies if not isinstance(r, BaseException)]
+    failed = next((r for r in replies if isinstance(r, BaseException)), None)
+    bad = next((resp for _, resp in opened if resp.status_code != 200), None)
+    if failed is not None or bad is not None:
+        if bad is not None and stream:
+            await bad.aread()
+        for port, resp in opened:
+            if stream:
+                await release(port, resp)
+        if failed is not None:
+            raise failed
+        return Response(content=bad.content, status_code=bad.status_code,
+                        media_type=bad.headers.get("content-type"))
+    print(f"[Gateway] Fanned out GET {url} to backends {[port for port, _ in opened]}")
+    if not stream:
+        return merge_lists([resp.json() for _, resp in opened], spec, request)
+
+    async def chained():
+        for port, resp in opened:
+            async for chunk in resp.aiter_raw():
+                yield chunk
+
+    async def release_all():
+        for port, resp in opened:
+            await release(port, resp)
+
+    return StreamingResponse(chained(), media_type=paging.NDJSON, background=BackgroundTask(release_all))
+
+async def split_consult_batch(url: str, headers, body: bytes):
+    """Send each shard the consultations for its appointments and reassemble the results in order."""
     try:
-        r = requests.post(f"http://127.0.0.1:{port}/login", json=req.dict(), timeout=5)
-        print(f"[Gateway] Forwarded /login request to backend {port}")
-        return r.json()
-    except Exception as e:
-        print(f"[Gateway] Error in login: {e}")
-        raise HTTPException(status_code=500, detail=f"Backend error: {str(e)}")
-
-@app.get("/doctors")
-def get_doctors():
-    port = get_alive_server()
-    if not port: raise HTTPException(status_code=500, detail="No backends")
-    r = requests.get(f"http://127.0.0.1:{port}/doctors", timeout=5)
-    print(f"[Gateway] Forwarded /doctors request to backend {port}")
-    return r.json()
-
-@app.get("/doctors/{doctor_id}/available")
-def get_doctor_available(doctor_id: int):
-    port = get_alive_server()
-    if not port: raise HTTPException(status_code=500, detail="No backends")
-    r = requests.get(f"http://127.0.0.1:{port}/doctors/{doctor_id}/available", timeout=5)
-    print(f"[Gateway] Forwarded /medicines request to backend {port}")
-    return r.json()
-
-@app.post("/book")
-def book(req: BookRequest):
-    port = get_alive_server()
-    if not port: raise HTTPException(status_code=500, detail="No backends")
-    r = requests.post(f"http://127.0.0.1:{port}/book", json=req.dict(), timeout=5)
-    print(f"[Gateway] Forwarded /book request to backend {port}")
-    return r.json()
-
-@app.post("/consult")
-def consult(req: ConsultRequest):
-    port = get_alive_server()
-    if not port: raise HTTPException(status_code=500, detail="No backends")
-    r = requests.post(f"http://127.0.0.1:{port}/consult", json=req.dict(), timeout=5)
-    print(f"[Gateway] Forwarded /consult request to backend {port}")
-    return r.json()
-
-@app.get("/medicines")
-def get_medicines(appointment_id: Optional[int] = Query(None)):
-    port = get_alive_server()
-    if not port: raise HTTPException(status_code=500, detail="No backends")
-    url = f"http://127.0.0.1:{port}/medicines"
-    if appointment_id is not None:
-        url += f"?appointment_id={appointment_id}"
-    r = requests.get(url, timeout=5)
-    print(f"[Gateway] Forwarded /medicines request to backend {port}")
-    return r.json()
-
-@app.post("/buy")
-def buy(req: BuyRequest):
-    port = get_alive_server()
-    if not port: raise HTTPException(status_code=500, detail="No backends")
-    r = requests.post(f"http://127.0.0.1:{port}/buy", json=req.dict(), timeout=5)
-    print(f"[Gateway] Forwarded /buy request to backend {port}")
-    return r.json()
-
-@app.post("/buy_bulk")
-def buy_bulk(req: BuyBulkRequest):
-    port = get_alive_server()
-    if not port: raise HTTPException(status_code=500, detail="No backends")
-    r = requests.post(f"http://127.0.0.1:{port}/buy_bulk", json=req.dict(), timeout=5)
-    print(f"[Gateway] Forwarded /buy_bulk request to backend {port}")
-    return r.json()
-
-@app.post("/buy_prescription")
-def buy_prescription(req: BuyPrescriptionRequest):
-    port = get_alive_server()
-    if not port: raise HTTPException(status_code=500, detail="No backends")
-    r = requests.post(f"http://127.0.0.1:{port}/buy_prescription", json=req.dict(), timeout=5)
-    print(f"[Gateway] Forwarded /buy_prescription request to backend {port}")
-    return r.json()
-
-@app.get("/users/{user_id}/appointments")
-def list_appointments(user_id: int):
-    port = get_alive_server()
-    r = requests.get(f"http://127.0.0.1:{port}/users/{user_id}/appointments", timeout=5)
-    print(f"[Gateway] Forwarded /users/{user_id}/appointments request to backend {port}")
-    return r.json()
-
-@app.get("/users/{user_id}/prescriptions")
-def list_prescriptions(user_id: int):
-    port = get_alive_server()
-    r = requests.get(f"http://127.0.0.1:{port}/users/{user_id}/prescriptions", timeout=5)
-    print(f"[Gateway] Forwarded /users/{user_id}/prescriptions request to backend {port}")
-    return r.json()
-
-@app.delete("/appointments/{appointment_id}")
-def cancel_appointment(appointment_id: int):
-    port = get_alive_server()
-    r = requests.delete(f"http://127.0.0.1:{port}/appointments/{appointment_id}", timeout=5)
-    print(f"[Gateway] Forwarded /appointments/{appointment_id} request to backend {port}")
-    return r.json()
-
-@app.post("/appointments/{appointment_id}/reschedule")
-def reschedule_appointment(appointment_id: int, req: RescheduleRequest):
-    port = get_alive_server()
-    r = requests.post(f"http://127.0.0.1:{port}/appointments/{appointment_id}/reschedule", json=req.dict(), timeout=5)
-    print(f"[Gateway] Forwarded /appointments/{appointment_id}/reschedule request to backend {port}")
-    return r.json()
-
-@app.get("/medicines/search")
-def search_medicines(name: str):
-    port = get_alive_server()
-    r = requests.get(f"http://127.0.0.1:{port}/medicines/search?name={name}", timeout=5)
-    print(f"[Gateway] Forwarded /medicines/search request to backend {port}")
-    return r.json()
-
-@app.post("/medicines/{medicine_id}/restock")
-def restock_medicine(medicine_id: int, quantity: int):
-    port = get_alive_server()
-    r = requests.post(f"http://127.0.0.1:{port}/medicines/{medicine_id}/restock?quantity={quantity}", timeout=5)
-    print(f"[Gateway] Forwarded /medicines/{medicine_id}/restock request to backend {port}")
-    return r.json()
-
-@app.post("/ratings/{doctor_id}")
-def rate_doctor(doctor_id: int, req: RatingRequest):
-    port = get_alive_server()
-    r = requests.post(f"http://127.0.0.1:{port}/ratings/{doctor_id}", json=req.dict(), timeout=5)
-    print(f"[Gateway] Forwarded post/ratings/{doctor_id} request to backend {port}")
-    return r.json()
-
-@app.get("/ratings/{doctor_id}")
-def get_doctor_rating(doctor_id: int):
-    port = get_alive_server()
-    r = requests.get(f"http://127.0.0.1:{port}/ratings/{doctor_id}", timeout=5)
-    print(f"[Gateway] Forwarded get/ratings/{doctor_id} request to backend {port}")
-    return r.json()
-
-@app.get("/reports/sales")
-def sales_report():
-    port = get_alive_server()
-    r = requests.get(f"http://127.0.0.1:{port}/reports/sales", timeout=5)
-    print(f"[Gateway] Forwarded /reports/sales request to backend {port}")
-    return r.json()
-
-@app.get("/users/{user_id}/appointments")
-def list_appointments(user_id: int):
-    port = get_alive_server()
-    if not port: raise HTTPException(status_code=500, detail="No backends")
-    r = requests.get(f"http://127.0.0.1:{port}/users/{user_id}/appointments", timeout=5)
-    print(f"[Gateway] Forwarded /users/{user_id}/appointments request to backend {port}")
-    return r.json()
-
-@app.get("/users/{user_id}/prescriptions")
-def list_prescriptions(user_id: int):
-    port = get_alive_server()
-    if not port: raise HTTPException(status_code=500, detail="No backends")
-    r = requests.get(f"http://127.0.0.1:{port}/users/{user_id}/prescriptions", timeout=5)
-    print(f"[Gateway] Forwarded /users/{user_id}/prescriptions request to backend {port}")
-    return r.json()
-
-@app.post("/buy_prescription")
-def buy_prescription(req: BuyPrescriptionRequest):
-    port = get_alive_server()
-    if not port: raise HTTPException(status_code=500, detail="No backends")
-    r = requests.post(f"http://127.0.0.1:{port}/buy_prescription", json=req.dict(), timeout=5)
-    print(f"[Gateway] Forwarded /buy_prescription request to backend {port}")
-    return r.json()
\ No newline at end of file
+        consultations = json.loads(body)["consultations"]
+        shards = [RING.shard_for(sharding.id_key(int(c["appointment_id"]))) for c in consultations]
+    except (ValueError, KeyError, TypeError):
+        shards = None
+    if not shards:
+        # malformed or empty: any coordinator gives the backend's answer
+        port = pick_backend("write", sharding.GLOBAL_SHARD)
+        if port is None:
+            raise HTTPException(status_code=500, detail="No backends")
+        resp = await clients[port].post(url, content=body, headers=headers)
+        return Response(content=resp.content, status_code=resp.status_code,
+                        media_type=resp.headers.get("content-type"))
+    groups: Dict[int, List[int]] = {}
+    for i, shard in enumerate(shards):
+        groups.setdefault(shard, []).append(i)
+    results: List[Optional[Dict]] = [None] * len(consultations)
+    versions: List[str] = []  # one X-Version token per shard written to
+
+    async def run(shard: int, idx: List[int]):
+        port = pick_backend("write", shard)
+        try:
+            if port is None:
+                raise httpx.ConnectError("no live backend")
+            resp = await clients[port].post(url, headers=headers,
+                                            content=json.dumps({"consultations": [consultations[i] for i in idx]}))
+            request_succeeded(port)
+            if resp.status_code != 504:  # 504: applied, but not yet acknowledged by enough replicas
+                resp.raise_for_status()
+            learn_coordinator(resp.headers.get("x-coordinator"))
+            if "x-version" in resp.headers:
+                versions.append(resp.headers["x-version"])
+            for i, result in zip(idx, resp.json()["results"]):
+                results[i] = result
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            if port is not None and isinstance(e, httpx.TransportError):
+                request_failed(port, e)
+            print(f"[Gateway] Batch consult on shard {shard} failed: {e}")
+            for i in idx:
+                results[i] = {"appointment_id": consultations[i]["appointment_id"], "status": "FAILED",
+                              "message": f"Shard {shard} unavailable"}
+
+    await asyncio.gather(*(run(shard, idx) for shard, idx in groups.items()))
+    print(f"[Gateway] Split batch consult across shards {sorted(groups)}")
+    return JSONResponse({"results": results}, headers={"X-Version": ",".join(versions)} if versions else None)
+
+# ---------- Run Gateway ----------
+if __name__ == "__main__":
+    import uvicorn
+    print(f"Starting API Gateway on port {GATEWAY_PORT}...")
+    uvicorn.run(app, host="127.0.0.1", port=GATEWAY_PORT)
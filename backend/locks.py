@@ -0,0 +1,56 @@
+# locks.py
+"""Reader/writer locks for the per-collection state in main.py."""
+import threading
+from contextlib import contextmanager, ExitStack
+
+
+class RWLock:
+    """Many readers or one writer. Waiting writers block new readers so writes cannot starve."""
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+@contextmanager
+def locked(reads=(), writes=(), order=()):
+    """Hold several locks at once, always acquired in ``order`` to avoid deadlocks."""
+    with ExitStack() as stack:
+        for lock in order:
+            if lock in writes:
+                stack.enter_context(lock.write())
+            elif lock in reads:
+                stack.enter_context(lock.read())
+        yield
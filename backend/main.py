@@ -1,13 +1,36 @@
 # main.py
-from collections import defaultdict
-from fastapi import FastAPI, HTTPException, Request, Query
+from fastapi import FastAPI, Header, HTTPException, Request, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Set, Tuple
+from contextlib import nullcontext
 import requests
 import sys
 import threading
 import time
+from datetime import date, datetime
+import heapq
 import itertools
+import os
+from replication import (ASYNC, CONSISTENCY_LEVELS, MAJORITY, ONE, ReplicationLog, Replicator,
+                         replica_acks_needed)
+from store import AppointmentTable, UserTable
+from records import Appointment, Medicine
+from cache import ResponseCache
+from clock import ClockSync, HybridClock, wall_time
+from election import Election
+from locks import RWLock, locked
+from pipeline import WritePipeline
+from sales import SalesLedger
+from schedule import Schedule, is_time_of_day, slot_key
+from search import SearchIndex
+from symptoms import DEFAULT_RULES_PATH, SymptomMatcher
+import paging
+import sharding
+import sales as sales_engine
+from wal import WriteAheadLog
+import wire
 #from pyspark import SparkContext, SparkConf
 # ---------- Config ----------
 if len(sys.argv) != 3:
@@ -16,38 +39,53 @@ if len(sys.argv) != 3:
 
 PORT = int(sys.argv[1])
 ALL_PORTS = list(map(int, sys.argv[2].split(',')))
+# Sharded mode (MEDCARE_SHARDS, see sharding.py): this node's replica group takes the place of ALL_PORTS
+SHARDS = sharding.load_shards() or [ALL_PORTS]
+MY_SHARD = next((i for i, group in enumerate(SHARDS) if PORT in group), None)
+if MY_SHARD is None:
+    print(f"Port {PORT} is not part of any shard in MEDCARE_SHARDS")
+    sys.exit(1)
+ALL_PORTS = SHARDS[MY_SHARD]
 OTHER_PORTS = [p for p in ALL_PORTS if p != PORT]
+RING = sharding.HashRing(len(SHARDS))
 
 # conf = SparkConf().setAppName("ClinicSalesReport").setMaster("local[*]")
 # sc = SparkContext.getOrCreate(conf=conf)
 app = FastAPI(title=f"Backend Server {PORT}")
 
 # ---------- In-memory DB (shared state replicated by coordinator) ----------
-MEDICINES: List[Dict] = [
-    {"id": 0, "name": "Paracetamol", "stock": 10, "price": 20},
-    {"id": 1, "name": "Ibuprofen", "stock": 5, "price": 30},
-    {"id": 2, "name": "Amoxicillin", "stock": 7, "price": 50},
-    {"id": 3, "name": "Cough Syrup", "stock": 8, "price": 40},
-    {"id": 4, "name": "Antacid", "stock": 15, "price": 25},
-    {"id": 5, "name": "Cetirizine", "stock": 12, "price": 18},
-    {"id": 6, "name": "Metformin", "stock": 9, "price": 60},
-    {"id": 7, "name": "Aspirin", "stock": 20, "price": 22},
-    {"id": 8, "name": "Azithromycin", "stock": 6, "price": 85},
-    {"id": 9, "name": "Vitamin D3", "stock": 14, "price": 45},
-    {"id": 10, "name": "Multivitamin", "stock": 17, "price": 35},
-    {"id": 11, "name": "Insulin", "stock": 5, "price": 120},
-    {"id": 12, "name": "Ciprofloxacin", "stock": 7, "price": 70},
-    {"id": 13, "name": "Loratadine", "stock": 10, "price": 28},
-    {"id": 14, "name": "Pantoprazole", "stock": 11, "price": 55},
-    {"id": 15, "name": "Hydroxychloroquine", "stock": 4, "price": 150},
-    {"id": 16, "name": "Doxycycline", "stock": 8, "price": 90},
-    {"id": 17, "name": "Losartan", "stock": 10, "price": 65},
-    {"id": 18, "name": "Amlodipine", "stock": 9, "price": 75},
-    {"id": 19, "name": "Omeprazole", "stock": 16, "price": 30},
+MEDICINES: List[Medicine] = [
+    Medicine(0, "Paracetamol", 10, 20),
+    Medicine(1, "Ibuprofen", 5, 30),
+    Medicine(2, "Amoxicillin", 7, 50),
+    Medicine(3, "Cough Syrup", 8, 40),
+    Medicine(4, "Antacid", 15, 25),
+    Medicine(5, "Cetirizine", 12, 18),
+    Medicine(6, "Metformin", 9, 60),
+    Medicine(7, "Aspirin", 20, 22),
+    Medicine(8, "Azithromycin", 6, 85),
+    Medicine(9, "Vitamin D3", 14, 45),
+    Medicine(10, "Multivitamin", 17, 35),
+    Medicine(11, "Insulin", 5, 120),
+    Medicine(12, "Ciprofloxacin", 7, 70),
+    Medicine(13, "Loratadine", 10, 28),
+    Medicine(14, "Pantoprazole", 11, 55),
+    Medicine(15, "Hydroxychloroquine", 4, 150),
+    Medicine(16, "Doxycycline", 8, 90),
+    Medicine(17, "Losartan", 10, 65),
+    Medicine(18, "Amlodipine", 9, 75),
+    Medicine(19, "Omeprazole", 16, 30),
 ]
 
-USERS: List[Dict] = []        # each: {id, username, password}
-APPOINTMENTS: List[Dict] = [] # each: {id, user_id, doctor_id, time_slot, symptoms, prescription}
+MEDICINE_INDEX = SearchIndex()  # name search over MEDICINES, kept current by medicine_put and load_state
+
+def reindex_medicines():
+    MEDICINE_INDEX.build((m.id, m.name) for m in MEDICINES)
+
+reindex_medicines()
+
+USERS = UserTable()               # each: {id, username, password}
+APPOINTMENTS = AppointmentTable() # records.Appointment, indexed by id, user and slot
 DOCTORS: List[Dict] = [
     {"id": 0, "name": "Dr. Mehta", "specialty": "General", "available_slots": ["10:00", "11:00", "15:00"]},
     {"id": 1, "name": "Dr. Rao", "specialty": "Pediatrics", "available_slots": ["09:30", "13:00", "16:00"]},
@@ -66,10 +104,34 @@ DOCTORS: List[Dict] = [
     {"id": 14, "name": "Dr. Pillai", "specialty": "Nephrology", "available_slots": ["10:10", "13:50", "17:10"]},
 ]
 
+DOCTORS_BY_ID: Dict[int, Dict] = {d["id"]: d for d in DOCTORS}
+# doctors whose appointments live on this shard (all of them unless sharded)
+OWNED_DOCTORS: List[Dict] = [d for d in DOCTORS if RING.shard_for(sharding.doctor_key(d["id"])) == MY_SHARD]
+SCHEDULE = Schedule(DOCTORS)  # weekly templates (default: available_slots every day) + specialty index
+SCHEDULE_MAX_DAYS = 180       # how far ahead free-slot searches may look
+
+# Diagnosis rules (backend/symptom_rules.json, or MEDCARE_SYMPTOM_RULES); edits are picked up while running
+SYMPTOM_RULES = SymptomMatcher(os.environ.get("MEDCARE_SYMPTOM_RULES", DEFAULT_RULES_PATH), log_prefix=f"[Server {PORT}] ")
+
 DOCTOR_RATINGS: Dict[int, List[int]] = {}  # doctor_id -> list of ratings
-MEDICINE_SALES = []
-lock = threading.Lock()
-_id_counter = itertools.count(start=1)
+SALES = SalesLedger()  # columnar: medicine_id, quantity, price, timestamp
+SALES_TOTALS: Dict[int, Dict] = {}  # medicine_id -> {"quantity", "revenue"}, in first-sale order
+# One reader/writer lock per collection, always taken in LOCK_ORDER when
+# several are needed. SALES and SALES_TOTALS share the medicines lock.
+users_lock = RWLock("users")
+appointments_lock = RWLock("appointments")
+medicines_lock = RWLock("medicines")
+ratings_lock = RWLock("ratings")
+LOCK_ORDER = (users_lock, appointments_lock, medicines_lock, ratings_lock)
+
+def state_locked(reads=(), writes=()):
+    return locked(reads, writes, LOCK_ORDER)
+
+# Writers on different collections run concurrently; these keep the shared
+# id counter and the log/WAL order consistent between them.
+id_lock = threading.Lock()
+log_lock = threading.Lock()
+_last_id = 0  # ids are shared by users and appointments
 
 # ---------- Models ----------
 class BuyItem(BaseModel):
@@ -97,10 +159,14 @@ class BookRequest(BaseModel):
     user_id: int
     doctor_id: int
     time_slot: str
+    date: Optional[str] = None  # YYYY-MM-DD; omit to book the undated daily slot
 
 class ConsultRequest(BaseModel):
     appointment_id: int
     symptoms: List[str]
+
+class ConsultBatchRequest(BaseModel):
+    consultations: List[ConsultRequest]
     
 class BuyPrescriptionRequest(BaseModel):
     appointment_id: int
@@ -111,116 +177,487 @@ class RatingRequest(BaseModel):
 
 class RescheduleRequest(BaseModel):
     new_time_slot: str
+    new_date: Optional[str] = None
 # ---------- Coordinator & Clock ----------
-coordinator_port = max(ALL_PORTS)
-logical_clock = time.time()
+coordinator_port: Optional[int] = None  # maintained by the background election, see election.py
 
-HEALTH_TIMEOUT = 1.0
 REQ_TIMEOUT = 2.0
 
+# Event timestamps come from a hybrid logical clock (see clock.py). Its physical
+# part follows the coordinator's clock, synced in the background every interval.
+CLOCK_SYNC_INTERVAL = 10.0
+clock_sync = ClockSync(PORT, lambda: coordinator_port, interval=CLOCK_SYNC_INTERVAL, log_prefix=f"[Server {PORT}] ")
+hlc = HybridClock(clock_sync.physical, log_prefix=f"[Server {PORT}] ")
+
+# ---------- Replication log ----------
+# Replicas further behind than this many deltas get a full snapshot instead
+REPLICATION_LOG_CAPACITY = 10000
+replication_log = ReplicationLog(REPLICATION_LOG_CAPACITY)
+# Cap on concurrent pushes across all replicas (at most one per replica at a time)
+REPLICATION_MAX_IN_FLIGHT = 2
+
+# ---------- Persistence ----------
+DATA_DIR = os.path.join(os.environ.get("MEDCARE_DATA_DIR", "data"), f"node-{PORT}")
+WAL_COMMIT_INTERVAL = 0.0     # coordinator writes arrive already batched by the write pipeline
+SNAPSHOT_EVERY = 5000         # compact the log after this many entries
+SNAPSHOT_CHECK_INTERVAL = 5.0
+wal = WriteAheadLog(DATA_DIR, commit_interval=WAL_COMMIT_INTERVAL)
+last_snapshot_seq = 0
+
+# ---------- Write pipeline ----------
+WRITE_BATCH_WINDOW = 0.002    # the coordinator gathers concurrent writes this long into one batch
+WRITE_BATCH_MAX = 256
+
+# ---------- Write consistency ----------
+# Default level per write endpoint (see replication.py); a request can pick
+# another with X-Consistency. Write responses carry X-Version, a
+# "<shard>:<seq>" token: a read that sends it back in X-Min-Version waits
+# until the node serving it has applied that write.
+CONSISTENCY_TIMEOUT = 2.0  # how long a write waits for replica acks, or a read for a version
+WRITE_CONSISTENCY = {
+    "signup": MAJORITY, "book": MAJORITY, "cancel": MAJORITY, "reschedule": MAJORITY,
+    "consult": ONE, "rating": ASYNC, "restock": MAJORITY, "purchase": MAJORITY,
+}
+
+# ---------- Sharding ----------
+REMOTE_USERS: Set[int] = set()  # users confirmed on other shards; users are never deleted
+
+def owns(key: str) -> bool:
+    return RING.shard_for(key) == MY_SHARD
+
+def require_owner(key: str):
+    """Reject a request for a key another shard owns (the gateway routes by key, so this means a stray client)."""
+    shard = RING.shard_for(key)
+    if shard != MY_SHARD:
+        raise HTTPException(status_code=421, detail=f"{key} is served by shard {shard}")
+
+def require_global():
+    """Medicines, sales and ratings are not partitioned: they live on the global shard."""
+    if MY_SHARD != sharding.GLOBAL_SHARD:
+        raise HTTPException(status_code=421, detail=f"served by shard {sharding.GLOBAL_SHARD}")
+
+def shard_get(shard: int, path: str) -> Optional[Dict]:
+    """GET `path` from another shard, primary first. None on 404; 503 if no node answers."""
+    for port in sorted(SHARDS[shard], reverse=True):
+        try:
+            r = requests.get(f"http://127.0.0.1:{port}{path}", timeout=REQ_TIMEOUT)
+        except requests.RequestException:
+            continue
+        if r.status_code == 404:
+            return None
+        if r.ok:
+            return r.json()
+    raise HTTPException(status_code=503, detail=f"Shard {shard} unreachable")
+
+def find_appointment(appointment_id: int) -> Optional[Appointment]:
+    """An appointment from this node or, in sharded mode, from the shard that owns it."""
+    shard = RING.shard_for(sharding.id_key(appointment_id))
+    if shard == MY_SHARD:
+        with appointments_lock.read():
+            return APPOINTMENTS.get(appointment_id)
+    found = shard_get(shard, f"/appointments/{appointment_id}")
+    return Appointment.from_dict(found) if found else None
+
 # ---------- Helper functions ----------
-def is_alive(port: int) -> bool:
+def forward_to_coordinator(method: str, path: str, payload: Optional[Dict] = None,
+                           consistency: Optional[str] = None) -> Optional[Response]:
+    """Relay a write to the coordinator; None if this node is the coordinator and should handle it.
+
+    Never probes or elects: a failed relay only tells the failure detector, and
+    the client gets a 503 to retry once the background election has settled.
+    """
+    coord = coordinator_port
+    if coord == PORT:
+        if not election.has_majority_lease():
+            # cut off from most of the group: another node may be taking over
+            raise HTTPException(status_code=503, detail="Coordinator has lost its majority; try again")
+        return None
+    if coord is None:
+        raise HTTPException(status_code=503, detail="Coordinator election in progress; try again")
+    try:
+        headers = {"X-HLC": str(hlc.now())}
+        if consistency:
+            headers["X-Consistency"] = consistency
+        r = requests.request(method, f"http://127.0.0.1:{coord}{path}", json=payload, timeout=REQ_TIMEOUT,
+                             headers=headers)
+    except requests.RequestException:
+        election.suspect(coord)
+        raise HTTPException(status_code=503, detail="Coordinator unreachable; try again")
+    observe_hlc(r.headers.get("X-HLC"))
+    headers = {"X-Version": r.headers["X-Version"]} if "X-Version" in r.headers else None
+    return Response(content=r.content, status_code=r.status_code, media_type=r.headers.get("content-type"),
+                    headers=headers)
+
+def observe_hlc(value: Optional[str]):
+    """Fold an HLC timestamp from another node's message into the local clock.
+
+    Only for what peers send (replication pushes, heartbeats and forwarded
+    writes; the gateway strips X-HLC from client requests). A timestamp too
+    far ahead is ignored by the clock itself.
+    """
     try:
-        r = requests.get(f"http://127.0.0.1:{port}/health", timeout=HEALTH_TIMEOUT)
-        return r.status_code == 200
-    except:
-        return False
+        hlc.observe(int(value))
+    except (TypeError, ValueError):
+        pass
+
+def consistency_level(requested: Optional[str], endpoint: str) -> str:
+    level = requested or WRITE_CONSISTENCY[endpoint]
+    if level not in CONSISTENCY_LEVELS:
+        raise HTTPException(status_code=400, detail=f"X-Consistency must be one of {', '.join(CONSISTENCY_LEVELS)}")
+    return level
+
+def version_token(seq: int) -> str:
+    return f"{MY_SHARD}:{seq}"
+
+def required_seq(tokens: str) -> int:
+    """Highest seq of this shard in a comma-separated list of version tokens (0 if none); ValueError if malformed."""
+    seq = 0
+    for token in tokens.split(","):
+        shard, _, n = token.strip().partition(":")
+        if int(shard) == MY_SHARD:
+            seq = max(seq, int(n))
+    return seq
+
+def acknowledged(body: Dict, level: str) -> Response:
+    """Answer a write once the replica acks its consistency level asks for are in, tagged with its version.
+
+    The write is already applied and durable on the coordinator, so a timeout
+    is a 504 that still carries the result and version, not a failure to retry.
+    """
+    seq = write_pipeline.last_version()
+    headers = {"X-Version": version_token(seq)}
+    needed = replica_acks_needed(level, len(ALL_PORTS))
+    if needed and not replicator.wait_acked(seq, needed, timeout=CONSISTENCY_TIMEOUT):
+        return JSONResponse(status_code=504, headers=headers, content={
+            **body, "detail": f"Applied, but fewer than {needed} replica(s) acknowledged it in time",
+            "version": headers["X-Version"]})
+    return JSONResponse(body, headers=headers)
+
+def next_id() -> int:
+    """Allocate a user/appointment id; in sharded mode, one that hashes to this shard."""
+    global _last_id
+    with id_lock:
+        _last_id += 1
+        while not owns(sharding.id_key(_last_id)):
+            _last_id += 1
+        return _last_id
+
+def observe_id(i: int):
+    """Keep id allocation ahead of ids learned from replication or recovery."""
+    global _last_id
+    with id_lock:
+        _last_id = max(_last_id, i)
+
+def record(op: str, **data):
+    """Append a delta to the replication log and the write-ahead log.
+
+    Caller must hold the write lock of the collection the delta touches.
+    """
+    with log_lock:
+        entry = replication_log.append(op, term=election.term, hlc=hlc.now(), **data)
+        wal.append(entry)
+    invalidate_cached(entry)
+
+def commit():
+    """Wake the replicator and wait for the WAL fsync; the write pipeline calls it once per batch."""
+    replicator.notify()
+    wal.sync()
+
+# Write handlers on the coordinator pass their state change to write_pipeline.submit
+# with the locks it needs; see pipeline.py
+write_pipeline = WritePipeline(state_locked, commit, window=WRITE_BATCH_WINDOW, max_batch=WRITE_BATCH_MAX,
+                               version=lambda: replication_log.last_seq)
+
+def add_sale(sale: Dict):
+    """Record a sale and fold it into the running per-medicine totals. Caller must hold `medicines_lock` for writing."""
+    SALES.append(sale["medicine_id"], sale["sold_qty"], sale["price"], sale.get("timestamp", 0.0))
+    agg = SALES_TOTALS.setdefault(sale["medicine_id"], {"quantity": 0, "revenue": 0})
+    agg["quantity"] += sale["sold_qty"]
+    agg["revenue"] += sale["sold_qty"] * sale["price"]
+
+def sell(items: List[Tuple[int, int]]) -> Tuple[Optional[str], int]:
+    """Sell (medicine_id, quantity) pairs all or nothing: (failure message or None, total cost).
+
+    Every item is checked before any stock changes. Caller must hold `medicines_lock` for writing.
+    """
+    for med_id, qty in items:
+        if med_id < 0 or med_id >= len(MEDICINES):
+            raise HTTPException(status_code=404, detail=f"Medicine id {med_id} not found")
+        if MEDICINES[med_id].stock < qty:
+            return f"Not enough stock of {MEDICINES[med_id].name}", 0
+    total_cost = 0
+    for med_id, qty in items:
+        med = MEDICINES[med_id]
+        med.stock -= qty
+        sale = {"medicine_id": med_id, "sold_qty": qty, "price": med.price, "timestamp": wall_time(hlc.now())}
+        add_sale(sale)
+        record("medicine_put", medicine=med.to_dict())
+        record("sale_add", sale=sale)
+        total_cost += med.price * qty
+    return None, total_cost
+
+def snapshot_state() -> Dict:
+    """Copy of the full replicated state, tagged with the log position it reflects."""
+    with state_locked(reads=LOCK_ORDER):
+        state = {
+            "seq": replication_log.last_seq,
+            "term": replication_log.last_term,
+            "hlc": hlc.now(),
+            "medicines": [m.to_dict() for m in MEDICINES],
+            "users": [u.copy() for u in USERS.all()],
+            "appointments": [a.to_dict() for a in APPOINTMENTS.all()],
+            "doctor_ratings": {k: v.copy() for k, v in DOCTOR_RATINGS.items()},
+        }
+        # views that later appends never touch, so the ledger (the bulk of
+        # a snapshot) is converted after the locks are released
+        sales = SALES.columns()
+    state["medicine_sales"] = sales_engine.column_lists(sales)
+    return state
+
+def apply_delta(entry: Dict):
+    """Apply a single replication log entry to local state. Caller must hold all state write locks.
+
+    Records are copied so later in-place edits never rewrite entries still in the log.
+    """
+    op = entry["op"]
+    if op == "user_put":
+        USERS.add(entry["user"].copy())
+        observe_id(entry["user"]["id"])
+    elif op == "appointment_put":
+        APPOINTMENTS.put(Appointment.from_dict(entry["appointment"]))
+        observe_id(entry["appointment"]["id"])
+    elif op == "appointment_delete":
+        APPOINTMENTS.remove(entry["appointment_id"])
+    elif op == "medicine_put":
+        med = Medicine.from_dict(entry["medicine"])
+        MEDICINES[med.id] = med
+        MEDICINE_INDEX.put(med.id, med.name)
+    elif op == "sale_add":
+        add_sale(entry["sale"])
+    elif op == "rating_add":
+        DOCTOR_RATINGS.setdefault(entry["doctor_id"], []).append(entry["rating"])
+    else:
+        print(f"[Server {PORT}] Unknown replication op {op!r} (seq={entry['seq']}), ignoring")
+    invalidate_cached(entry)
 
-def elect_coordinator():
-    global coordinator_port
-    alive = []
-    for p in ALL_PORTS:
-        if p == PORT:
-            alive.append(p)
-            continue
-        if is_alive(p):
-            alive.append(p)
-    new = max(alive)
-    old = coordinator_port
-    coordinator_port = new
-    if old != new:
-        print(f"[Server {PORT}] Election complete. New coordinator: {coordinator_port}")
-        for p in OTHER_PORTS:
-            try:
-                requests.post(f"http://127.0.0.1:{p}/update_coordinator",
-                              json={"port": coordinator_port}, timeout=REQ_TIMEOUT)
-            except:
-                pass
+# ---------- Response cache ----------
+# Catalog reads are served from pre-serialized bodies with ETags; an entry is
+# dropped as soon as a write or replicated delta touches its collection.
+response_cache = ResponseCache()
 
-def ensure_coordinator_alive_check():
-    global coordinator_port
-    if coordinator_port == PORT:
-        return coordinator_port
-    if is_alive(coordinator_port):
-        return coordinator_port
-    print(f"[Server {PORT}] Coordinator {coordinator_port} unreachable. Starting election...")
-    elect_coordinator()
-    return coordinator_port
-
-def async_clock_sync():
-    def _sync():
-        global logical_clock
-        try:
-            if coordinator_port == PORT:
-                logical_clock = time.time()
-                return
-            t0 = time.time()
-            r = requests.get(f"http://127.0.0.1:{coordinator_port}/time", timeout=REQ_TIMEOUT)
-            t1 = time.time()
-            if r.status_code == 200:
-                master_time = r.json().get("time", time.time())
-                rtt = t1 - t0
-                logical_clock = master_time + rtt / 2
-                # print small debug
-                print(f"[Server {PORT}] Clock synced with coordinator {coordinator_port}: {logical_clock}")
-                print("Time before syncing:",t1,"\nTime after syncing:",logical_clock)
-        except:
-            pass
-    threading.Thread(target=_sync, daemon=True).start()
-
-def is_node_alive(port):
-    """Check if a node is alive using its health endpoint."""
-    try:
-        res = requests.get(f"http://127.0.0.1:{port}/health", timeout=REQ_TIMEOUT)
-        return res.status_code == 200
-    except:
-        return False
-
-def push_full_state_to_replicas():
-    """Coordinator pushes full application state to only live replicas."""
-    global OTHER_PORTS   # So we can update the list by removing dead nodes
-
-    snapshot = {
-        "medicines": MEDICINES,
-        "users": USERS,
-        "appointments": APPOINTMENTS,
-        "doctor_ratings": DOCTOR_RATINGS,
-        "medicine_sales": MEDICINE_SALES
-    }
-
-    def _push():
-        global OTHER_PORTS
-        alive_ports = []
-        for p in OTHER_PORTS:
-            if is_node_alive(p):
-                try:
-                    requests.post(
-                        f"http://127.0.0.1:{p}/push_state",
-                        json=snapshot,
-                        timeout=REQ_TIMEOUT
-                    )
-                    print(f"[Server {PORT}] ✅ State pushed to {p}")
-                    alive_ports.append(p)
-                except Exception as e:
-                    print(f"[Server {PORT}] ⚠️ Node {p} alive but failed to push state: {e}")
-            else:
-                print(f"[Server {PORT}] ❌ Node {p} is DOWN, skipping...")
-        
-        # Update OTHER_PORTS to only include alive replicas
-        OTHER_PORTS = alive_ports
+def invalidate_cached(entry: Dict):
+    if entry["op"] == "medicine_put":
+        response_cache.bump("medicines")
+    elif entry["op"] == "rating_add":
+        response_cache.bump(f"ratings:{entry['doctor_id']}")
 
-    threading.Thread(target=_push, daemon=True).start()
+def cached_response(request: Request, key, collections, build, guard: Optional[RWLock] = None) -> Response:
+    """Serve `build()` from the cache, answering If-None-Match with 304 when the ETag matches.
+
+    `build` runs under a read lock on `guard`, the lock of the collection it reads.
+    """
+    hit = response_cache.lookup(key, collections)
+    if hit is None:
+        with (guard.read() if guard else nullcontext()):
+            version = response_cache.version(collections)
+            payload = build()
+            hit = response_cache.store(key, version, payload)
+    body, etag = hit
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+def list_response(request: Request, field: str, fetch: paging.Fetch, cursor: Optional[str],
+                  limit: Optional[int], fmt: Optional[str], full: Callable):
+    """Reply to a list endpoint: an NDJSON stream, one cursor page, or ``full()`` if neither was asked for.
+
+    `fetch(after, n)` must take the collection lock itself; see paging.py.
+    """
+    try:
+        after = paging.decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if paging.wants_stream(request.headers.get("accept", ""), fmt):
+        return StreamingResponse(paging.stream(fetch, after, limit), media_type=paging.NDJSON)
+    if cursor is None and limit is None:
+        return full()
+    items, next_cursor = paging.page(fetch, after, limit or paging.DEFAULT_LIMIT)
+    return {field: items, "next_cursor": next_cursor}
+
+# Wire format per replica, learned from the X-Replication-Accept header on its replies
+peer_wire: Dict[int, Tuple[str, Optional[str]]] = {}
+
+def post_to_replica(port: int, path: str, payload: Dict):
+    fmt = peer_wire.get(port, wire.DEFAULT)
+    body, headers = wire.encode(payload, *fmt)
+    r = requests.post(f"http://127.0.0.1:{port}{path}", data=body, headers=headers, timeout=REQ_TIMEOUT)
+    if r.status_code == 415 and fmt != wire.DEFAULT:
+        # replica restarted without msgpack/zstandard: fall back to JSON and relearn
+        peer_wire[port] = wire.DEFAULT
+        return post_to_replica(port, path, payload)
+    chosen = wire.choose(r.headers.get(wire.ACCEPT_HEADER))
+    if peer_wire.get(port) != chosen:
+        print(f"[Server {PORT}] Replication to {port} now uses {chosen[0]} ({chosen[1] or 'uncompressed'})")
+        peer_wire[port] = chosen
+    return r
+
+def push_to_replica(port: int, seq: int) -> int:
+    """Bring one replica up to date from its last acknowledged `seq`.
+
+    Ships the missing deltas, or a full snapshot if the replica fell too far
+    behind. Returns the sequence number the replica now has.
+    """
+    # second attempt covers a replica that is behind our bookkeeping (e.g. it restarted)
+    for _ in range(2):
+        if seq > replication_log.last_seq:
+            break
+        entries = replication_log.since(seq)
+        if entries is None:
+            break
+        if not entries:
+            return seq
+        r = post_to_replica(port, "/apply_deltas", {"entries": entries, "prev_term": replication_log.term_at(seq)})
+        r.raise_for_status()  # the Replicator counts it as a failed push and backs off
+        body = r.json()
+        if body.get("status") == "diverged":
+            print(f"[Server {PORT}] Log on {port} diverged from ours at or before seq {entries[-1]['seq']}")
+            break
+        seq = body.get("seq", 0)
+        if body.get("status") == "applied":
+            print(f"[Server {PORT}] ✅ Deltas up to seq {seq} applied on {port} ({len(entries)} in batch)")
+            return seq
+    snapshot = snapshot_state()
+    r = post_to_replica(port, "/push_state", snapshot)
+    r.raise_for_status()
+    print(f"[Server {PORT}] ✅ Full state (seq {snapshot['seq']}) pushed to {port}")
+    return snapshot["seq"]
+
+replicator = Replicator(replication_log, OTHER_PORTS, push_to_replica,
+                        active=lambda: coordinator_port == PORT,
+                        max_in_flight=REPLICATION_MAX_IN_FLIGHT)
+
+def coordinator_changed(leader: Optional[int]):
+    global coordinator_port
+    coordinator_port = leader
+    replicator.notify()  # a new coordinator starts pushing straight away
+    if leader is not None and leader != PORT:
+        threading.Thread(target=announce_seq, args=(leader,), daemon=True).start()
 
+def announce_seq(coord: int):
+    """Tell a new coordinator where this node's log ends, so it sends the missing deltas at once."""
+    try:
+        requests.post(f"http://127.0.0.1:{coord}/replication/announce",
+                      json={"port": PORT, "seq": replication_log.last_seq, "term": replication_log.last_term},
+                      timeout=REQ_TIMEOUT)
+    except requests.RequestException:
+        pass  # its replicator still catches up with this node on its next push
+
+# Heartbeats, leases and elections run on their own thread, off the request path
+election = Election(PORT, OTHER_PORTS, lambda: replication_log.last_seq, coordinator_changed,
+                    log_prefix=f"[Server {PORT}] ", clock=hlc.now, term_path=os.path.join(DATA_DIR, "term"),
+                    last_term=lambda: replication_log.last_term)
+
+
+def load_state(state: Dict):
+    """Replace all replicated state with a full snapshot. Caller must hold all state write locks."""
+    global MEDICINES, DOCTOR_RATINGS
+    MEDICINES = [Medicine.from_dict(m) for m in state["medicines"]]
+    reindex_medicines()
+    USERS.load(u.copy() for u in state["users"])
+    APPOINTMENTS.load(Appointment.from_dict(a) for a in state["appointments"])
+    DOCTOR_RATINGS = {int(k): v.copy() for k, v in state["doctor_ratings"].items()}
+    SALES.load(state["medicine_sales"])
+    SALES_TOTALS.clear()
+    SALES_TOTALS.update(sales_engine.totals(SALES.columns()))
+    for rec in itertools.chain(state["users"], state["appointments"]):
+        observe_id(rec["id"])
+    replication_log.reset(int(state.get("seq", 0)), int(state.get("term", 0)))
+    response_cache.bump_all()
+
+def recover_state():
+    """Rebuild state from the local snapshot plus the write-ahead log tail."""
+    global last_snapshot_seq
+    t0 = time.time()
+    snapshot, entries = wal.recover()
+    replayed = 0
+    with state_locked(writes=LOCK_ORDER):
+        if snapshot:
+            load_state(snapshot)
+            last_snapshot_seq = snapshot["seq"]
+            # entries the snapshot covers stay available as deltas for replicas
+            replication_log.reset(last_snapshot_seq, snapshot.get("term", 0),
+                                  (e for e in entries if e["seq"] <= last_snapshot_seq))
+        for entry in entries:
+            if entry["seq"] != replication_log.last_seq + 1:
+                continue
+            apply_delta(entry)
+            replication_log.append_entry(entry)
+            replayed += 1
+    # never hand out timestamps older than ones logged before a restart
+    for logged in ([snapshot] if snapshot else []) + entries[-1:]:
+        observe_hlc(logged.get("hlc"))
+    if snapshot or entries:
+        print(f"[Server {PORT}] Recovered state at seq {replication_log.last_seq} "
+              f"({replayed} log entries replayed) in {(time.time() - t0) * 1000:.1f} ms")
+
+def snapshot_loop():
+    """Periodically compact the write-ahead log into a snapshot."""
+    global last_snapshot_seq
+    while True:
+        time.sleep(SNAPSHOT_CHECK_INTERVAL)
+        if replication_log.last_seq - last_snapshot_seq >= SNAPSHOT_EVERY:
+            try:
+                last_snapshot_seq = wal.checkpoint(snapshot_state, keep=1)
+                print(f"[Server {PORT}] Snapshot written at seq {last_snapshot_seq}")
+            except Exception as e:
+                print(f"[Server {PORT}] ⚠️ Snapshot failed: {e}")
+
+@app.on_event("startup")
+def start_background_workers():
+    recover_state()
+    wal.start()
+    threading.Thread(target=snapshot_loop, daemon=True).start()
+    replicator.start()
+    write_pipeline.start()
+    election.start()
+    clock_sync.start()
+
+@app.middleware("http")
+async def advertise_coordinator(request: Request, call_next):
+    # lets the gateway send writes straight to the coordinator
+    response = await call_next(request)
+    response.headers["X-Coordinator"] = str(coordinator_port)
+    return response
+
+@app.middleware("http")
+async def hybrid_clock(request: Request, call_next):
+    # writes forwarded between nodes carry the sender's HLC; the reply carries ours back
+    remote = request.headers.get("X-HLC")
+    if remote is None:
+        return await call_next(request)
+    observe_hlc(remote)
+    response = await call_next(request)
+    response.headers["X-HLC"] = str(hlc.now())
+    return response
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    """Hold a read until this node has applied the writes named in X-Min-Version."""
+    tokens = request.headers.get("X-Min-Version")
+    if tokens and request.method in ("GET", "HEAD"):
+        try:
+            seq = required_seq(tokens)
+        except ValueError:
+            return JSONResponse(status_code=400, content={"detail": "X-Min-Version must be <shard>:<seq> tokens"})
+        if seq > replication_log.last_seq and \
+                not await run_in_threadpool(replication_log.wait_for, seq, CONSISTENCY_TIMEOUT):
+            # the gateway retries the read on another node of the shard
+            return JSONResponse(status_code=503, headers={"X-Version-Behind": version_token(replication_log.last_seq)},
+                                content={"detail": f"This node has not caught up to version {version_token(seq)} yet"})
+    return await call_next(request)
+
+# Registered after the middlewares above so it wraps them: their early
+# 400/503 answers need the CORS headers too
 from fastapi.middleware.cors import CORSMiddleware
 
 app.add_middleware(
@@ -231,7 +668,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-
 # ---------- Internal endpoints ----------
 @app.get("/health")
 def health_check():
@@ -239,502 +675,642 @@ def health_check():
 
 @app.get("/time")
 def time_endpoint():
-    return {"time": time.time()}
+    """This node's corrected physical clock, probed by ClockSync on the other nodes."""
+    return {"time": clock_sync.physical(), "hlc": hlc.now()}
 
-@app.post("/update_coordinator")
-def update_coordinator(payload: dict):
-    global coordinator_port
-    new = payload.get("port")
-    if new and isinstance(new, int):
-        old = coordinator_port
-        coordinator_port = new
-        if old != new:
-            print(f"[Server {PORT}] Coordinator updated to {coordinator_port} (via notification)")
-        return {"status": "ok"}
-    raise HTTPException(status_code=400, detail="invalid payload")
+@app.post("/replication/announce")
+async def replication_announce(payload: dict):
+    """A replica reporting the last seq it holds, sent whenever it starts following this node."""
+    try:
+        term = payload.get("term")
+        replicator.announce(int(payload["port"]), int(payload["seq"]), None if term is None else int(term))
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="invalid payload")
+    return {"status": "ok"}
+
+@app.get("/replication/status")
+def replication_status():
+    """Replication queue depth and lag per replica (only meaningful on the coordinator)."""
+    return {"port": PORT, "coordinator": coordinator_port, "term": election.term, **replicator.metrics(),
+            "write_batches": write_pipeline.metrics(), "clock": clock_sync.status()}
+
+# Election messages are handled on the event loop, not the thread pool, so a
+# node busy with requests still answers heartbeats within the lease.
+@app.post("/election/heartbeat")
+async def election_heartbeat(payload: dict):
+    observe_hlc(payload.get("hlc"))
+    try:
+        return election.on_heartbeat(int(payload["term"]), int(payload["leader"]), int(payload["seq"]),
+                                     int(payload.get("last_term", 0)))
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="invalid payload")
+
+@app.get("/election/status")
+async def election_status():
+    return election.status()
+
+@app.post("/election/nominate")
+async def election_nominate():
+    election.nominate()
+    return {"status": "ok"}
+
+async def replica_payload(request: Request, response: Response) -> Dict:
+    """Decode a coordinator request body in whatever wire format it was sent."""
+    response.headers[wire.ACCEPT_HEADER] = wire.accept_value()
+    try:
+        payload = wire.decode(await request.body(), request.headers.get("content-type"),
+                              request.headers.get("content-encoding"))
+    except wire.UnsupportedEncoding as e:
+        raise HTTPException(status_code=415, detail=f"unsupported replication encoding: {e}",
+                            headers={wire.ACCEPT_HEADER: wire.accept_value()})
+    except Exception:
+        raise HTTPException(status_code=400, detail="undecodable replication payload")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="invalid replication payload")
+    return payload
 
 @app.post("/push_state")
-def push_state(payload: dict):
-    """Replace local replicated state with coordinator snapshot (best-effort)."""
-    global MEDICINES, USERS, APPOINTMENTS, DOCTOR_RATINGS, MEDICINE_SALES
+async def push_state(request: Request, response: Response):
+    """Replace local replicated state with coordinator snapshot (used when a replica is too far behind for deltas)."""
+    payload = await replica_payload(request, response)
+    return await run_in_threadpool(install_state, payload)
+
+def install_state(payload: Dict):
     meds = payload.get("medicines")
     users = payload.get("users")
     apps = payload.get("appointments")
     doctor_ratings = payload.get("doctor_ratings")
     medicine_sales = payload.get("medicine_sales")
-    if not isinstance(meds, list) or not isinstance(users, list) or not isinstance(apps, list) or not isinstance(doctor_ratings, dict) or not isinstance(medicine_sales, list):
+    if not isinstance(meds, list) or not isinstance(users, list) or not isinstance(apps, list) or not isinstance(doctor_ratings, dict) or not isinstance(medicine_sales, (list, dict)):
         raise HTTPException(status_code=400, detail="invalid state payload")
-    with lock:
-        MEDICINES = [m.copy() for m in meds]
-        USERS = [u.copy() for u in users]
-        APPOINTMENTS = [a.copy() for a in apps]
-        DOCTOR_RATINGS = {int(k): v.copy() for k, v in doctor_ratings.items()}
-        MEDICINE_SALES =  [mr.copy() for mr in medicine_sales]
-    print(f"[Server {PORT}] Received full state snapshot from coordinator")
-    return {"status": "synced"}
+    global last_snapshot_seq
+    with state_locked(writes=LOCK_ORDER):
+        load_state(payload)
+    observe_hlc(payload.get("hlc"))
+    # the snapshot replaces whatever this node had logged
+    last_snapshot_seq = wal.checkpoint(snapshot_state)
+    print(f"[Server {PORT}] Received full state snapshot from coordinator (seq {replication_log.last_seq})")
+    return {"status": "synced", "seq": replication_log.last_seq}
+
+@app.post("/apply_deltas")
+async def apply_deltas(request: Request, response: Response):
+    """Apply an ordered batch of replication log entries from the coordinator."""
+    payload = await replica_payload(request, response)
+    return await run_in_threadpool(apply_entries, payload)
+
+def apply_entries(payload: Dict):
+    entries = payload.get("entries")
+    if not isinstance(entries, list):
+        raise HTTPException(status_code=400, detail="invalid delta payload")
+    with state_locked(writes=LOCK_ORDER):
+        # wherever both logs have an entry, the coordinator's must agree with ours
+        diverged = bool(entries) and not same_term(entries[0]["seq"] - 1, payload.get("prev_term"))
+        for entry in entries:
+            if diverged:
+                break
+            if entry["seq"] <= replication_log.last_seq:
+                diverged = not same_term(entry["seq"], entry.get("term", 0))
+                continue  # already applied
+            if entry["seq"] != replication_log.last_seq + 1:
+                # gap: tell the coordinator where we are so it can resend or snapshot
+                break
+            apply_delta(entry)
+            replication_log.append_entry(entry)
+            wal.append(entry)
+        if entries:
+            observe_hlc(entries[-1].get("hlc"))
+        seq = replication_log.last_seq
+        if diverged:
+            # applied deltas cannot be undone: the coordinator replaces our state with a snapshot
+            status = "diverged"
+        else:
+            status = "applied" if not entries or entries[-1]["seq"] <= seq else "behind"
+    # only acknowledge what is durable here
+    wal.sync()
+    return {"status": status, "seq": seq}
+
+def same_term(seq: int, term: Optional[int]) -> bool:
+    """False only if this node's log holds entry `seq` from a term other than `term`."""
+    if term is None or seq > replication_log.last_seq:
+        return True
+    mine = replication_log.term_at(seq)
+    return mine is None or mine == term
 
 # ---------- Authentication endpoints ----------
 @app.post("/signup")
-def signup(req: SignupRequest):
+def signup(req: SignupRequest, consistency: Optional[str] = Header(None, alias="X-Consistency")):
+    require_owner(sharding.user_key(req.username))
     # writes must go via coordinator
-    current_coord = ensure_coordinator_alive_check()
-    if current_coord != PORT:
-        try:
-            r = requests.post(f"http://127.0.0.1:{current_coord}/signup", json=req.dict(), timeout=REQ_TIMEOUT)
-            return r.json()
-        except Exception:
-            elect_coordinator()
-            if coordinator_port != PORT:
-                raise HTTPException(status_code=503, detail="Coordinator unreachable; try again")
+    level = consistency_level(consistency, "signup")
+    forwarded = forward_to_coordinator("POST", "/signup", req.dict(), consistency=level)
+    if forwarded is not None:
+        return forwarded
     # coordinator handles signup
-    with lock:
-        uid = next(_id_counter)
-        USERS.append({"id": uid, "username": req.username, "password": req.password})
+    def apply():
+        uid = next_id()
+        user = {"id": uid, "username": req.username, "password": req.password}
+        USERS.add(user)
+        record("user_put", user=user.copy())
+        return uid
+    uid = write_pipeline.submit(apply, writes=[users_lock])
     print(f"[Server {PORT}] New signup: {req.username} (id={uid})")
-    push_full_state_to_replicas()
-    return {"status": "SUCCESS", "user_id": uid}
+    return acknowledged({"status": "SUCCESS", "user_id": uid}, level)
 
 @app.post("/login")
 def login(req: LoginRequest):
+    require_owner(sharding.user_key(req.username))
     # login is read-only; can be served locally
-    with lock:
-        for u in USERS:
-            if u["username"] == req.username and u["password"] == req.password:
-                return {"status": "SUCCESS", "user_id": u["id"]}
+    with users_lock.read():
+        u = USERS.authenticate(req.username, req.password)
+        if u:
+            return {"status": "SUCCESS", "user_id": u["id"]}
     raise HTTPException(status_code=401, detail="Invalid credentials")
 
+@app.get("/users/{user_id}")
+def get_user(user_id: int):
+    with users_lock.read():
+        u = USERS.get(user_id)
+    if not u:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"id": u["id"], "username": u["username"]}
+
+@app.get("/appointments/{appointment_id}")
+def get_appointment(appointment_id: int):
+    with appointments_lock.read():
+        appt = APPOINTMENTS.get(appointment_id)
+        if not appt:
+            raise HTTPException(status_code=404, detail="Appointment not found")
+        return appt.to_dict()
+
+# List endpoints below return the whole list by default. With `cursor`/`limit`
+# they return one page plus `next_cursor` (pages are in id order); with
+# `Accept: application/x-ndjson` or `format=ndjson` they stream one item per line.
 @app.get("/users/{user_id}/appointments")
-def list_appointments(user_id: int):
-    async_clock_sync()
-    with lock:
-        user_appts = [a for a in APPOINTMENTS if a["user_id"] == user_id]
-    return {"appointments": user_appts}
+def list_appointments(request: Request, user_id: int, cursor: Optional[str] = Query(None),
+                      limit: Optional[int] = Query(None, ge=1, le=paging.MAX_LIMIT),
+                      fmt: Optional[str] = Query(None, alias="format")):
+    def fetch(after, n):
+        with appointments_lock.read():
+            return [(a.id, a.to_dict()) for a in APPOINTMENTS.for_user_after(user_id, after, n)]
+    def full():
+        with appointments_lock.read():
+            return {"appointments": [a.to_dict() for a in APPOINTMENTS.for_user(user_id)]}
+    return list_response(request, "appointments", fetch, cursor, limit, fmt, full)
 
 @app.get("/users/{user_id}/prescriptions")
-def list_prescriptions(user_id: int):
-    with lock:
-        user_appts = [a for a in APPOINTMENTS if a["user_id"] == user_id and a.get("prescription")]
-        prescriptions = [{"appointment_id": a["id"], "prescription": a["prescription"]} for a in user_appts]
-    return {"prescriptions": prescriptions}
+def list_prescriptions(request: Request, user_id: int, cursor: Optional[str] = Query(None),
+                       limit: Optional[int] = Query(None, ge=1, le=paging.MAX_LIMIT),
+                       fmt: Optional[str] = Query(None, alias="format")):
+    def fetch(after, n):
+        with appointments_lock.read():
+            appts = APPOINTMENTS.for_user_after(user_id, after, n, where=lambda a: a.prescription)
+            return [(a.id, {"appointment_id": a.id, "prescription": a.prescription_items()}) for a in appts]
+    def full():
+        with appointments_lock.read():
+            return {"prescriptions": [{"appointment_id": a.id, "prescription": a.prescription_items()}
+                                      for a in APPOINTMENTS.for_user(user_id) if a.prescription]}
+    return list_response(request, "prescriptions", fetch, cursor, limit, fmt, full)
 
 # ---------- Doctor & Appointment endpoints ----------
+def fetch_doctors(after: Optional[int], n: int):
+    # read-only, so no lock
+    return [(d["id"], d) for d in DOCTORS if after is None or d["id"] > after][:n]
+
 @app.get("/doctors")
-def get_doctors():
-    # read-only
-    return {"doctors": DOCTORS}
+def get_doctors(request: Request, cursor: Optional[str] = Query(None),
+                limit: Optional[int] = Query(None, ge=1, le=paging.MAX_LIMIT),
+                fmt: Optional[str] = Query(None, alias="format")):
+    return list_response(request, "doctors", fetch_doctors, cursor, limit, fmt,
+                         lambda: cached_response(request, "doctors", ("doctors",), lambda: {"doctors": DOCTORS}))
+
+def parse_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+
+def requested_slot(day: Optional[str], time_slot: str, field: str = "time_slot") -> Optional[str]:
+    """Slot key for a booking request, or None if no date was given (see `open_slot`).
+
+    The date only ever comes from `day`; `time_slot` must be a bare HH:MM.
+    """
+    if not is_time_of_day(time_slot):
+        raise HTTPException(status_code=400, detail=f"{field} must be HH:MM")
+    if day is None:
+        return None
+    d = parse_date(day)
+    if d < date.today():
+        raise HTTPException(status_code=400, detail="date is in the past")
+    return slot_key(d, time_slot)
+
+def open_slot(doctor_id: int, key: Optional[str], time_slot: str) -> Optional[str]:
+    """The dated slot to book, or None if it is not offered or already taken.
+
+    Without a requested date (`key` is None) this is the next free occurrence
+    of `time_slot`, so an undated request can never double-book a dated slot.
+    Caller must hold `appointments_lock` for writing.
+    """
+    if key is None:
+        return SCHEDULE.next_free_at(doctor_id, time_slot, datetime.now(), SCHEDULE_MAX_DAYS,
+                                     APPOINTMENTS.is_booked)
+    if not SCHEDULE.offers(doctor_id, key) or APPOINTMENTS.is_booked(doctor_id, key):
+        return None
+    return key
+
+def free_slots(doctor: Dict, day: Optional[date]) -> List[str]:
+    """Free times on `day`; without a day, the times an undated booking can still get.
+
+    Caller must hold `appointments_lock`.
+    """
+    if day is None:
+        return SCHEDULE.free_times(doctor["id"], datetime.now(), SCHEDULE_MAX_DAYS, APPOINTMENTS.is_booked)
+    return SCHEDULE.free_on(doctor["id"], day, APPOINTMENTS.is_booked)
 
 @app.get("/doctors/{doctor_id}/available")
-def get_doctor_available(doctor_id: int):
-    for d in DOCTORS:
-        if d["id"] == doctor_id:
-            # filter out already booked times
-            with lock:
-                booked = [a["time_slot"] for a in APPOINTMENTS if a["doctor_id"] == doctor_id]
-            available = [t for t in d["available_slots"] if t not in booked]
-            return {"doctor_id": doctor_id, "available_slots": available}
-    raise HTTPException(status_code=404, detail="Doctor not found")
+def get_doctor_available(doctor_id: int, day: Optional[str] = Query(None, alias="date")):
+    d = DOCTORS_BY_ID.get(doctor_id)
+    if not d:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    require_owner(sharding.doctor_key(doctor_id))
+    on = parse_date(day) if day else None
+    # filter out already booked times
+    with appointments_lock.read():
+        available = free_slots(d, on)
+    return {"doctor_id": doctor_id, "date": day, "available_slots": available}
+
+@app.get("/doctors/availability")
+def get_all_availability(day: Optional[str] = Query(None, alias="date")):
+    """Free slots of every doctor (in sharded mode, of this shard's doctors) in one call."""
+    on = parse_date(day) if day else None
+    with appointments_lock.read():
+        doctors = [{"doctor_id": d["id"], "available_slots": free_slots(d, on)} for d in OWNED_DOCTORS]
+    return {"date": day, "doctors": doctors}
+
+@app.get("/doctors/next_available")
+def next_available(specialty: Optional[str] = Query(None), n: int = Query(5, ge=1, le=500),
+                   after: Optional[str] = Query(None), days: int = Query(30, ge=1, le=SCHEDULE_MAX_DAYS)):
+    """Earliest free dated slots across all doctors (of one specialty, if given)."""
+    try:
+        start = datetime.fromisoformat(after) if after else datetime.now()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="after must be an ISO date or datetime")
+    doctor_ids = SCHEDULE.doctors_with(specialty) if specialty else list(DOCTORS_BY_ID)
+    doctor_ids = [d for d in doctor_ids if owns(sharding.doctor_key(d))]
+    with appointments_lock.read():
+        found = SCHEDULE.next_free(doctor_ids, n, start, days, APPOINTMENTS.is_booked)
+    return {"slots": [{"doctor_id": doc_id, "doctor_name": DOCTORS_BY_ID[doc_id]["name"],
+                       "date": key[:10], "time": t, "time_slot": key} for key, doc_id, t in found]}
 
 @app.post("/ratings/{doctor_id}")
-def rate_doctor(doctor_id: int, req: RatingRequest):
+def rate_doctor(doctor_id: int, req: RatingRequest,
+                consistency: Optional[str] = Header(None, alias="X-Consistency")):
+    require_global()
     # writes go through coordinator
-    current_coord = ensure_coordinator_alive_check()
-    if current_coord != PORT:
-        try:
-            r = requests.post(f"http://127.0.0.1:{current_coord}/ratings/{doctor_id}", json=req.dict(), timeout=REQ_TIMEOUT)
-            return r.json()
-        except Exception:
-            elect_coordinator()
-            if coordinator_port != PORT:
-                raise HTTPException(status_code=503, detail="Coordinator unreachable; try again")
+    level = consistency_level(consistency, "rating")
+    forwarded = forward_to_coordinator("POST", f"/ratings/{doctor_id}", req.dict(), consistency=level)
+    if forwarded is not None:
+        return forwarded
     # coordinator rates
-    with lock:
+    def apply():
         if doctor_id not in DOCTOR_RATINGS:
             DOCTOR_RATINGS[doctor_id] = []
         DOCTOR_RATINGS[doctor_id].append(req.rating)
+        record("rating_add", doctor_id=doctor_id, rating=req.rating)
+    write_pipeline.submit(apply, writes=[ratings_lock])
     print(f"[Server {PORT}] User {req.user_id} gave a rating of {req.rating} to Doctor {doctor_id}")
-    push_full_state_to_replicas()
-    return {"status": "SUCCESS"}
+    return acknowledged({"status": "SUCCESS"}, level)
 
 @app.get("/ratings/{doctor_id}")
-def get_doctor_rating(doctor_id: int):
-    with lock:
+def get_doctor_rating(doctor_id: int, request: Request):
+    require_global()
+    def build():
         ratings = DOCTOR_RATINGS.get(doctor_id, [])
         avg = sum(ratings)/len(ratings) if ratings else None
-    return {"average_rating": avg, "num_ratings": len(ratings)}
+        return {"average_rating": avg, "num_ratings": len(ratings)}
+    return cached_response(request, ("ratings", doctor_id), (f"ratings:{doctor_id}",), build, guard=ratings_lock)
         
 @app.post("/book")
-def book_appointment(req: BookRequest):
+def book_appointment(req: BookRequest, consistency: Optional[str] = Header(None, alias="X-Consistency")):
+    require_owner(sharding.doctor_key(req.doctor_id))
     # writes go through coordinator
-    current_coord = ensure_coordinator_alive_check()
-    if current_coord != PORT:
-        try:
-            r = requests.post(f"http://127.0.0.1:{current_coord}/book", json=req.dict(), timeout=REQ_TIMEOUT)
-            return r.json()
-        except Exception:
-            elect_coordinator()
-            if coordinator_port != PORT:
-                raise HTTPException(status_code=503, detail="Coordinator unreachable; try again")
-    # coordinator books
-    with lock:
+    level = consistency_level(consistency, "book")
+    forwarded = forward_to_coordinator("POST", "/book", req.dict(), consistency=level)
+    if forwarded is not None:
+        return forwarded
+    # coordinator books; in sharded mode the user may live on another shard
+    user_shard = RING.shard_for(sharding.id_key(req.user_id))
+    if user_shard != MY_SHARD and req.user_id not in REMOTE_USERS:
+        if shard_get(user_shard, f"/users/{req.user_id}") is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        REMOTE_USERS.add(req.user_id)
+    requested = requested_slot(req.date, req.time_slot)
+    def apply():
         # simple checks
-        if not any(u["id"] == req.user_id for u in USERS):
+        if user_shard == MY_SHARD and req.user_id not in USERS:
             raise HTTPException(status_code=404, detail="User not found")
-        doc = next((d for d in DOCTORS if d["id"] == req.doctor_id), None)
+        doc = DOCTORS_BY_ID.get(req.doctor_id)
         if not doc:
             raise HTTPException(status_code=404, detail="Doctor not found")
         # check availability
-        booked = [a["time_slot"] for a in APPOINTMENTS if a["doctor_id"] == req.doctor_id]
-        if req.time_slot in booked or req.time_slot not in doc["available_slots"]:
-            return {"status": "FAILED", "message": "Time slot not available"}
-        aid = next(_id_counter)
-        APPOINTMENTS.append({"id": aid, "user_id": req.user_id, "doctor_id": req.doctor_id,
-                             "time_slot": req.time_slot, "symptoms": [], "prescription": []})
-    print(f"[Server {PORT}] Appointment booked: id={aid} user={req.user_id} doctor={req.doctor_id} at {req.time_slot}")
-    push_full_state_to_replicas()
-    return {"status": "SUCCESS", "appointment_id": aid}
+        key = open_slot(req.doctor_id, requested, req.time_slot)
+        if key is None:
+            return None
+        appt = Appointment(next_id(), req.user_id, req.doctor_id, key)
+        APPOINTMENTS.put(appt)
+        record("appointment_put", appointment=appt.to_dict())
+        return appt
+    appt = write_pipeline.submit(apply, reads=[users_lock], writes=[appointments_lock])
+    if appt is None:
+        return {"status": "FAILED", "message": "Time slot not available"}
+    print(f"[Server {PORT}] Appointment booked: id={appt.id} user={req.user_id} doctor={req.doctor_id} "
+          f"at {appt.time_slot}")
+    return acknowledged({"status": "SUCCESS", "appointment_id": appt.id, "time_slot": appt.time_slot}, level)
 
 @app.delete("/appointments/{appointment_id}")
-def cancel_appointment(appointment_id: int):
-    current_coord = ensure_coordinator_alive_check()
-    if current_coord != PORT:
-        try:
-            r = requests.delete(f"http://127.0.0.1:{current_coord}/appointments/{appointment_id}", timeout=REQ_TIMEOUT)
-            return r.json()
-        except:
-            elect_coordinator()
-            if coordinator_port != PORT:
-                raise HTTPException(status_code=503, detail="Coordinator unreachable")
-    with lock:
-        idx = next((i for i, a in enumerate(APPOINTMENTS) if a["id"] == appointment_id), None)
-        if idx is None:
+def cancel_appointment(appointment_id: int, consistency: Optional[str] = Header(None, alias="X-Consistency")):
+    require_owner(sharding.id_key(appointment_id))
+    level = consistency_level(consistency, "cancel")
+    forwarded = forward_to_coordinator("DELETE", f"/appointments/{appointment_id}", consistency=level)
+    if forwarded is not None:
+        return forwarded
+    def apply():
+        if APPOINTMENTS.remove(appointment_id) is None:
             raise HTTPException(status_code=404, detail="Appointment not found")
-        APPOINTMENTS.pop(idx)
-    push_full_state_to_replicas()
-    return {"status": "SUCCESS", "message": "Appointment canceled"}
+        record("appointment_delete", appointment_id=appointment_id)
+    write_pipeline.submit(apply, writes=[appointments_lock])
+    return acknowledged({"status": "SUCCESS", "message": "Appointment canceled"}, level)
 
 @app.post("/appointments/{appointment_id}/reschedule")
-def reschedule_appointment(appointment_id: int, req: RescheduleRequest):
-    current_coord = ensure_coordinator_alive_check()
-    if current_coord != PORT:
-        try:
-            r = requests.post(f"http://127.0.0.1:{current_coord}/appointments/{appointment_id}/reschedule", json=req.dict(), timeout=REQ_TIMEOUT)
-            return r.json()
-        except:
-            elect_coordinator()
-            if coordinator_port != PORT:
-                raise HTTPException(status_code=503, detail="Coordinator unreachable")
-    with lock:
-        appt = next((a for a in APPOINTMENTS if a["id"] == appointment_id), None)
+def reschedule_appointment(appointment_id: int, req: RescheduleRequest,
+                           consistency: Optional[str] = Header(None, alias="X-Consistency")):
+    require_owner(sharding.id_key(appointment_id))
+    level = consistency_level(consistency, "reschedule")
+    forwarded = forward_to_coordinator("POST", f"/appointments/{appointment_id}/reschedule", req.dict(),
+                                       consistency=level)
+    if forwarded is not None:
+        return forwarded
+    requested = requested_slot(req.new_date, req.new_time_slot, "new_time_slot")
+    def apply():
+        appt = APPOINTMENTS.get(appointment_id)
         if not appt:
             raise HTTPException(status_code=404, detail="Appointment not found")
         # check doctor availability
-        doc = next((d for d in DOCTORS if d["id"] == appt["doctor_id"]), None)
-        if req.new_time_slot not in doc["available_slots"] or req.new_time_slot in [a["time_slot"] for a in APPOINTMENTS if a["doctor_id"] == doc["id"]]:
-            return {"status": "FAILED", "message": "Time slot not available"}
-        appt["time_slot"] = req.new_time_slot
-    push_full_state_to_replicas()
-    return {"status": "SUCCESS", "new_time_slot": req.new_time_slot}
+        key = open_slot(appt.doctor_id, requested, req.new_time_slot)
+        if key is None:
+            return None
+        APPOINTMENTS.reschedule(appt, key)
+        record("appointment_put", appointment=appt.to_dict())
+        return key
+    key = write_pipeline.submit(apply, writes=[appointments_lock])
+    if key is None:
+        return {"status": "FAILED", "message": "Time slot not available"}
+    return acknowledged({"status": "SUCCESS", "new_time_slot": key}, level)
 
 @app.post("/consult")
-def consult(req: ConsultRequest):
+def consult(req: ConsultRequest, consistency: Optional[str] = Header(None, alias="X-Consistency")):
     """
     Simulate doctor consultation:
     - store symptoms into appointment (if an appointment exists for that user & doctor → latest)
     - return a simple diagnosis + prescription (list of medicine_id + qty)
     """
+    require_owner(sharding.id_key(req.appointment_id))
     # treat consult as write because it may update appointment/prescription
-    current_coord = ensure_coordinator_alive_check()
-    if current_coord != PORT:
-        try:
-            r = requests.post(f"http://127.0.0.1:{current_coord}/consult", json=req.dict(), timeout=REQ_TIMEOUT)
-            return r.json()
-        except Exception:
-            elect_coordinator()
-            if coordinator_port != PORT:
-                raise HTTPException(status_code=503, detail="Coordinator unreachable; try again")
-    # simple symptom -> disease mapping
-    symptom_text = " ".join(req.symptoms).lower()
-    print(f"[Server {PORT}] Consulting for symptoms: {symptom_text}")
-    symptom_text = symptom_text.lower()
-    if "fever" in symptom_text or "temperature" in symptom_text:
-        disease = "Fever"
-        prescription = [{"medicine_id": 0, "quantity": 2}]  # Paracetamol
-
-    elif "cough" in symptom_text or "cold" in symptom_text or "sneeze" in symptom_text:
-        disease = "Common Cold"
-        prescription = [{"medicine_id": 0, "quantity": 1}]  # Paracetamol
-        if len(MEDICINES) > 3:
-            prescription.append({"medicine_id": 3, "quantity": 1})  # Cough Syrup
-
-    elif "headache" in symptom_text or "migraine" in symptom_text or "pain" in symptom_text:
-        disease = "Headache/Pain"
-        prescription = [{"medicine_id": 1, "quantity": 2}]  # Ibuprofen
-
-    elif "sore throat" in symptom_text or "throat" in symptom_text or "infection" in symptom_text:
-        disease = "Throat Infection"
-        prescription = [{"medicine_id": 2, "quantity": 1}]  # Amoxicillin
-
-    elif "acidity" in symptom_text or "heartburn" in symptom_text or "stomach pain" in symptom_text:
-        disease = "Acidity"
-        prescription = [{"medicine_id": 4, "quantity": 1}]  # Antacid
-
-    elif "allergy" in symptom_text or "itching" in symptom_text or "rash" in symptom_text:
-        disease = "Allergy"
-        prescription = [{"medicine_id": 5, "quantity": 1}]  # Cetirizine
-
-    elif "sugar" in symptom_text or "diabetes" in symptom_text or "high glucose" in symptom_text:
-        disease = "Diabetes"
-        prescription = [{"medicine_id": 6, "quantity": 1}]  # Metformin
-
-    elif "chest pain" in symptom_text or "blood pressure" in symptom_text or "bp" in symptom_text:
-        disease = "Hypertension"
-        prescription = [{"medicine_id": 17, "quantity": 1}]  # Losartan
-
-    elif "bone pain" in symptom_text or "weakness" in symptom_text or "vitamin" in symptom_text:
-        disease = "Vitamin Deficiency"
-        prescription = [{"medicine_id": 9, "quantity": 1}]  # Vitamin D3
-
-    elif "infection" in symptom_text or "bacteria" in symptom_text or "antibiotic" in symptom_text:
-        disease = "Bacterial Infection"
-        prescription = [{"medicine_id": 12, "quantity": 1}]  # Ciprofloxacin
-
-    elif "asthma" in symptom_text or "breath" in symptom_text or "respiratory" in symptom_text:
-        disease = "Respiratory Illness"
-        prescription = [{"medicine_id": 3, "quantity": 1}, {"medicine_id": 5, "quantity": 1}]  # Cough Syrup + Antihistamine
-
-    elif "stomach" in symptom_text or "diarrhea" in symptom_text or "loose motion" in symptom_text:
-        disease = "Gastrointestinal Infection"
-        prescription = [{"medicine_id": 12, "quantity": 1}]  # Ciprofloxacin
-
-    elif "joint pain" in symptom_text or "arthritis" in symptom_text:
-        disease = "Arthritis"
-        prescription = [{"medicine_id": 1, "quantity": 2}, {"medicine_id": 15, "quantity": 1}]  # Ibuprofen + Hydroxychloroquine
-
-    else:
-        disease = "General Checkup"
-        prescription = [{"medicine_id": 10 if len(MEDICINES)>10 else 0, "quantity": 1}]  # Multivitamin or fallback Paracetamol
-
+    level = consistency_level(consistency, "consult")
+    forwarded = forward_to_coordinator("POST", "/consult", req.dict(), consistency=level)
+    if forwarded is not None:
+        return forwarded
+    print(f"[Server {PORT}] Consulting for symptoms: {' '.join(req.symptoms).lower()}")
+    disease, prescription = SYMPTOM_RULES.diagnose(req.symptoms)
 
     # store into latest appointment if exists
-    with lock:
+    def apply():
         # find latest appointment for this user and doctor without prescription yet
-        appt = next((a for a in APPOINTMENTS if a["id"] == req.appointment_id), None)
+        appt = APPOINTMENTS.get(req.appointment_id)
         if not appt:
             raise HTTPException(status_code=404, detail="Appointment not found")
-        user_id = appt["user_id"]
-        doctor_id = appt["doctor_id"]
         # store symptoms and prescription
-        appt["symptoms"] = req.symptoms
-        appt["prescription"] = prescription
+        appt.set_consult(req.symptoms, ((p["medicine_id"], p["quantity"]) for p in prescription))
+        record("appointment_put", appointment=appt.to_dict())
+        return appt.user_id
+    user_id = write_pipeline.submit(apply, writes=[appointments_lock])
     print(f"[Server {PORT}] Consult done for user {user_id}. Diagnosis: {disease}. Prescription: {prescription}")
-    push_full_state_to_replicas()
     # respond with diagnosis & prescription
-    return {"diagnosis": disease, "prescription": prescription}
+    return acknowledged({"diagnosis": disease, "prescription": prescription}, level)
+
+@app.post("/consult/batch")
+def consult_batch(req: ConsultBatchRequest, consistency: Optional[str] = Header(None, alias="X-Consistency")):
+    """Diagnose a queue of appointments: one forward, one lock acquisition and one replication round."""
+    level = consistency_level(consistency, "consult")
+    forwarded = forward_to_coordinator("POST", "/consult/batch", req.dict(), consistency=level)
+    if forwarded is not None:
+        return forwarded
+    # matching needs no state, so it runs before the lock is taken
+    diagnoses = [SYMPTOM_RULES.diagnose(c.symptoms) for c in req.consultations]
+    def apply():
+        results = []
+        for c, (disease, prescription) in zip(req.consultations, diagnoses):
+            appt = APPOINTMENTS.get(c.appointment_id)
+            if not appt:
+                results.append({"appointment_id": c.appointment_id, "status": "FAILED",
+                                "message": "Appointment not found"})
+                continue
+            appt.set_consult(c.symptoms, ((p["medicine_id"], p["quantity"]) for p in prescription))
+            record("appointment_put", appointment=appt.to_dict())
+            results.append({"appointment_id": c.appointment_id, "status": "SUCCESS",
+                            "diagnosis": disease, "prescription": prescription})
+        return results
+    results = write_pipeline.submit(apply, writes=[appointments_lock])
+    done = sum(r["status"] == "SUCCESS" for r in results)
+    print(f"[Server {PORT}] Batch consult: {done}/{len(results)} appointments diagnosed")
+    return acknowledged({"results": results}, level)
 
 # ---------- Pharmacy endpoints (reads/writes) ----------
+def fetch_medicines(after: Optional[int], n: int):
+    start = 0 if after is None else max(after + 1, 0)  # ids are list positions
+    with medicines_lock.read():
+        return [(m.id, m.to_dict()) for m in MEDICINES[start:start + n]]
+
 @app.get("/medicines")
-def get_medicines(appointment_id: Optional[int] = Query(None)):
-    ensure_coordinator_alive_check()
-    async_clock_sync()
-    with lock:
-        if appointment_id is None:
-            return {"medicines": MEDICINES}
-        # find appointment
-        appt = next((a for a in APPOINTMENTS if a["id"] == appointment_id), None)
-        if not appt:
-            raise HTTPException(status_code=404, detail="Appointment not found")
-        prescription = appt.get("prescription", [])
-        if not prescription:
-            return {"medicines": []}
+def get_medicines(request: Request, appointment_id: Optional[int] = Query(None),
+                  cursor: Optional[str] = Query(None),
+                  limit: Optional[int] = Query(None, ge=1, le=paging.MAX_LIMIT),
+                  fmt: Optional[str] = Query(None, alias="format")):
+    require_global()
+    if appointment_id is None:
+        full = lambda: cached_response(request, "medicines", ("medicines",),
+                                       lambda: {"medicines": [m.to_dict() for m in MEDICINES]}, guard=medicines_lock)
+        return list_response(request, "medicines", fetch_medicines, cursor, limit, fmt, full)
+    # find appointment (in sharded mode it may live on another shard)
+    appt = find_appointment(appointment_id)
+    if not appt:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    if not appt.prescription:
+        return {"medicines": []}
+    with medicines_lock.read():
         # return detailed medicine info
         meds = []
-        for item in prescription:
-            med_id = item["medicine_id"]
+        for med_id, qty in appt.prescription:
             if med_id < 0 or med_id >= len(MEDICINES):
                 continue
-            med_info = MEDICINES[med_id].copy()
-            med_info["quantity"] = item["quantity"]
+            med_info = MEDICINES[med_id].to_dict()
+            med_info["quantity"] = qty
             meds.append(med_info)
         return {"medicines": meds}
 @app.get("/medicines/search")
-def search_medicines(name: str = Query(...)):
-    with lock:
-        results = [m for m in MEDICINES if name.lower() in m["name"].lower()]
-    return {"results": results}
+def search_medicines(request: Request, name: str = Query(...), limit: Optional[int] = Query(None, ge=1, le=200),
+                     offset: int = Query(0, ge=0)):
+    """Ranked type-ahead search: name prefix, then word prefix, substring, and typo matches.
+
+    Every match by default, like the other list endpoints; type-ahead callers pass `limit`.
+    """
+    require_global()
+    def build():
+        ids, more = MEDICINE_INDEX.search(name, limit, offset)
+        return {"results": [MEDICINES[i].to_dict() for i in ids], "offset": offset, "limit": limit,
+                "next_offset": offset + limit if more else None}
+    key = ("search", " ".join(name.lower().split()), limit, offset)
+    return cached_response(request, key, ("medicines",), build, guard=medicines_lock)
 
 @app.post("/medicines/{medicine_id}/restock")
-def restock_medicine(medicine_id: int, quantity: int = Query(...)):
-    current_coord = ensure_coordinator_alive_check()
-    if current_coord != PORT:
-        try:
-            r = requests.post(f"http://127.0.0.1:{current_coord}/medicines/{medicine_id}/restock?quantity={quantity}", timeout=REQ_TIMEOUT)
-            return r.json()
-        except:
-            elect_coordinator()
-            if coordinator_port != PORT:
-                raise HTTPException(status_code=503, detail="Coordinator unreachable")
-    with lock:
+def restock_medicine(medicine_id: int, quantity: int = Query(...),
+                     consistency: Optional[str] = Header(None, alias="X-Consistency")):
+    require_global()
+    level = consistency_level(consistency, "restock")
+    forwarded = forward_to_coordinator("POST", f"/medicines/{medicine_id}/restock?quantity={quantity}",
+                                       consistency=level)
+    if forwarded is not None:
+        return forwarded
+    def apply():
         if medicine_id < 0 or medicine_id >= len(MEDICINES):
             raise HTTPException(status_code=404, detail="Medicine not found")
-        MEDICINES[medicine_id]["stock"] += quantity
-    push_full_state_to_replicas()
-    return {"status": "SUCCESS", "new_stock": MEDICINES[medicine_id]["stock"]}
+        MEDICINES[medicine_id].stock += quantity
+        record("medicine_put", medicine=MEDICINES[medicine_id].to_dict())
+        return MEDICINES[medicine_id].stock
+    new_stock = write_pipeline.submit(apply, writes=[medicines_lock])
+    return acknowledged({"status": "SUCCESS", "new_stock": new_stock}, level)
 
 @app.post("/buy")
-def buy_medicine(request: BuyRequest):
+def buy_medicine(request: BuyRequest, consistency: Optional[str] = Header(None, alias="X-Consistency")):
+    require_global()
     # keep backward compatibility for single-item buys
-    current_coord = ensure_coordinator_alive_check()
-    if current_coord != PORT:
-        try:
-            r = requests.post(f"http://127.0.0.1:{current_coord}/buy", json=request.dict(), timeout=REQ_TIMEOUT)
-            return r.json()
-        except Exception:
-            elect_coordinator()
-            if coordinator_port != PORT:
-                raise HTTPException(status_code=503, detail="Coordinator unreachable; try again")
-    with lock:
+    level = consistency_level(consistency, "purchase")
+    forwarded = forward_to_coordinator("POST", "/buy", request.dict(), consistency=level)
+    if forwarded is not None:
+        return forwarded
+    def apply():
         if request.medicine_id < 0 or request.medicine_id >= len(MEDICINES):
             raise HTTPException(status_code=404, detail="Medicine not found")
-        med = MEDICINES[request.medicine_id]
-        if med["stock"] < request.quantity:
-            return {"status": "FAILED", "message": f"Not enough stock of {med['name']}"}
-        med["stock"] -= request.quantity
-        MEDICINE_SALES.append({
-            "medicine_id": request.medicine_id,
-            "sold_qty": request.quantity,
-            "price": med["price"]
-        })
-
-        snapshot = [m.copy() for m in MEDICINES]
-    print(f"[Server {PORT}] (COORDINATOR) {request.name} bought {request.quantity} {med['name']}")
-    push_full_state_to_replicas()
-    async_clock_sync()
-    return {"status": "SUCCESS", "message": f"{request.name} bought {request.quantity} {med['name']}"}
+        return sell([(request.medicine_id, request.quantity)])
+    failed, _ = write_pipeline.submit(apply, writes=[medicines_lock])
+    if failed:
+        return {"status": "FAILED", "message": failed}
+    med = MEDICINES[request.medicine_id]
+    print(f"[Server {PORT}] (COORDINATOR) {request.name} bought {request.quantity} {med.name}")
+    return acknowledged({"status": "SUCCESS", "message": f"{request.name} bought {request.quantity} {med.name}"},
+                        level)
 
 @app.post("/buy_bulk")
-def buy_bulk(request: BuyBulkRequest):
+def buy_bulk(request: BuyBulkRequest, consistency: Optional[str] = Header(None, alias="X-Consistency")):
     """
     Accepts a prescription or arbitrary items:
     - checks stocks for all items, if any insufficient -> FAIL (no partial)
     - otherwise coordinator decrements stocks and replicates
     """
-    current_coord = ensure_coordinator_alive_check()
-    if current_coord != PORT:
-        try:
-            r = requests.post(f"http://127.0.0.1:{current_coord}/buy_bulk", json=request.dict(), timeout=REQ_TIMEOUT)
-            return r.json()
-        except Exception:
-            elect_coordinator()
-            if coordinator_port != PORT:
-                raise HTTPException(status_code=503, detail="Coordinator unreachable; try again")
-    with lock:
-        # check all items
-        for it in request.items:
-            if it.medicine_id < 0 or it.medicine_id >= len(MEDICINES):
-                raise HTTPException(status_code=404, detail=f"Medicine id {it.medicine_id} not found")
-            if MEDICINES[it.medicine_id]["stock"] < it.quantity:
-                return {"status": "FAILED", "message": f"Not enough stock of {MEDICINES[it.medicine_id]['name']}"}
-        # all ok -> decrement
-        total_cost = 0
-        for it in request.items:
-            MEDICINES[it.medicine_id]["stock"] -= it.quantity
-            MEDICINE_SALES.append({
-                "medicine_id": it.medicine_id,
-                "sold_qty": it.quantity,
-                "price": MEDICINES[it.medicine_id]["price"]
-            })
-
-            total_cost += MEDICINES[it.medicine_id].get("price", 0) * it.quantity
-        snapshot = [m.copy() for m in MEDICINES]
+    require_global()
+    level = consistency_level(consistency, "purchase")
+    forwarded = forward_to_coordinator("POST", "/buy_bulk", request.dict(), consistency=level)
+    if forwarded is not None:
+        return forwarded
+    items = [(it.medicine_id, it.quantity) for it in request.items]
+    failed, total_cost = write_pipeline.submit(lambda: sell(items), writes=[medicines_lock])
+    if failed:
+        return {"status": "FAILED", "message": failed}
     print(f"[Server {PORT}] (COORDINATOR) User {request.user_id} bought items {request.items}")
-    push_full_state_to_replicas()
-    async_clock_sync()
-    return {"status": "SUCCESS", "total_cost": total_cost}
+    return acknowledged({"status": "SUCCESS", "total_cost": total_cost}, level)
 
 @app.post("/buy_prescription")
-def buy_prescription(req: BuyPrescriptionRequest):
-    current_coord = ensure_coordinator_alive_check()
-    if current_coord != PORT:
-        try:
-            r = requests.post(f"http://127.0.0.1:{current_coord}/buy_prescription", json=req.dict(), timeout=REQ_TIMEOUT)
-            return r.json()
-        except Exception:
-            elect_coordinator()
-            if coordinator_port != PORT:
-                raise HTTPException(status_code=503, detail="Coordinator unreachable; try again")
-
-    with lock:
-        # find appointment
-        appt = next((a for a in APPOINTMENTS if a["id"] == req.appointment_id), None)
-        if not appt:
-            raise HTTPException(status_code=404, detail="Appointment not found")
-
-        prescription = appt.get("prescription", [])
-        if not prescription:
-            return {"status": "FAILED", "message": "No prescription found for this appointment"}
-
-        # check stock for all items
-        for item in prescription:
-            med_id = item["medicine_id"]
-            qty = item["quantity"]
-            if med_id < 0 or med_id >= len(MEDICINES):
-                raise HTTPException(status_code=404, detail=f"Medicine id {med_id} not found")
-            if MEDICINES[med_id]["stock"] < qty:
-                return {"status": "FAILED", "message": f"Not enough stock of {MEDICINES[med_id]['name']}"}
-
-        # decrement stock and calculate total cost
-        total_cost = 0
-        for item in prescription:
-            med_id = item["medicine_id"]
-            qty = item["quantity"]
-            MEDICINES[med_id]["stock"] -= qty
-            MEDICINE_SALES.append({
-                "medicine_id": med_id,
-                "sold_qty": qty,
-                "price": MEDICINES[med_id]["price"]
-            })
-
-            total_cost += MEDICINES[med_id]["price"] * qty
-
-    print(f"[Server {PORT}] (COORDINATOR) User {appt['user_id']} bought prescription for appointment {req.appointment_id}")
-    push_full_state_to_replicas()
-    async_clock_sync()
-    return {"status": "SUCCESS", "total_cost": total_cost, "prescription": prescription}
+def buy_prescription(req: BuyPrescriptionRequest, consistency: Optional[str] = Header(None, alias="X-Consistency")):
+    require_global()
+    level = consistency_level(consistency, "purchase")
+    forwarded = forward_to_coordinator("POST", "/buy_prescription", req.dict(), consistency=level)
+    if forwarded is not None:
+        return forwarded
+
+    # find appointment (in sharded mode it may live on another shard)
+    appt = find_appointment(req.appointment_id)
+    if not appt:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    prescription = appt.prescription_items()
+    if not prescription:
+        return {"status": "FAILED", "message": "No prescription found for this appointment"}
+
+    items = [(item["medicine_id"], item["quantity"]) for item in prescription]
+    failed, total_cost = write_pipeline.submit(lambda: sell(items), writes=[medicines_lock])
+    if failed:
+        return {"status": "FAILED", "message": failed}
+
+    print(f"[Server {PORT}] (COORDINATOR) User {appt.user_id} bought prescription for appointment {req.appointment_id}")
+    return acknowledged({"status": "SUCCESS", "total_cost": total_cost, "prescription": prescription}, level)
+
+def fetch_sales_totals(after: Optional[int], n: int):
+    with medicines_lock.read():
+        ids = heapq.nsmallest(n, (mid for mid in SALES_TOTALS if after is None or mid > after))
+        return [(mid, {"medicine_id": mid, "name": MEDICINES[mid].name, **SALES_TOTALS[mid]}) for mid in ids]
 
 @app.get("/reports/sales")
-def sales_report():
-    with lock:
-        print("\n[MAP REDUCE] Generating Sales Report\n")
-        # --- Map stage ---
-        mapped = []
-        for x in MEDICINE_SALES:
-            name = MEDICINES[x["medicine_id"]]["name"]
-            revenue = x["sold_qty"] * x["price"]
-            mapped.append((name, revenue))
-            print(f"[MAP] {x} -> ({name}, {revenue})")
-        
-        # --- Shuffle / group stage ---
-        grouped = defaultdict(list)
-        for key, value in mapped:
-            grouped[key].append(value)
-        print("\n[SHUFFLE / GROUP] Grouped by medicine:")
-        for k, v in grouped.items():
-            print(f"{k}: {v}")
-        
-        # --- Reduce stage ---
-        reduced = []
-        print("\n[REDUCE] Summing revenues per medicine:")
-        for k, v in grouped.items():
-            total = sum(v)
-            reduced.append((k, total))
-            print(f"{k}: {total}")
-        
-        total_revenue = sum(amount for _, amount in reduced)
-        print(f"\n[TOTAL REVENUE] {total_revenue}\n")
-
-    return {"medicine_sales": reduced, "total_revenue": total_revenue}
+def sales_report(request: Request, cursor: Optional[str] = Query(None),
+                 limit: Optional[int] = Query(None, ge=1, le=paging.MAX_LIMIT),
+                 fmt: Optional[str] = Query(None, alias="format")):
+    """Per-medicine running totals; pages and streams carry one row per medicine."""
+    require_global()
+    def full():
+        # running totals, so this costs O(#medicines) however many sales there are
+        with medicines_lock.read():
+            revenue = [(MEDICINES[mid].name, agg["revenue"]) for mid, agg in SALES_TOTALS.items()]
+            quantities = [(MEDICINES[mid].name, agg["quantity"]) for mid, agg in SALES_TOTALS.items()]
+        total_revenue = sum(amount for _, amount in revenue)
+        return {"medicine_sales": revenue, "medicine_quantities": quantities, "total_revenue": total_revenue}
+    return list_response(request, "sales", fetch_sales_totals, cursor, limit, fmt, full)
+
+SALES_WINDOWS = {"hour": 3600, "day": 86400}  # buckets are aligned to the epoch, i.e. UTC days
+
+def sales_columns():
+    require_global()
+    # the views stay valid after the lock is released, so aggregation runs unlocked
+    with medicines_lock.read():
+        return SALES.columns(), {m.id: m.name for m in MEDICINES}
+
+@app.get("/reports/sales/by_medicine")
+def sales_by_medicine(start: Optional[float] = Query(None), end: Optional[float] = Query(None)):
+    columns, names = sales_columns()
+    ids, qty, revenue = sales_engine.by_medicine(columns, start, end)
+    return {"medicines": [{"medicine_id": m, "name": names.get(m), "quantity": q, "revenue": r}
+                          for m, q, r in zip(ids.tolist(), qty.tolist(), revenue.tolist())],
+            "total_quantity": int(qty.sum()), "total_revenue": float(revenue.sum())}
+
+@app.get("/reports/sales/by_window")
+def sales_by_window(window: str = Query("day"), start: Optional[float] = Query(None),
+                    end: Optional[float] = Query(None), medicine_id: Optional[int] = Query(None)):
+    if window not in SALES_WINDOWS:
+        raise HTTPException(status_code=400, detail="window must be 'hour' or 'day'")
+    columns, _ = sales_columns()
+    starts, qty, revenue = sales_engine.by_window(columns, SALES_WINDOWS[window], start, end, medicine_id)
+    return {"window": window,
+            "buckets": [{"start": t, "quantity": q, "revenue": r}
+                        for t, q, r in zip(starts.tolist(), qty.tolist(), revenue.tolist())]}
+
+@app.get("/reports/sales/top")
+def sales_top(n: int = Query(5, ge=1), by: str = Query("revenue"),
+              start: Optional[float] = Query(None), end: Optional[float] = Query(None)):
+    if by not in ("revenue", "quantity"):
+        raise HTTPException(status_code=400, detail="by must be 'revenue' or 'quantity'")
+    columns, names = sales_columns()
+    ids, qty, revenue = sales_engine.top(columns, n, by, start, end)
+    return {"by": by,
+            "medicines": [{"medicine_id": m, "name": names.get(m), "quantity": q, "revenue": r}
+                          for m, q, r in zip(ids.tolist(), qty.tolist(), revenue.tolist())]}
 # ---------- Run ----------
 if __name__ == "__main__":
-    print(f"Starting server on port {PORT}. Initial coordinator: {coordinator_port}")
+    print(f"Starting server on port {PORT}. Replica group: {ALL_PORTS}")
     import uvicorn
     uvicorn.run("main:app", host="127.0.0.1", port=PORT)
\ No newline at end of file
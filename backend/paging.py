@@ -0,0 +1,70 @@
+# paging.py
+"""Cursor pagination and NDJSON streaming for list endpoints.
+
+A paginated list is ordered by an integer key (usually the item id) and is
+read through a ``fetch(after, n)`` callback returning up to ``n`` ``(key,
+item)`` pairs with keys greater than ``after`` (``None`` = from the start).
+A cursor is an opaque token for "after key k": unlike an offset it stays
+correct when earlier items are added or removed between pages.
+
+Streaming calls ``fetch`` once per STREAM_CHUNK items. The callback takes
+the collection lock itself, so the lock is released before each chunk is
+sent: a slow client never holds a lock and the full result is never built
+in memory.
+"""
+import base64
+import json
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+NDJSON = "application/x-ndjson"
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+STREAM_CHUNK = 256
+
+Fetch = Callable[[Optional[int], int], List[Tuple[int, Dict]]]
+
+
+def encode_cursor(key: int) -> str:
+    return base64.urlsafe_b64encode(f"a{key}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: Optional[str]) -> Optional[int]:
+    """The key a cursor points after; raises ValueError on a malformed token."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("malformed cursor")
+    if not raw.startswith("a"):
+        raise ValueError("malformed cursor")
+    return int(raw[1:])
+
+
+def wants_stream(accept: str, fmt: Optional[str]) -> bool:
+    """NDJSON is chosen by ``Accept: application/x-ndjson`` or ``?format=ndjson``."""
+    return fmt == "ndjson" or NDJSON in accept
+
+
+def page(fetch: Fetch, after: Optional[int], limit: int) -> Tuple[List[Dict], Optional[str]]:
+    """(items, next cursor or None on the last page)."""
+    rows = fetch(after, limit + 1)  # one extra tells whether there is a next page
+    if len(rows) <= limit:
+        return [item for _, item in rows], None
+    rows = rows[:limit]
+    return [item for _, item in rows], encode_cursor(rows[-1][0])
+
+
+def stream(fetch: Fetch, after: Optional[int], limit: Optional[int] = None) -> Iterator[bytes]:
+    """One JSON object per line, at most ``limit`` of them (all if None)."""
+    remaining = limit
+    while remaining is None or remaining > 0:
+        n = STREAM_CHUNK if remaining is None else min(STREAM_CHUNK, remaining)
+        rows = fetch(after, n)
+        if rows:
+            yield "".join(json.dumps(item) + "\n" for _, item in rows).encode()
+            after = rows[-1][0]
+        if len(rows) < n:
+            return
+        if remaining is not None:
+            remaining -= len(rows)
@@ -0,0 +1,142 @@
+# pipeline.py
+"""Group-commit write pipeline for the coordinator.
+
+Write handlers hand their state change to ``WritePipeline.submit`` as an
+``apply`` callback instead of taking locks themselves. A single applier
+thread collects waiting writes into a batch, takes the union of their locks
+once and runs the callbacks back to back in arrival order; a committer
+thread then persists and replicates the whole batch with one ``commit`` and
+wakes every caller with its own result.
+
+A batch is gathered for as long as the previous one is still being
+committed, but never longer than ``window``. A lone write on an idle node
+therefore goes through at once, and under load each fsync carries
+everything that arrived while the one before it was running.
+
+Each callback sees the state left by the ones before it and must check
+everything before it mutates anything: an exception (typically an
+HTTPException) is handed back to that caller only and the rest of the
+batch goes on. All-or-nothing operations such as a bulk purchase therefore
+stay atomic, and two purchases in one batch can never both take the last
+unit of stock.
+"""
+import queue
+import threading
+import time
+from contextlib import AbstractContextManager
+from typing import Any, Callable, Iterable, List, Optional
+
+Locker = Callable[[Iterable, Iterable], AbstractContextManager]
+
+
+class _Write:
+    __slots__ = ("apply", "reads", "writes", "result", "error", "version", "done")
+
+    def __init__(self, apply: Callable[[], Any], reads, writes):
+        self.apply = apply
+        self.reads = tuple(reads)
+        self.writes = tuple(writes)
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.version = 0
+        self.done = threading.Event()
+
+
+class WritePipeline:
+
+    def __init__(self, locker: Locker, commit: Callable[[], None], window: float = 0.002,
+                 max_batch: int = 256, version: Callable[[], int] = lambda: 0):
+        self._locker = locker
+        self._commit = commit
+        self._version = version  # log position after a write, see last_version()
+        self._local = threading.local()
+        self.window = window
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._incoming: List[_Write] = []
+        self._committing = 0  # batches handed to the committer and not yet durable
+        self._applied: "queue.SimpleQueue[List[_Write]]" = queue.SimpleQueue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._writes = 0
+        self._largest = 0
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        if not self._threads:
+            for target, name in ((self._apply_loop, "write-applier"), (self._commit_loop, "write-committer")):
+                t = threading.Thread(target=target, name=name, daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, apply: Callable[[], Any], reads=(), writes=()):
+        """Run `apply` under the given locks in the next batch; its result once the batch is durable.
+
+        Re-raises whatever `apply` raised. Blocks the calling thread, so call it
+        from a threadpool handler, never from the event loop.
+        """
+        write = _Write(apply, reads, writes)
+        with self._cond:
+            self._incoming.append(write)
+            self._cond.notify_all()
+        write.done.wait()
+        self._local.version = write.version
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def last_version(self) -> int:
+        """`version()` right after the calling thread's latest write was applied."""
+        return getattr(self._local, "version", 0)
+
+    def metrics(self):
+        with self._stats_lock:
+            return {"batches": self._batches, "writes": self._writes, "largest_batch": self._largest,
+                    "mean_batch": round(self._writes / self._batches, 2) if self._batches else 0}
+
+    # ---------- Background threads ----------
+    def _collect(self) -> List[_Write]:
+        with self._cond:
+            self._cond.wait_for(lambda: self._incoming)
+            deadline = time.monotonic() + self.window
+            self._cond.wait_for(lambda: not self._committing or len(self._incoming) >= self.max_batch,
+                                timeout=max(0.0, deadline - time.monotonic()))
+            batch = self._incoming[:self.max_batch]
+            del self._incoming[:self.max_batch]
+            self._committing += 1
+            return batch
+
+    def _apply_loop(self):
+        while True:
+            batch = self._collect()
+            writes = {lock for w in batch for lock in w.writes}
+            reads = {lock for w in batch for lock in w.reads} - writes
+            with self._locker(reads, writes):
+                for w in batch:
+                    try:
+                        w.result = w.apply()
+                    except BaseException as e:
+                        w.error = e
+                    w.version = self._version()
+            self._applied.put(batch)
+
+    def _commit_loop(self):
+        while True:
+            batch = self._applied.get()
+            # the callbacks have already appended their log entries, so one
+            # commit makes the whole batch durable and queues it for replicas
+            try:
+                self._commit()
+            except BaseException as e:
+                for w in batch:
+                    if w.error is None:
+                        w.error = e
+            with self._stats_lock:
+                self._batches += 1
+                self._writes += len(batch)
+                self._largest = max(self._largest, len(batch))
+            with self._cond:
+                self._committing -= 1
+                self._cond.notify_all()
+            for w in batch:
+                w.done.set()
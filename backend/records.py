@@ -0,0 +1,57 @@
+# records.py
+"""Compact record types for medicines and appointments.
+
+Records are slotted classes (no per-instance ``__dict__``). Strings that
+repeat across many records (time slots, symptoms) are interned, and list
+fields are stored as tuples: an appointment's prescription is a tuple of
+``(medicine_id, quantity)`` pairs. ``to_dict``/``from_dict`` convert to and
+from the JSON shapes served by the API and shipped between nodes.
+"""
+import sys
+from typing import Dict, Iterable, List, Tuple
+
+
+class Medicine:
+    __slots__ = ("id", "name", "stock", "price")
+
+    def __init__(self, id: int, name: str, stock: int, price):
+        self.id = id
+        self.name = name
+        self.stock = stock
+        self.price = price
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "Medicine":
+        return cls(d["id"], d["name"], d["stock"], d["price"])
+
+    def to_dict(self) -> Dict:
+        return {"id": self.id, "name": self.name, "stock": self.stock, "price": self.price}
+
+
+class Appointment:
+    __slots__ = ("id", "user_id", "doctor_id", "time_slot", "symptoms", "prescription")
+
+    def __init__(self, id: int, user_id: int, doctor_id: int, time_slot: str,
+                 symptoms: Iterable[str] = (), prescription: Iterable[Tuple[int, int]] = ()):
+        self.id = id
+        self.user_id = user_id
+        self.doctor_id = doctor_id
+        self.time_slot = sys.intern(time_slot)
+        self.set_consult(symptoms, prescription)
+
+    def set_consult(self, symptoms: Iterable[str], prescription: Iterable[Tuple[int, int]]):
+        self.symptoms = tuple(sys.intern(s) for s in symptoms)
+        self.prescription = tuple(prescription)
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "Appointment":
+        return cls(d["id"], d["user_id"], d["doctor_id"], d["time_slot"], d.get("symptoms", ()),
+                   ((p["medicine_id"], p["quantity"]) for p in d.get("prescription", ())))
+
+    def prescription_items(self) -> List[Dict]:
+        return [{"medicine_id": m, "quantity": q} for m, q in self.prescription]
+
+    def to_dict(self) -> Dict:
+        return {"id": self.id, "user_id": self.user_id, "doctor_id": self.doctor_id,
+                "time_slot": self.time_slot, "symptoms": list(self.symptoms),
+                "prescription": self.prescription_items()}
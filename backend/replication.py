@@ -0,0 +1,258 @@
+# replication.py
+"""Ordered, sequence-numbered log of state deltas shipped from the coordinator to replicas."""
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+# Write consistency levels: which acknowledgements a write waits for before
+# the client hears back. All of them wait for the coordinator's own fsync.
+ASYNC = "async"        # none from replicas; they catch up in the background
+ONE = "one"            # at least one replica has the write on disk
+MAJORITY = "majority"  # a majority of the replica group, coordinator included
+CONSISTENCY_LEVELS = (ASYNC, ONE, MAJORITY)
+
+
+def replica_acks_needed(level: str, group_size: int) -> int:
+    """How many replicas must acknowledge a write at `level` in a group of `group_size` nodes."""
+    if level == ASYNC:
+        return 0
+    if level == ONE:
+        return min(1, group_size - 1)
+    return group_size // 2
+
+
+class ReplicationLog:
+    """Bounded in-memory log of write deltas.
+
+    Every write on the coordinator appends one or more entries. Replicas apply
+    the entries in order and append them to their own log under the same
+    sequence numbers, so whichever node becomes coordinator next can keep
+    shipping deltas from where the others are.
+
+    Entries carry the election term they were written in. Two logs that hold
+    the same term at the same seq agree up to there; a different term means
+    one of them kept writes a deposed coordinator never replicated.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self._entries = deque(maxlen=capacity)
+        self._seq = 0
+        self._term = 0
+        self._base = (0, 0)  # (seq, term) the log was last reset to
+        self._lock = threading.Condition(threading.Lock())
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    @property
+    def last_term(self) -> int:
+        return self._term
+
+    def append(self, op: str, **data) -> Dict:
+        """Record a new delta produced locally (coordinator side); pass its ``term``."""
+        with self._lock:
+            self._seq += 1
+            entry = {"seq": self._seq, "ts": time.time(), "op": op, **data}
+            self._entries.append(entry)
+            self._term = entry.get("term", 0)
+            self._lock.notify_all()
+            return entry
+
+    def append_entry(self, entry: Dict) -> bool:
+        """Record a delta received from the coordinator (replica side).
+
+        Returns False if the entry does not directly follow the last one.
+        """
+        with self._lock:
+            if entry["seq"] != self._seq + 1:
+                return False
+            self._seq = entry["seq"]
+            self._entries.append(entry)
+            self._term = entry.get("term", 0)
+            self._lock.notify_all()
+            return True
+
+    def term_at(self, seq: int) -> Optional[int]:
+        """Term of entry ``seq``, or None if this log no longer (or never) had it."""
+        with self._lock:
+            if seq == self._seq:
+                return self._term
+            if seq == self._base[0]:
+                return self._base[1]
+            first = self._entries[0]["seq"] if self._entries else self._seq + 1
+            if first <= seq < self._seq:
+                return self._entries[seq - first].get("term", 0)
+            return None
+
+    def since(self, seq: int) -> Optional[List[Dict]]:
+        """Entries with a sequence number greater than ``seq``.
+
+        Returns None when some of the requested entries have already been
+        evicted, i.e. the caller is too far behind and needs a full snapshot.
+        """
+        with self._lock:
+            if seq >= self._seq:
+                return []
+            first = self._entries[0]["seq"] if self._entries else self._seq + 1
+            if seq + 1 < first:
+                return None
+            # sequence numbers in the log are contiguous, so skip straight to the first one needed
+            return list(itertools.islice(self._entries, seq + 1 - first, None))
+
+    def timestamp_of(self, seq: int) -> Optional[float]:
+        """When entry ``seq`` was recorded, if it is still in the log."""
+        with self._lock:
+            if not self._entries:
+                return None
+            idx = seq - self._entries[0]["seq"]
+            if 0 <= idx < len(self._entries):
+                return self._entries[idx]["ts"]
+            return None
+
+    def reset(self, seq: int, term: int = 0, history: Iterable[Dict] = ()):
+        """Drop all entries and continue numbering after ``seq``, written in ``term`` (used after a snapshot).
+
+        ``history`` may hold logged entries the snapshot already reflects; the
+        contiguous run of them ending at ``seq`` is kept, so replicas a little
+        behind can still be sent deltas.
+        """
+        kept: List[Dict] = []
+        for entry in history:
+            if kept and entry["seq"] != kept[-1]["seq"] + 1:
+                kept = []
+            kept.append(entry)
+        if not kept or kept[-1]["seq"] != seq:
+            kept = []
+        with self._lock:
+            self._entries.clear()
+            self._entries.extend(kept)
+            self._seq = seq
+            self._term = term
+            self._base = (seq, term)
+            self._lock.notify_all()
+
+    def wait_for(self, seq: int, timeout: Optional[float] = None) -> bool:
+        """Block until entry ``seq`` is in the log (or a snapshot past it was loaded)."""
+        with self._lock:
+            return self._lock.wait_for(lambda: self._seq >= seq, timeout=timeout)
+
+
+class Replicator:
+    """Long-lived replication driver for the coordinator.
+
+    Each replica's queue is simply the tail of the log past the last sequence
+    number it acknowledged, so any number of writes that land while a push is
+    in flight are coalesced into the next batch. At most one push per replica
+    and ``max_in_flight`` pushes overall run at a time. Failed replicas are
+    retried with exponential backoff rather than dropped.
+    """
+
+    def __init__(self, log: ReplicationLog, ports: List[int], push: Callable[[int, int], int],
+                 active: Callable[[], bool], max_in_flight: int = 2,
+                 retry_interval: float = 0.5, max_backoff: float = 10.0):
+        self._log = log
+        self._ports = list(ports)
+        self._push = push          # push(port, acked_seq) -> new acked seq
+        self._active = active      # only the coordinator pushes
+        self._retry_interval = retry_interval
+        self._max_backoff = max_backoff
+        self._acked: Dict[int, int] = {p: 0 for p in ports}
+        self._failures: Dict[int, int] = {p: 0 for p in ports}
+        self._retry_at: Dict[int, float] = {p: 0.0 for p in ports}
+        self._in_flight: Set[int] = set()
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="replicator")
+        self._max_in_flight = max_in_flight
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="replicator", daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        """Wake the replicator after a write; cheap enough to call under the state lock."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def announce(self, port: int, seq: int, term: Optional[int] = None):
+        """A replica reported the seq (and term) it holds, e.g. after either side restarted: push from there now."""
+        # past our log end, or at a different term, it holds entries we never
+        # wrote; counting those as acks would pass wait_acked for writes it lacks.
+        # -1: nothing is logged that far back, so the next push is a snapshot
+        if seq > self._log.last_seq or (term is not None and self._log.term_at(seq) not in (None, term)):
+            seq = -1
+        with self._cond:
+            if port not in self._acked:
+                return
+            self._acked[port] = seq
+            self._failures[port] = 0
+            self._retry_at[port] = 0.0
+            self._cond.notify_all()
+
+    def wait_acked(self, seq: int, replicas: int, timeout: Optional[float] = None) -> bool:
+        """Block until at least `replicas` replicas have acknowledged everything up to `seq`.
+
+        Replicas are pushed to in parallel, so this waits for the fastest ones.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: sum(a >= seq for a in self._acked.values()) >= replicas,
+                                       timeout=timeout)
+
+    def _due(self, now: float) -> List[int]:
+        last = self._log.last_seq
+        due = [p for p in self._ports
+               if p not in self._in_flight and self._acked[p] < last and self._retry_at[p] <= now]
+        return due[:self._max_in_flight - len(self._in_flight)]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due = self._due(time.time()) if self._active() else []
+                while not due:
+                    self._cond.wait(timeout=self._retry_interval)
+                    due = self._due(time.time()) if self._active() else []
+                self._in_flight.update(due)
+            for p in due:
+                self._pool.submit(self._push_one, p)
+
+    def _push_one(self, port: int):
+        try:
+            acked = self._push(port, self._acked[port])
+            with self._cond:
+                self._acked[port] = acked
+                self._failures[port] = 0
+                self._retry_at[port] = 0.0
+        except Exception as e:
+            with self._cond:
+                self._failures[port] += 1
+                backoff = min(self._max_backoff, self._retry_interval * 2 ** (self._failures[port] - 1))
+                self._retry_at[port] = time.time() + backoff
+            print(f"[Replicator] push to {port} failed ({e}); retrying in {backoff:.1f}s")
+        finally:
+            with self._cond:
+                self._in_flight.discard(port)
+                # entries may have arrived while we were pushing; writers may be waiting for this ack
+                self._cond.notify_all()
+
+    def metrics(self) -> Dict:
+        """Per-replica acknowledged seq, queue depth and replication lag."""
+        now = time.time()
+        last = self._log.last_seq
+        with self._cond:
+            replicas = {}
+            for p in self._ports:
+                acked = self._acked[p]
+                oldest = self._log.timestamp_of(acked + 1) if acked < last else None
+                replicas[p] = {
+                    "acked_seq": acked,
+                    "queue_depth": last - acked,
+                    "lag_seconds": round(now - oldest, 3) if oldest else 0.0,
+                    "in_flight": p in self._in_flight,
+                    "consecutive_failures": self._failures[p],
+                }
+            return {"last_seq": last, "in_flight": len(self._in_flight), "replicas": replicas}
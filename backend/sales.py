@@ -0,0 +1,164 @@
+# sales.py
+"""Columnar sales ledger with vectorized report aggregations."""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+MAX_BUCKET_SPAN = 1 << 20  # widest bucket range by_window counts densely
+SALE_FIELDS = ("medicine_id", "sold_qty", "price", "timestamp")  # replicated sale keys, in column order
+
+
+class SalesLedger:
+    """Append-only sales stored as parallel NumPy columns.
+
+    Columns: medicine_id (int32), quantity (int32), unit price (float64) and
+    timestamp (float64, epoch seconds). Appends go under the medicines write
+    lock; readers call ``columns()`` under the read lock and can aggregate
+    after releasing it, because the returned views never see later appends
+    (growth reallocates rather than resizing in place).
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._n = 0
+        self._alloc(capacity)
+
+    def _alloc(self, capacity: int):
+        old = getattr(self, "_medicine", None)
+        medicine = np.empty(capacity, dtype=np.int32)
+        quantity = np.empty(capacity, dtype=np.int32)
+        price = np.empty(capacity, dtype=np.float64)
+        ts = np.empty(capacity, dtype=np.float64)
+        if old is not None:
+            n = self._n
+            medicine[:n] = self._medicine[:n]
+            quantity[:n] = self._quantity[:n]
+            price[:n] = self._price[:n]
+            ts[:n] = self._ts[:n]
+        self._medicine, self._quantity, self._price, self._ts = medicine, quantity, price, ts
+
+    def __len__(self) -> int:
+        return self._n
+
+    def append(self, medicine_id: int, quantity: int, price: float, timestamp: float):
+        if self._n == len(self._medicine):
+            self._alloc(2 * len(self._medicine))
+        i = self._n
+        self._medicine[i] = medicine_id
+        self._quantity[i] = quantity
+        self._price[i] = price
+        self._ts[i] = timestamp
+        self._n += 1
+
+    def extend(self, medicine_ids, quantities, prices, timestamps):
+        """Bulk append from array-likes of equal length."""
+        k = len(medicine_ids)
+        if self._n + k > len(self._medicine):
+            self._alloc(max(2 * len(self._medicine), self._n + k))
+        sl = slice(self._n, self._n + k)
+        self._medicine[sl] = medicine_ids
+        self._quantity[sl] = quantities
+        self._price[sl] = prices
+        self._ts[sl] = timestamps
+        self._n += k
+
+    def load(self, sales):
+        """Replace the contents from snapshot columns (see ``column_lists``) or sale dicts (older snapshots)."""
+        if isinstance(sales, dict):
+            columns = [sales[field] for field in SALE_FIELDS]
+        else:
+            records = list(sales)
+            columns = [[r["medicine_id"] for r in records], [r["sold_qty"] for r in records],
+                       [r["price"] for r in records], [r.get("timestamp", 0.0) for r in records]]
+        self._n = 0
+        self._alloc(max(1024, len(columns[0])))
+        if len(columns[0]):
+            self.extend(*columns)
+
+    def records(self) -> List[Dict]:
+        """Sales as dicts in the replicated JSON shape."""
+        medicine, quantity, price, ts = self.columns()
+        return [{"medicine_id": m, "sold_qty": q, "price": int(p) if p.is_integer() else p, "timestamp": t}
+                for m, q, p, t in zip(medicine.tolist(), quantity.tolist(), price.tolist(), ts.tolist())]
+
+    def columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        n = self._n
+        return self._medicine[:n], self._quantity[:n], self._price[:n], self._ts[:n]
+
+
+# ---------- Aggregations (operate on columns, no locks needed) ----------
+def column_lists(columns) -> Dict[str, list]:
+    """Columns as plain lists keyed by sale field: the snapshot form, built without holding the lock."""
+    return {field: column.tolist() for field, column in zip(SALE_FIELDS, columns)}
+
+
+def totals(columns) -> Dict[int, Dict]:
+    """{medicine_id: {"quantity", "revenue"}} in first-sale order, for every medicine sold."""
+    medicine, quantity, price, _ = columns
+    if not len(medicine):
+        return {}
+    ids, first = np.unique(medicine, return_index=True)
+    qty = np.bincount(medicine, weights=quantity)[ids]
+    revenue = np.bincount(medicine, weights=quantity * price)[ids]
+    order = np.argsort(first, kind="stable")
+    return {m: {"quantity": int(q), "revenue": int(r) if r.is_integer() else r}
+            for m, q, r in zip(ids[order].tolist(), qty[order].tolist(), revenue[order].tolist())}
+
+
+def _window(columns, start: Optional[float], end: Optional[float]):
+    medicine, quantity, price, ts = columns
+    if start is None and end is None:
+        return medicine, quantity, price, ts
+    mask = np.ones(len(ts), dtype=bool)
+    if start is not None:
+        mask &= ts >= start
+    if end is not None:
+        mask &= ts < end
+    return medicine[mask], quantity[mask], price[mask], ts[mask]
+
+
+def by_medicine(columns, start: Optional[float] = None, end: Optional[float] = None):
+    """Per-medicine (medicine_ids, quantities, revenues) for medicines with sales in the range."""
+    medicine, quantity, price, _ = _window(columns, start, end)
+    if not len(medicine):
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+    qty = np.bincount(medicine, weights=quantity)
+    revenue = np.bincount(medicine, weights=quantity * price)
+    ids = np.flatnonzero(qty)
+    return ids, qty[ids].astype(np.int64), revenue[ids]
+
+
+def by_window(columns, width: float, start: Optional[float] = None, end: Optional[float] = None,
+              medicine_id: Optional[int] = None):
+    """Totals per fixed-width time bucket: (bucket_starts, quantities, revenues)."""
+    medicine, quantity, price, ts = _window(columns, start, end)
+    if medicine_id is not None:
+        mask = medicine == medicine_id
+        quantity, price, ts = quantity[mask], price[mask], ts[mask]
+    if not len(ts):
+        return np.empty(0), np.empty(0, np.int64), np.empty(0)
+    buckets = np.floor_divide(ts, width)
+    first, last = buckets.min(), buckets.max()
+    if last - first < max(MAX_BUCKET_SPAN, len(buckets)):
+        # offset bincount: no sort, and the count arrays stay small
+        index = (buckets - first).astype(np.int64)
+        qty = np.bincount(index, weights=quantity)
+        revenue = np.bincount(index, weights=quantity * price)
+        keys = np.flatnonzero(qty)
+        return (keys + first) * width, qty[keys].astype(np.int64), revenue[keys]
+    # an outlying timestamp or a tiny width: sized by the buckets in use, not the span
+    keys, index = np.unique(buckets, return_inverse=True)
+    qty = np.bincount(index, weights=quantity, minlength=len(keys))
+    revenue = np.bincount(index, weights=quantity * price, minlength=len(keys))
+    return keys * width, qty.astype(np.int64), revenue
+
+
+def top(columns, n: int, by: str = "revenue", start: Optional[float] = None, end: Optional[float] = None):
+    """The ``n`` best-selling medicines by revenue or quantity: (ids, quantities, revenues)."""
+    ids, qty, revenue = by_medicine(columns, start, end)
+    key = revenue if by == "revenue" else qty
+    if n < len(key):
+        part = np.argpartition(-key, n)[:n]
+    else:
+        part = np.arange(len(key))
+    order = part[np.argsort(-key[part], kind="stable")]
+    return ids[order], qty[order], revenue[order]
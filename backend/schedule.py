@@ -0,0 +1,145 @@
+# schedule.py
+"""Doctor calendars: weekly templates, dated slots and free-slot queries.
+
+A dated slot is keyed ``"YYYY-MM-DD HH:MM"`` and stored in an appointment's
+``time_slot``, so the per-doctor occupancy index in store.py covers dated
+and legacy undated (``"HH:MM"``) bookings alike. A request that names only
+a time books the next free dated occurrence of it (``next_free_at``), so
+new bookings are always dated. Templates only describe what a doctor
+offers; whether a slot is taken is always asked of the appointment table
+through an ``is_booked(doctor_id, slot_key)`` callback.
+"""
+import heapq
+import re
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+IsBooked = Callable[[int, str], bool]
+
+_TIME_OF_DAY = re.compile(r"([01]\d|2[0-3]):[0-5]\d")
+
+
+def is_time_of_day(value: str) -> bool:
+    """Whether ``value`` is a strict "HH:MM" time, the only form a slot's time may take."""
+    return _TIME_OF_DAY.fullmatch(value) is not None
+
+
+def slot_key(day: date, time_slot: str) -> str:
+    return f"{day.isoformat()} {time_slot}"
+
+
+def split_slot(key: str) -> Tuple[Optional[date], str]:
+    """(date or None for an undated slot, "HH:MM"); raises ValueError on a malformed date."""
+    day, sep, time_slot = key.partition(" ")
+    if not sep:
+        return None, key
+    return date.fromisoformat(day), time_slot
+
+
+class Schedule:
+    """Weekly templates and a specialty index over a list of doctor dicts.
+
+    A doctor may carry ``weekly_template`` (``{"mon": ["09:00", ...], ...}``);
+    otherwise its ``available_slots`` are offered every day of the week.
+    """
+
+    def __init__(self, doctors: Iterable[Dict]):
+        self._templates: Dict[int, Tuple[Tuple[str, ...], ...]] = {}
+        self._offered: Dict[int, Tuple[frozenset, ...]] = {}
+        self._by_specialty: Dict[str, List[int]] = {}
+        for d in doctors:
+            self.add_doctor(d)
+
+    def add_doctor(self, doctor: Dict):
+        weekly = doctor.get("weekly_template")
+        if weekly:
+            days = tuple(tuple(sorted(weekly.get(wd, ()))) for wd in WEEKDAYS)
+        else:
+            days = (tuple(sorted(doctor["available_slots"])),) * 7
+        self._templates[doctor["id"]] = days
+        self._offered[doctor["id"]] = tuple(frozenset(times) for times in days)
+        self._by_specialty.setdefault(doctor["specialty"].lower(), []).append(doctor["id"])
+
+    def doctors_with(self, specialty: str) -> List[int]:
+        return self._by_specialty.get(specialty.lower(), [])
+
+    def slots_on(self, doctor_id: int, day: date) -> Tuple[str, ...]:
+        """Template times for ``day``, sorted."""
+        return self._templates[doctor_id][day.weekday()]
+
+    def offers(self, doctor_id: int, key: str) -> bool:
+        """Whether the doctor works at dated slot ``key``."""
+        if doctor_id not in self._templates:
+            return False
+        try:
+            day, time_slot = split_slot(key)
+        except ValueError:
+            return False
+        if day is None:
+            return False
+        return time_slot in self._offered[doctor_id][day.weekday()]
+
+    def free_on(self, doctor_id: int, day: date, is_booked: IsBooked) -> List[str]:
+        return [t for t in self.slots_on(doctor_id, day) if not is_booked(doctor_id, slot_key(day, t))]
+
+    def next_free_at(self, doctor_id: int, time_slot: str, after: datetime, days: int,
+                     is_booked: IsBooked) -> Optional[str]:
+        """Key of the first free occurrence of ``time_slot`` later than ``after``, within ``days``."""
+        offered = self._offered.get(doctor_id)
+        if offered is None:
+            return None
+        day = after.date()
+        until = day + timedelta(days=days)
+        if time_slot <= after.strftime("%H:%M"):
+            day += timedelta(days=1)
+        while day <= until:
+            if time_slot in offered[day.weekday()]:
+                key = slot_key(day, time_slot)
+                if not is_booked(doctor_id, key):
+                    return key
+            day += timedelta(days=1)
+        return None
+
+    def free_times(self, doctor_id: int, after: datetime, days: int, is_booked: IsBooked) -> List[str]:
+        """Times of day, sorted, that still have a free occurrence within ``days`` of ``after``."""
+        times = sorted(set().union(*self._templates[doctor_id]))
+        return [t for t in times if self.next_free_at(doctor_id, t, after, days, is_booked) is not None]
+
+    def _free_iter(self, doctor_id: int, after: datetime, until: date,
+                   is_booked: IsBooked) -> Iterator[Tuple[str, int, str]]:
+        """Free (key, doctor_id, time) of one doctor in chronological order."""
+        templates = self._templates[doctor_id]
+        day = after.date()
+        now = after.strftime("%H:%M")
+        first = True
+        while day <= until:
+            times = templates[day.weekday()]
+            if times:
+                prefix = day.isoformat() + " "
+                for t in times:
+                    if first and t <= now:
+                        continue
+                    key = prefix + t
+                    if not is_booked(doctor_id, key):
+                        yield key, doctor_id, t
+            first = False
+            day += timedelta(days=1)
+
+    def next_free(self, doctor_ids: Sequence[int], n: int, after: datetime, days: int,
+                  is_booked: IsBooked) -> List[Tuple[str, int, str]]:
+        """The ``n`` earliest free slots across ``doctor_ids`` within ``days`` of ``after``.
+
+        Each doctor's calendar is walked lazily and the streams are heap-merged,
+        so the cost grows with ``n`` and the number of doctors, not with the
+        length of the horizon.
+        """
+        until = after.date() + timedelta(days=days)
+        streams = [self._free_iter(d, after, until, is_booked) for d in doctor_ids if d in self._templates]
+        out = []
+        for item in heapq.merge(*streams):
+            out.append(item)
+            if len(out) >= n:
+                break
+        return out
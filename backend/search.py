@@ -0,0 +1,167 @@
+# search.py
+"""Name search index for type-ahead, with ranking and typo tolerance.
+
+Results come in tiers, each filled only if the earlier ones leave room on
+the requested page:
+
+    1. names starting with the query (an exact name sorts first)
+    2. names with a later word starting with the query
+    3. names containing the query anywhere (queries of 3+ characters)
+    4. fuzzy: only when nothing above matched, names containing at least
+       FUZZY_MIN_COVERAGE of the query's trigrams, best coverage first
+
+Tiers 1 and 2 are ranges of two sorted lists (whole names, and each name
+from every later word on), found by bisection, so a type-ahead page costs
+O(log n + page) however many names share the prefix. Tiers 3 and 4 go
+through a trigram index; each word is padded with two leading spaces and
+one trailing space so word boundaries get their own grams.
+"""
+import math
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+FUZZY_MIN_COVERAGE = 0.6
+_AFTER = "\U0010ffff"  # sorts after any character a name can contain
+
+
+def _grams(text: str) -> Set[str]:
+    grams = set()
+    for word in text.split():
+        padded = "  " + word + " "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _normalize(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def _word_suffixes(name: str) -> List[str]:
+    """``name`` from each word after the first onwards."""
+    return [name[i + 1:] for i, ch in enumerate(name) if ch == " "]
+
+
+class SearchIndex:
+    """Names keyed by integer id. Not thread-safe: callers hold the collection lock."""
+
+    def __init__(self):
+        self._names: Dict[int, str] = {}
+        self._grams: Dict[int, Set[str]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._by_name: List[Tuple[str, int]] = []
+        self._by_word: List[Tuple[str, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def put(self, item_id: int, name: str):
+        name = _normalize(name)
+        if self._names.get(item_id) == name:
+            return
+        self.remove(item_id)
+        self._add(item_id, name)
+        insort(self._by_name, (name, item_id))
+        for suffix in _word_suffixes(name):
+            insort(self._by_word, (suffix, item_id))
+
+    def build(self, items: Iterable[Tuple[int, str]]):
+        """Replace the whole index with ``(id, name)`` pairs, sorting each table once instead of per insert."""
+        self.clear()
+        for item_id, name in dict(items).items():
+            name = _normalize(name)
+            self._add(item_id, name)
+            self._by_name.append((name, item_id))
+            self._by_word.extend((suffix, item_id) for suffix in _word_suffixes(name))
+        self._by_name.sort()
+        self._by_word.sort()
+
+    def _add(self, item_id: int, name: str):
+        grams = _grams(name)
+        self._names[item_id] = name
+        self._grams[item_id] = grams
+        for g in grams:
+            self._postings.setdefault(g, set()).add(item_id)
+
+    def remove(self, item_id: int):
+        name = self._names.pop(item_id, None)
+        if name is None:
+            return
+        for g in self._grams.pop(item_id):
+            ids = self._postings[g]
+            ids.discard(item_id)
+            if not ids:
+                del self._postings[g]
+        _discard(self._by_name, (name, item_id))
+        for suffix in _word_suffixes(name):
+            _discard(self._by_word, (suffix, item_id))
+
+    def clear(self):
+        self._names.clear()
+        self._grams.clear()
+        self._postings.clear()
+        self._by_name.clear()
+        self._by_word.clear()
+
+    def search(self, query: str, limit: Optional[int] = None, offset: int = 0,
+               fuzzy: bool = True) -> Tuple[List[int], bool]:
+        """(ids for the requested page, whether more results follow); every match from ``offset`` without a limit."""
+        q = _normalize(query)
+        if not q:
+            return [], False
+        # one extra tells whether there is a next page
+        want = offset + limit + 1 if limit is not None else math.inf
+        found: List[int] = []
+        seen: Set[int] = set()
+        for table in (self._by_name, self._by_word):
+            _prefix_range(table, q, want, seen, found)
+        if len(found) < want and len(q) >= 3:
+            found += self._substring(q, seen)
+        if fuzzy and not found:
+            found = self._fuzzy(q)
+        if limit is None:
+            return found[offset:], False
+        return found[offset:offset + limit], len(found) > offset + limit
+
+    def _substring(self, q: str, exclude: Set[int]) -> List[int]:
+        # grams spanning a space are not indexed; the rest must all be present
+        grams = {q[i:i + 3] for i in range(len(q) - 2)}
+        postings = sorted((self._postings.get(g, set()) for g in grams if " " not in g), key=len)
+        if not postings:
+            return []
+        candidates = postings[0].intersection(*postings[1:])
+        names = self._names
+        hits = sorted((names[i], i) for i in candidates if i not in exclude and q in names[i])
+        return [i for _, i in hits]
+
+    def _fuzzy(self, q: str) -> List[int]:
+        grams = _grams(q)
+        if len(grams) < 3:
+            return []
+        need = math.ceil(FUZZY_MIN_COVERAGE * len(grams))
+        # a name sharing `need` grams must appear in at least one of the
+        # len(grams) - need + 1 rarest postings, so only those are scanned
+        rarest = sorted((self._postings.get(g, set()) for g in grams), key=len)[:len(grams) - need + 1]
+        ranked = []
+        for item_id in set().union(*rarest):
+            n = len(grams & self._grams[item_id])
+            if n >= need:
+                ranked.append((-n, len(self._names[item_id]), item_id))
+        ranked.sort()
+        return [item_id for _, _, item_id in ranked]
+
+
+def _prefix_range(table: List[Tuple[str, int]], q: str, want: int, seen: Set[int], out: List[int]):
+    i = bisect_left(table, (q,))
+    end = bisect_left(table, (q + _AFTER,))
+    while i < end and len(out) < want:
+        item_id = table[i][1]
+        if item_id not in seen:
+            seen.add(item_id)
+            out.append(item_id)
+        i += 1
+
+
+def _discard(table: List[Tuple[str, int]], entry: Tuple[str, int]):
+    i = bisect_left(table, entry)
+    if i < len(table) and table[i] == entry:
+        del table[i]
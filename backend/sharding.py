@@ -0,0 +1,72 @@
+# sharding.py
+"""Shard layout and key placement for sharded mode.
+
+Sharded mode is enabled by ``MEDCARE_SHARDS``, a ``;``-separated list of
+shards, each a ``,``-separated list of backend ports::
+
+    MEDCARE_SHARDS="8001,8002,8003;8005,8006,8007"
+
+Every shard is an independent replica group: its highest live port is the
+primary, the rest are replicas, and the delta replication in main.py only
+runs inside the group. Keys are placed on shards by consistent hashing, so
+adding a shard at the end of the list moves only about 1/n of the keys.
+
+Placement:
+
+* users by username (``user:<name>``); ids are allocated so that
+  ``id:<n>`` hashes to the same shard, so a user is found by id as well
+* appointments by doctor (``doctor:<id>``), so a slot is only ever checked
+  on one shard; their ids, too, hash to the owning shard
+* medicines, sales and ratings are not partitioned and live on GLOBAL_SHARD
+
+Without ``MEDCARE_SHARDS`` there is a single shard and every key maps to it.
+"""
+import hashlib
+import os
+from bisect import bisect_right
+from typing import List, Optional
+
+GLOBAL_SHARD = 0
+VNODES = 256  # ring points per shard; more points even out the load
+
+
+def load_shards(spec: Optional[str] = None) -> List[List[int]]:
+    """Shard port groups from ``spec`` (default: $MEDCARE_SHARDS); [] if unset."""
+    spec = os.environ.get("MEDCARE_SHARDS", "") if spec is None else spec
+    shards = [[int(p) for p in group.split(",") if p.strip()] for group in spec.split(";") if group.strip()]
+    ports = [p for group in shards for p in group]
+    if len(ports) != len(set(ports)):
+        raise ValueError("a port appears in more than one shard")
+    return shards
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring over shard indexes ``0 .. shards-1``."""
+
+    def __init__(self, shards: int, vnodes: int = VNODES):
+        self.shards = shards
+        points = sorted((_hash(f"shard-{s}#{v}"), s) for s in range(shards) for v in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [s for _, s in points]
+
+    def shard_for(self, key: str) -> int:
+        if self.shards == 1:
+            return 0
+        i = bisect_right(self._hashes, _hash(key))
+        return self._owners[i % len(self._owners)]
+
+
+def user_key(username: str) -> str:
+    return f"user:{username}"
+
+
+def doctor_key(doctor_id: int) -> str:
+    return f"doctor:{doctor_id}"
+
+
+def id_key(record_id: int) -> str:
+    return f"id:{record_id}"
@@ -0,0 +1,135 @@
+# store.py
+"""Hash-indexed tables for the replicated state.
+
+Users are plain dicts; appointments are compact ``records.Appointment``
+objects, converted to their JSON shape only at the API and replication
+boundary. None of the tables lock internally: callers hold the collection
+locks in main.py.
+"""
+import heapq
+import sys
+from typing import Callable, Dict, Iterable, List, Optional
+
+from records import Appointment
+
+
+class UserTable:
+    """Users indexed by id and by username."""
+
+    def __init__(self, users: Iterable[Dict] = ()):
+        self._by_id: Dict[int, Dict] = {}
+        self._by_username: Dict[str, List[Dict]] = {}
+        self.load(users)
+
+    def load(self, users: Iterable[Dict]):
+        """Replace the whole table (e.g. from a snapshot)."""
+        self._by_id.clear()
+        self._by_username.clear()
+        for u in users:
+            self.add(u)
+
+    def add(self, user: Dict):
+        self._by_id[user["id"]] = user
+        # usernames are not unique; login keeps matching in signup order
+        self._by_username.setdefault(user["username"], []).append(user)
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        return self._by_id.get(user_id)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._by_id
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def authenticate(self, username: str, password: str) -> Optional[Dict]:
+        for u in self._by_username.get(username, ()):
+            if u["password"] == password:
+                return u
+        return None
+
+    def all(self) -> List[Dict]:
+        return list(self._by_id.values())
+
+
+class AppointmentTable:
+    """Appointments indexed by id, by user and by doctor -> occupied slot.
+
+    Iteration order is booking order, matching the old list.
+    """
+
+    def __init__(self, appointments: Iterable[Appointment] = ()):
+        self._by_id: Dict[int, Appointment] = {}
+        self._by_user: Dict[int, Dict[int, Appointment]] = {}
+        self._by_doctor: Dict[int, Dict[str, int]] = {}  # doctor_id -> {time_slot: appointment id}
+        self.load(appointments)
+
+    def load(self, appointments: Iterable[Appointment]):
+        """Replace the whole table (e.g. from a snapshot)."""
+        self._by_id.clear()
+        self._by_user.clear()
+        self._by_doctor.clear()
+        for a in appointments:
+            self.put(a)
+
+    def put(self, appt: Appointment):
+        """Insert or replace an appointment, keeping its position if it already exists."""
+        old = self._by_id.get(appt.id)
+        if old is not None:
+            self._unindex_slot(old)
+            if old.user_id != appt.user_id:
+                self._unindex_user(old)
+        self._by_id[appt.id] = appt
+        # re-assigning an existing key keeps its place, so replicas applying
+        # the same updates list a user's appointments in the same order
+        self._by_user.setdefault(appt.user_id, {})[appt.id] = appt
+        self._by_doctor.setdefault(appt.doctor_id, {})[appt.time_slot] = appt.id
+
+    def remove(self, appointment_id: int) -> Optional[Appointment]:
+        appt = self._by_id.pop(appointment_id, None)
+        if appt is not None:
+            self._unindex_user(appt)
+            self._unindex_slot(appt)
+        return appt
+
+    def reschedule(self, appt: Appointment, new_time_slot: str):
+        self._unindex_slot(appt)
+        appt.time_slot = sys.intern(new_time_slot)
+        self.put(appt)
+
+    def _unindex_user(self, appt: Appointment):
+        user_appts = self._by_user.get(appt.user_id)
+        if user_appts is not None:
+            user_appts.pop(appt.id, None)
+            if not user_appts:
+                del self._by_user[appt.user_id]
+
+    def _unindex_slot(self, appt: Appointment):
+        occupied = self._by_doctor.get(appt.doctor_id)
+        if occupied is not None and occupied.get(appt.time_slot) == appt.id:
+            del occupied[appt.time_slot]
+            if not occupied:
+                del self._by_doctor[appt.doctor_id]
+
+    def get(self, appointment_id: int) -> Optional[Appointment]:
+        return self._by_id.get(appointment_id)
+
+    def for_user(self, user_id: int) -> List[Appointment]:
+        return list(self._by_user.get(user_id, {}).values())
+
+    def for_user_after(self, user_id: int, after: Optional[int], n: int,
+                       where: Optional[Callable[[Appointment], object]] = None) -> List[Appointment]:
+        """Up to ``n`` of the user's appointments with id > ``after`` (and matching ``where``), in id order."""
+        appts = self._by_user.get(user_id, {})
+        ids = heapq.nsmallest(n, (i for i, a in appts.items()
+                                  if (after is None or i > after) and (where is None or where(a))))
+        return [appts[i] for i in ids]
+
+    def is_booked(self, doctor_id: int, time_slot: str) -> bool:
+        return time_slot in self._by_doctor.get(doctor_id, ())
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def all(self) -> List[Appointment]:
+        return list(self._by_id.values())
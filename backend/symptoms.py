@@ -0,0 +1,117 @@
+# symptoms.py
+"""Symptom -> diagnosis matching driven by a JSON rule table.
+
+Every keyword of every rule is compiled into one regex, factored as a
+prefix trie so matching cost does not grow with the number of rules. The
+text is scanned once, and at each position the longest keyword wins
+("chest pain" over "chest", "stomach pain" over "stomach"). Keywords match at
+the start of a word and may carry a suffix ("coughing" matches "cough").
+Each match adds its weight to every rule listing that keyword; the highest
+score wins and ties go to the rule listed first.
+
+The rule file is re-read when its mtime changes, so rules can be edited on
+a running node. A file that fails to load leaves the previous rules active.
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "symptom_rules.json")
+RELOAD_CHECK_INTERVAL = 1.0  # seconds between mtime checks
+
+
+class RuleSet:
+    """A compiled rule table."""
+
+    def __init__(self, table: Dict):
+        self.default = (table["default"]["diagnosis"], table["default"]["prescription"])
+        self.rules: List[Tuple[str, List[Dict]]] = []
+        self.weights: Dict[str, List[Tuple[int, float]]] = {}  # keyword -> [(rule index, weight)]
+        for i, rule in enumerate(table["rules"]):
+            self.rules.append((rule["diagnosis"], rule["prescription"]))
+            for keyword, weight in rule["keywords"].items():
+                self.weights.setdefault(keyword.lower(), []).append((i, float(weight)))
+        self.pattern = re.compile(r"\b(" + _trie_regex(self.weights) + r")\w*") if self.weights else None
+
+    def scores(self, text: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        if self.pattern is not None:
+            for m in self.pattern.finditer(text.lower()):
+                for rule, weight in self.weights[m.group(1)]:
+                    scores[rule] = scores.get(rule, 0.0) + weight
+        return scores
+
+    def diagnose(self, text: str) -> Tuple[str, List[Dict]]:
+        scores = self.scores(text)
+        if not scores:
+            diagnosis, prescription = self.default
+        else:
+            best = min(scores, key=lambda i: (-scores[i], i))
+            diagnosis, prescription = self.rules[best]
+        return diagnosis, [dict(p) for p in prescription]
+
+
+def _trie_regex(words) -> str:
+    """Regex matching exactly ``words``, preferring the longest at each position."""
+    trie: Dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}  # end of word
+
+    def emit(node: Dict) -> str:
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:  # a word ends here: longer continuations are tried first
+            body = "(?:" + body + ")?"
+        return body
+
+    return emit(trie)
+
+
+class SymptomMatcher:
+    """Hot-reloading wrapper around the RuleSet compiled from ``path``."""
+
+    def __init__(self, path: str = DEFAULT_RULES_PATH, log_prefix: str = ""):
+        self.path = path
+        self.log_prefix = log_prefix
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked = 0.0
+        self._rules = self._load()
+
+    def _load(self) -> RuleSet:
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, encoding="utf-8") as f:
+            rules = RuleSet(json.load(f))
+        self._mtime = mtime
+        return rules
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < RELOAD_CHECK_INTERVAL:
+            return
+        with self._lock:
+            if now - self._checked < RELOAD_CHECK_INTERVAL:
+                return
+            self._checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+                if mtime == self._mtime:
+                    return
+                self._mtime = mtime  # a broken file is reported once, not on every check
+                self._rules = self._load()
+                print(f"{self.log_prefix}Reloaded symptom rules from {self.path} ({len(self._rules.rules)} rules)")
+            except (OSError, ValueError, KeyError, TypeError, re.error) as e:
+                print(f"{self.log_prefix}⚠️ Keeping previous symptom rules, reload failed: {e}")
+
+    def diagnose(self, symptoms: List[str]) -> Tuple[str, List[Dict]]:
+        """(diagnosis, prescription) for a list of symptom strings."""
+        self._maybe_reload()
+        return self._rules.diagnose(" ".join(symptoms))
@@ -0,0 +1,152 @@
+# wal.py
+"""Append-only write-ahead log with group commit, plus compact snapshots for fast recovery.
+
+On disk a node's data directory holds one ``snapshot.json`` and a few log
+segments (``wal-00000001.log``, ...), each a JSON line per replication entry.
+Recovery loads the snapshot and replays only the entries after its seq; a
+checkpoint may keep the latest segment it covers, so a restarted coordinator
+still has recent deltas to send to replicas just behind it.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+_ROTATE = object()  # marker in the write buffer: switch to a new segment here
+
+
+class WriteAheadLog:
+    """Durable log of replication entries.
+
+    ``append`` only buffers; a single flusher thread writes whatever has
+    accumulated during ``commit_interval`` and fsyncs it once, so concurrent
+    writers share one fsync (group commit). ``sync`` blocks until everything
+    appended before the call is on disk.
+    """
+
+    def __init__(self, directory: str, commit_interval: float = 0.002):
+        self.directory = directory
+        self.commit_interval = commit_interval
+        os.makedirs(directory, exist_ok=True)
+        self._snapshot_path = os.path.join(directory, "snapshot.json")
+        self._cond = threading.Condition()
+        self._buffer: List = []
+        self._appended = 0   # items handed to append()/rotate()
+        self._durable = 0    # items written and fsynced
+        self._checkpoint_lock = threading.Lock()  # one checkpoint at a time: they share the tmp file and segments
+        segments = self._segments()
+        self._segment = (segments[-1][0] + 1) if segments else 1
+        self._file = None
+        self._thread = None
+
+    # ----- file layout -----
+    def _segment_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"wal-{index:08d}.log")
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        found = []
+        for path in glob.glob(os.path.join(self.directory, "wal-*.log")):
+            try:
+                found.append((int(os.path.basename(path)[4:-4]), path))
+            except ValueError:
+                continue
+        return sorted(found)
+
+    # ----- writing -----
+    def start(self):
+        if self._thread is None:
+            self._file = open(self._segment_path(self._segment), "a", encoding="utf-8")
+            self._thread = threading.Thread(target=self._flush_loop, name="wal-flusher", daemon=True)
+            self._thread.start()
+
+    def append(self, entry: Dict):
+        """Buffer an entry. Callers append under the state lock, so log order matches seq order."""
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._cond:
+            self._buffer.append(line)
+            self._appended += 1
+            self._cond.notify_all()
+
+    def sync(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything appended so far has been fsynced."""
+        with self._cond:
+            target = self._appended
+            return self._cond.wait_for(lambda: self._durable >= target, timeout=timeout)
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._buffer)
+            # let concurrent writers pile into the same batch
+            time.sleep(self.commit_interval)
+            with self._cond:
+                batch, self._buffer = self._buffer, []
+            lines = []
+            for item in batch:
+                if item is _ROTATE:
+                    self._write(lines)
+                    lines = []
+                    self._file.close()
+                    self._segment += 1
+                    self._file = open(self._segment_path(self._segment), "a", encoding="utf-8")
+                else:
+                    lines.append(item)
+            self._write(lines)
+            with self._cond:
+                self._durable += len(batch)
+                self._cond.notify_all()
+
+    def _write(self, lines: List[str]):
+        self._file.write("".join(lines))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    # ----- snapshots -----
+    def checkpoint(self, capture: Callable[[], Dict], keep: int = 0):
+        """Write a snapshot and drop the log segments it covers, except the newest `keep` of them.
+
+        The segment switch is queued *before* the state is captured, so every
+        entry left in the old segments is already reflected in the snapshot.
+        Concurrent calls (the periodic one and a snapshot received from the
+        coordinator) run one after the other.
+        """
+        with self._checkpoint_lock:
+            with self._cond:
+                self._buffer.append(_ROTATE)
+                self._appended += 1
+                self._cond.notify_all()
+            state = capture()
+            tmp = self._snapshot_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._snapshot_path)
+            self.sync()
+            covered = [path for index, path in self._segments() if index < self._segment]
+            for path in covered[:len(covered) - keep]:
+                os.remove(path)
+            return state["seq"]
+
+    # ----- recovery -----
+    def recover(self) -> Tuple[Optional[Dict], List[Dict]]:
+        """Latest snapshot (or None) and every entry still logged, in seq order.
+
+        Entries up to the snapshot's seq are already reflected in it.
+        """
+        snapshot = None
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        entries = []
+        for _, path in self._segments():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # torn write at the tail of a crashed segment
+                    entries.append(entry)
+        return snapshot, entries
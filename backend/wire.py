@@ -0,0 +1,102 @@
+# wire.py
+"""Negotiated encoding for coordinator -> replica traffic.
+
+Bodies are msgpack when the ``msgpack`` package is installed and JSON
+otherwise, optionally compressed with zstd (``zstandard``) or zlib. Every
+replica lists what it can decode in the ``X-Replication-Accept`` response
+header. The coordinator starts with plain JSON for a peer and switches to the
+best common format once it has seen that header, so mixed deployments keep
+working.
+"""
+import json
+import threading
+import zlib
+from typing import Dict, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # optional: JSON only
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional: zlib only
+    zstandard = None
+
+ACCEPT_HEADER = "X-Replication-Accept"
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COMPRESS_MIN_BYTES = 1024  # single deltas are smaller than this; compressing them only costs CPU
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+FORMATS = [MSGPACK, JSON] if msgpack else [JSON]            # preference order
+ENCODINGS = ["zstd", "deflate"] if zstandard else ["deflate"]
+DEFAULT = (JSON, None)
+
+_local = threading.local()  # zstd (de)compressor objects are not thread-safe
+
+
+class UnsupportedEncoding(ValueError):
+    pass
+
+
+def accept_value() -> str:
+    """Value this node advertises in ``ACCEPT_HEADER``."""
+    return ",".join(FORMATS) + ";" + ",".join(ENCODINGS)
+
+
+def choose(advertised: Optional[str]) -> Tuple[str, Optional[str]]:
+    """Best (format, encoding) both this node and a peer advertising ``advertised`` support."""
+    if not advertised:
+        return DEFAULT
+    formats, _, encodings = advertised.partition(";")
+    formats = {f.strip() for f in formats.split(",")}
+    encodings = {e.strip() for e in encodings.split(",")}
+    fmt = next((f for f in FORMATS if f in formats), JSON)
+    enc = next((e for e in ENCODINGS if e in encodings), None)
+    return fmt, enc
+
+
+def encode(obj, fmt: str = JSON, encoding: Optional[str] = None) -> Tuple[bytes, Dict[str, str]]:
+    """Serialize ``obj`` into a request body plus the headers that describe it."""
+    if fmt == MSGPACK:
+        body = msgpack.packb(obj, use_bin_type=True)
+    else:
+        body = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+    headers = {"Content-Type": fmt}
+    if encoding and len(body) >= COMPRESS_MIN_BYTES:
+        if encoding == "zstd":
+            body = _zstd().compress(body)
+        else:
+            body = zlib.compress(body, ZLIB_LEVEL)
+        headers["Content-Encoding"] = encoding
+    return body, headers
+
+
+def decode(body: bytes, content_type: Optional[str], content_encoding: Optional[str] = None):
+    """Inverse of ``encode``; raises UnsupportedEncoding for formats this node cannot read."""
+    if content_encoding == "zstd":
+        if zstandard is None:
+            raise UnsupportedEncoding("zstd")
+        body = zstandard.ZstdDecompressor().decompress(body)
+    elif content_encoding == "deflate":
+        body = zlib.decompress(body)
+    elif content_encoding not in (None, "", "identity"):
+        raise UnsupportedEncoding(content_encoding)
+    fmt = (content_type or JSON).split(";")[0].strip()
+    if fmt == MSGPACK:
+        if msgpack is None:
+            raise UnsupportedEncoding(fmt)
+        # doctor_ratings is keyed by int
+        return msgpack.unpackb(body, raw=False, strict_map_key=False)
+    if fmt == JSON:
+        return json.loads(body)
+    raise UnsupportedEncoding(fmt)
+
+
+def _zstd():
+    c = getattr(_local, "zstd", None)
+    if c is None:
+        c = _local.zstd = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return c
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Clock benchmark: the per-request clock sync vs hybrid logical clocks.
+
+1. Cost per request of the old async_clock_sync (a new thread plus an HTTP
+   /time call) against one HybridClock.now().
+2. How closely ClockSync tracks a reference clock that is offset by 50 ms and
+   runs fast, with and without the drift estimate, between syncs.
+
+The reference is a local HTTP server answering /time like a backend does.
+
+Usage: python benchmarks/bench_clock.py [seconds]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from clock import ClockSync, HybridClock  # noqa: E402
+
+OFFSET = 0.050  # reference clock ahead by 50 ms ...
+DRIFT = 0.005   # ... and gaining 5 ms per second
+INTERVAL = 2.0
+START = time.time()
+
+
+def reference_time():
+    now = time.time()
+    return now + OFFSET + DRIFT * (now - START)
+
+
+class TimeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps({"time": reference_time()}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def per_request_cost(port, n=200):
+    session = requests.Session()
+
+    def old_sync():
+        def _sync():
+            session.get(f"http://127.0.0.1:{port}/time", timeout=2.0)
+        t = threading.Thread(target=_sync, daemon=True)
+        t.start()
+        return t
+
+    t0 = time.perf_counter()
+    threads = [old_sync() for _ in range(n)]
+    for t in threads:
+        t.join()
+    old = (time.perf_counter() - t0) / n
+    clock = HybridClock()
+    t0 = time.perf_counter()
+    for _ in range(n * 100):
+        clock.now()
+    new = (time.perf_counter() - t0) / (n * 100)
+    print(f"per request: thread + /time call {old * 1e6:,.0f} us, HybridClock.now() {new * 1e6:.2f} us")
+
+
+def tracking_error(port, seconds, window):
+    sync = ClockSync(0, lambda: port, interval=INTERVAL, window=window)
+    sync.start()
+    errors = []
+    stop = time.time() + seconds
+    while time.time() < stop:
+        time.sleep(0.05)
+        if sync.status()["samples"]:
+            errors.append(abs(sync.physical() - reference_time()))
+    errors.sort()
+    label = "with drift estimate" if window > 1 else "offset only"
+    print(f"{label:<22}{errors[len(errors) // 2] * 1e3:>10.3f}{errors[int(len(errors) * 0.99)] * 1e3:>10.3f}"
+          f"{sync.status()['drift_ppm']:>13.0f}")
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 12.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TimeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    per_request_cost(port)
+    print(f"\nreference clock {OFFSET * 1e3:.0f} ms ahead, drifting {DRIFT * 1e6:.0f} ppm; sync every {INTERVAL:g} s")
+    print(f"{'':<22}{'p50 ms':>10}{'p99 ms':>10}{'drift ppm':>13}")
+    tracking_error(port, seconds, window=1)
+    tracking_error(port, seconds, window=8)
+
+
+if __name__ == "__main__":
+    main()
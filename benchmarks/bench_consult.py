@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Consult matching benchmark: the old if/elif substring chain vs the compiled
+rule table in backend/symptoms.py.
+
+Times diagnosis of random symptom lists with the shipped rules, then with
+the table padded by synthetic rules to show how each approach scales as
+rules are added. Also lists inputs where the two disagree, which is where
+the chain's rule order picked the wrong diagnosis.
+
+Usage: python benchmarks/bench_consult.py [iterations]
+"""
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from symptoms import DEFAULT_RULES_PATH, RuleSet  # noqa: E402
+
+SYMPTOMS = ["fever", "high temperature", "cough", "cold", "headache", "migraine", "chest pain",
+            "stomach pain", "sore throat", "rash", "itching", "sugar", "blood pressure", "bone pain",
+            "weakness", "asthma", "breathing trouble", "diarrhea", "joint pain", "tiredness", "dizziness"]
+
+
+def load_table():
+    with open(DEFAULT_RULES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def chain_rules(table):
+    """The old handler's shape: rules tried in order, first substring hit wins."""
+    return [(list(r["keywords"]), r["diagnosis"]) for r in table["rules"]]
+
+
+def chain_diagnose(rules, default, symptoms):
+    text = " ".join(symptoms).lower()
+    for keywords, diagnosis in rules:
+        if any(k in text for k in keywords):
+            return diagnosis
+    return default
+
+
+def padded(table, extra):
+    table = dict(table)
+    table["rules"] = [{"diagnosis": f"Condition {i}", "keywords": {f"zz{i}symptom": 1, f"zz{i} ache": 2},
+                       "prescription": []} for i in range(extra)] + table["rules"]
+    return table
+
+
+def timed(fn, inputs):
+    t0 = time.perf_counter()
+    for s in inputs:
+        fn(s)
+    return (time.perf_counter() - t0) / len(inputs) * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = random.Random(0)
+    inputs = [rng.sample(SYMPTOMS, rng.randint(1, 3)) for _ in range(iterations)]
+    base = load_table()
+    default = base["default"]["diagnosis"]
+
+    print(f"{'rules':>7}{'chain us':>12}{'compiled us':>14}")
+    for extra in (0, 100, 1000):
+        table = padded(base, extra)
+        chain = chain_rules(table)
+        compiled = RuleSet(table)
+        t_chain = timed(lambda s: chain_diagnose(chain, default, s), inputs)
+        t_compiled = timed(lambda s: compiled.diagnose(" ".join(s)), inputs)
+        print(f"{len(table['rules']):>7}{t_chain:>12.2f}{t_compiled:>14.2f}")
+
+    compiled = RuleSet(base)
+    chain = chain_rules(base)
+    print("\nwhere rule order changed the answer:")
+    seen = set()
+    for s in inputs:
+        key = tuple(s)
+        old, new = chain_diagnose(chain, default, s), compiled.diagnose(" ".join(s))[0]
+        if old != new and key not in seen and len(s) == 1:
+            seen.add(key)
+            print(f"  {', '.join(s):<24} chain: {old:<22} compiled: {new}")
+
+
+if __name__ == "__main__":
+    main()
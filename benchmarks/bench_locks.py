@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Lock contention benchmark: one global lock vs per-collection reader/writer locks.
+
+Pharmacy writer threads update medicine stock while reader threads list
+appointments and read the medicine catalog, mirroring the backend's mix of
+/buy traffic and read endpoints. Each write holds its lock for a short
+simulated I/O pause (the console logging done while locked), which is where
+the single lock hurt most.
+
+Usage: python benchmarks/bench_locks.py [seconds]
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from locks import RWLock  # noqa: E402
+
+WRITERS = 4
+READERS = 8
+WRITE_HOLD = 0.0005   # seconds of I/O inside a write critical section
+THINK_TIME = 0.0005   # pause between requests issued by each thread
+APPOINTMENTS = [{"id": i, "user_id": i % 50, "doctor_id": i % 15} for i in range(2000)]
+MEDICINES = [{"id": i, "stock": 1000} for i in range(20)]
+
+
+class GlobalLock:
+    """The old layout: every collection behind one threading.Lock."""
+    def __init__(self):
+        self._lock = threading.Lock()
+    def read(self, collection):
+        return self._lock
+    def write(self, collection):
+        return self._lock
+
+
+class PerCollection:
+    """The new layout: a reader/writer lock per collection."""
+    def __init__(self):
+        self._locks = {"appointments": RWLock(), "medicines": RWLock()}
+    def read(self, collection):
+        return self._locks[collection].read()
+    def write(self, collection):
+        return self._locks[collection].write()
+
+
+def run(scheme, seconds):
+    stop = time.time() + seconds
+    latencies = []
+    writes = [0]
+    lat_lock = threading.Lock()
+
+    def writer():
+        n = 0
+        while time.time() < stop:
+            with scheme.write("medicines"):
+                MEDICINES[n % 20]["stock"] -= 1
+                time.sleep(WRITE_HOLD)
+            n += 1
+            time.sleep(THINK_TIME)
+        with lat_lock:
+            writes[0] += n
+
+    def reader(i):
+        local = []
+        while time.time() < stop:
+            t0 = time.perf_counter()
+            if i % 2:
+                with scheme.read("appointments"):
+                    [a for a in APPOINTMENTS[:200] if a["user_id"] == 7]
+            else:
+                with scheme.read("medicines"):
+                    [m.copy() for m in MEDICINES]
+            local.append(time.perf_counter() - t0)
+            time.sleep(THINK_TIME)
+        with lat_lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=writer) for _ in range(WRITERS)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(READERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    return len(latencies) / seconds, writes[0] / seconds, pct(0.5), pct(0.99)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    print(f"{WRITERS} writers, {READERS} readers, {seconds:.0f}s per run\n")
+    print(f"{'scheme':<16}{'reads/s':>12}{'writes/s':>12}{'read p50 ms':>14}{'read p99 ms':>14}")
+    for name, scheme in (("global lock", GlobalLock()), ("per-collection", PerCollection())):
+        reads, writes, p50, p99 = run(scheme, seconds)
+        print(f"{name:<16}{reads:>12.0f}{writes:>12.0f}{p50:>14.3f}{p99:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
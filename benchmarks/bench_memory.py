@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: dict appointments vs slotted Appointment records.
+
+Builds a state snapshot of N appointments, serializes it the way /push_state
+receives it, then loads it both ways: the old path (json-decoded dicts,
+copied one by one) and the new one (Appointment.from_dict). Roughly half the
+appointments carry symptoms and a prescription, as after a consult. Retained
+memory is measured with tracemalloc, after the decoded payload is dropped.
+
+Usage: python benchmarks/bench_memory.py [appointments]
+"""
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from records import Appointment  # noqa: E402
+
+SLOTS = ["09:00", "09:30", "10:00", "10:30", "11:00", "12:00", "13:00", "14:30", "15:00", "16:00"]
+SYMPTOMS = ["fever", "cough", "headache", "sore throat", "rash", "stomach pain", "weakness"]
+
+
+def snapshot_json(n):
+    rng = random.Random(0)
+    appts = []
+    for i in range(n):
+        a = {"id": i, "user_id": rng.randrange(n // 10 or 1), "doctor_id": rng.randrange(15),
+             "time_slot": rng.choice(SLOTS), "symptoms": [], "prescription": []}
+        if i % 2:
+            a["symptoms"] = rng.sample(SYMPTOMS, 2)
+            a["prescription"] = [{"medicine_id": rng.randrange(20), "quantity": rng.randint(1, 2)}]
+        appts.append(a)
+    return json.dumps({"appointments": appts})
+
+
+def load_dicts(payload):
+    return {a["id"]: a.copy() for a in json.loads(payload)["appointments"]}
+
+
+def load_records(payload):
+    return {a["id"]: Appointment.from_dict(a) for a in json.loads(payload)["appointments"]}
+
+
+def measure(loader, payload):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    table = loader(payload)
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del table
+    return retained, elapsed
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    payload = snapshot_json(n)
+    print(f"{n:,} appointments, snapshot payload {len(payload) / 2**20:.0f} MiB\n")
+    print(f"{'representation':<22}{'retained MiB':>14}{'bytes/appt':>12}{'load s':>10}")
+    results = {}
+    for name, loader in (("dicts", load_dicts), ("slotted records", load_records)):
+        retained, elapsed = measure(loader, payload)
+        results[name] = retained
+        print(f"{name:<22}{retained / 2**20:>14.1f}{retained / n:>12.0f}{elapsed:>10.2f}")
+    print(f"\nrecords use {results['slotted records'] / results['dicts']:.0%} of the dict footprint")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+List endpoint benchmark: one JSON body vs cursor pages vs an NDJSON stream.
+
+Serves a synthetic appointment history through the same fetch/page/stream
+helpers the list endpoints use, and reports time to the first byte, total
+time, peak memory and how long the collection lock is held at a stretch.
+
+Usage: python benchmarks/bench_paging.py [items]
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+import paging  # noqa: E402
+
+LONGEST_HOLD = [0.0]
+
+
+def make_items(n):
+    return [{"id": i, "user_id": 1, "doctor_id": i % 15, "time_slot": f"2026-01-{i % 28 + 1:02d} 10:00",
+             "symptoms": "fever and cough", "prescription": [{"medicine_id": i % 20, "quantity": 1}]}
+            for i in range(n)]
+
+
+def fetcher(items):
+    def fetch(after, n):
+        t0 = time.perf_counter()
+        start = 0 if after is None else after + 1
+        rows = [(it["id"], dict(it)) for it in items[start:start + n]]
+        LONGEST_HOLD[0] = max(LONGEST_HOLD[0], time.perf_counter() - t0)
+        return rows
+    return fetch
+
+
+def run(label, produce):
+    LONGEST_HOLD[0] = 0.0
+    t0 = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in produce():
+        if first is None:
+            first = time.perf_counter() - t0
+        size += len(chunk)
+    total = time.perf_counter() - t0
+    hold = LONGEST_HOLD[0]
+    tracemalloc.start()  # second pass: tracing slows allocation too much to time the first
+    for _ in produce():
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<14}{first * 1e3:>12.1f}{total * 1e3:>11.1f}{peak / 2**20:>10.1f}"
+          f"{hold * 1e3:>11.2f}{size / 2**20:>9.1f}")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    items = make_items(n)
+    fetch = fetcher(items)
+
+    def full():
+        rows = fetch(None, n)  # the old handlers built the list under the lock
+        yield json.dumps({"appointments": [item for _, item in rows]}).encode()
+
+    def pages():
+        after = None
+        while True:
+            page, cursor = paging.page(fetch, after, paging.MAX_LIMIT)
+            yield json.dumps({"appointments": page, "next_cursor": cursor}).encode()
+            if cursor is None:
+                return
+            after = paging.decode_cursor(cursor)
+
+    print(f"{n:,} items")
+    print(f"{'mode':<14}{'first ms':>12}{'total ms':>11}{'peak MB':>10}{'lock ms':>11}{'MB out':>9}")
+    run("one body", full)
+    run("cursor pages", pages)
+    run("ndjson", lambda: paging.stream(fetch, None))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Write path benchmark: one write at a time vs the group-commit write pipeline.
+
+Client threads sell stock through a real WriteAheadLog in a temporary
+directory. "per write" is the old coordinator path: take the lock, mutate,
+append, release, then wait for the WAL's own group commit. "pipeline" hands
+the same mutation to backend/pipeline.py. Reports throughput, latency, how
+many fsyncs were issued and that no unit of stock was sold twice.
+
+Usage: python benchmarks/bench_pipeline.py [writes] [clients]
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from locks import RWLock, locked  # noqa: E402
+from pipeline import WritePipeline  # noqa: E402
+from wal import WriteAheadLog  # noqa: E402
+
+FSYNCS = [0]
+_fsync = os.fsync
+
+
+def counting_fsync(fd):
+    FSYNCS[0] += 1
+    _fsync(fd)
+
+
+os.fsync = counting_fsync
+
+
+def sell(stock, wal, seq, item):
+    """All or nothing, like main.sell: check both items, then take one unit of each."""
+    if stock[item] < 1 or stock[item + 1] < 1:
+        return False
+    stock[item] -= 1
+    stock[item + 1] -= 1
+    seq[0] += 1
+    wal.append({"seq": seq[0], "op": "sale_add", "data": {"medicine_id": item}})
+    return True
+
+
+def run(label, writes, clients, use_pipeline):
+    directory = tempfile.mkdtemp(prefix="bench-pipeline-")
+    wal = WriteAheadLog(directory, commit_interval=0.0 if use_pipeline else 0.002)
+    wal.start()
+    lock = RWLock("medicines")
+    stock = [writes // 20] * 20  # enough for about half the writes, so some must fail
+    seq = [0]
+    pipeline = WritePipeline(lambda reads, w: locked(reads, w, (lock,)), wal.sync)
+    pipeline.start()
+
+    def one(i):
+        t0 = time.perf_counter()
+        item = i % 19
+        if use_pipeline:
+            ok = pipeline.submit(lambda: sell(stock, wal, seq, item), writes=[lock])
+        else:
+            with lock.write():
+                ok = sell(stock, wal, seq, item)
+            wal.sync()
+        return ok, time.perf_counter() - t0
+
+    FSYNCS[0] = 0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(clients) as ex:
+        results = list(ex.map(one, range(writes)))
+    elapsed = time.perf_counter() - t0
+    latencies = sorted(lat for _, lat in results)
+    sold = sum(ok for ok, _ in results)
+    consistent = all(s >= 0 for s in stock) and sold == seq[0]
+    print(f"{label:<11}{writes / elapsed:>10.0f}{latencies[len(latencies) // 2] * 1e3:>10.2f}"
+          f"{latencies[int(len(latencies) * 0.99)] * 1e3:>10.2f}{FSYNCS[0]:>9}{sold:>7}{str(consistent):>12}")
+    if use_pipeline:
+        print(f"{'':<11}batches: {pipeline.metrics()}")
+
+
+def main():
+    writes = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    print(f"{writes:,} writes from {clients} clients")
+    print(f"{'mode':<11}{'writes/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'fsyncs':>9}{'sold':>7}{'consistent':>12}")
+    run("per write", writes, clients, use_pipeline=False)
+    run("pipeline", writes, clients, use_pipeline=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Write acknowledgement benchmark: what each consistency level costs.
+
+Drives the Replicator from backend/replication.py against simulated
+replicas, each answering a push after a fixed delay (one of them slow), and
+times a write from its log append until Replicator.wait_acked is satisfied
+for the level. Pushes go out in parallel, so "one" and "majority" wait for
+the fastest replicas rather than the slow one.
+
+Usage: python benchmarks/bench_quorum.py [writes]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from replication import CONSISTENCY_LEVELS, ReplicationLog, Replicator, replica_acks_needed  # noqa: E402
+
+DELAYS = [0.001, 0.002, 0.030, 0.002]  # per replica push round trip; the third one is slow
+
+
+def run(group_size, level, writes):
+    ports = list(range(group_size - 1))
+    log = ReplicationLog()
+
+    def push(port, seq):
+        target = log.last_seq
+        time.sleep(DELAYS[port])
+        return target
+
+    running = [True]
+    replicator = Replicator(log, ports, push, active=lambda: running[0], max_in_flight=len(ports))
+    replicator.start()
+    needed = replica_acks_needed(level, group_size)
+    latencies = []
+    for i in range(writes):
+        t0 = time.perf_counter()
+        seq = log.append("rating_add", doctor_id=i % 15, rating=5)["seq"]
+        replicator.notify()
+        if needed and not replicator.wait_acked(seq, needed, timeout=5.0):
+            raise RuntimeError("ack timed out")
+        latencies.append(time.perf_counter() - t0)
+    running[0] = False
+    while replicator.metrics()["in_flight"]:  # let the slow replica's last push finish
+        time.sleep(0.01)
+    latencies.sort()
+    print(f"{group_size:>6}{level:>10}{needed:>7}{latencies[len(latencies) // 2] * 1e3:>10.2f}"
+          f"{latencies[int(len(latencies) * 0.99)] * 1e3:>10.2f}")
+
+
+def main():
+    writes = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    print(f"{writes} sequential writes; replica round trips {[f'{d * 1e3:g} ms' for d in DELAYS]}")
+    print(f"{'nodes':>6}{'level':>10}{'acks':>7}{'p50 ms':>10}{'p99 ms':>10}")
+    for group_size in (3, 5):
+        for level in CONSISTENCY_LEVELS:
+            run(group_size, level, writes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Sharding benchmark: how evenly the consistent-hash ring in backend/sharding.py
+spreads keys, how many move when a shard is added, and what a lookup costs.
+
+With full replication every node applies every write; with n shards each
+node applies only its shard's share, so the "busiest shard" column is the
+fraction of all writes the most loaded replica group has to absorb.
+
+Usage: python benchmarks/bench_ring.py [keys]
+"""
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from sharding import HashRing, doctor_key, id_key  # noqa: E402
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    keys = [id_key(i) for i in range(n)]
+
+    print(f"{n:,} keys")
+    print(f"{'shards':>7}{'vnodes':>8}{'busiest shard':>15}{'ideal':>8}{'moved on +1':>13}{'ideal':>8}{'lookup ns':>11}")
+    for shards in (2, 3, 4, 8):
+        for vnodes in (16, 64, 256):
+            ring = HashRing(shards, vnodes)
+            t0 = time.perf_counter()
+            placed = [ring.shard_for(k) for k in keys]
+            lookup = (time.perf_counter() - t0) / n * 1e9
+            busiest = max(Counter(placed).values()) / n
+            grown = HashRing(shards + 1, vnodes)
+            moved = sum(grown.shard_for(k) != s for k, s in zip(keys, placed)) / n
+            print(f"{shards:>7}{vnodes:>8}{busiest:>14.1%}{1 / shards:>9.1%}"
+                  f"{moved:>12.1%}{1 / (shards + 1):>9.1%}{lookup:>11.0f}")
+
+    ring = HashRing(3)
+    doctors = Counter(ring.shard_for(doctor_key(d)) for d in range(1000))
+    print("\n1000 doctors over 3 shards:", dict(sorted(doctors.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Sales report benchmark: the columnar ledger's aggregations at scale.
+
+Fills a SalesLedger with synthetic sales spread over 90 days and times each
+report the backend serves (/reports/sales/by_medicine, by_window, top), next
+to the old per-dict Python loop on a slice of the same data for comparison.
+
+Usage: python benchmarks/bench_sales.py [rows]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+import sales  # noqa: E402
+
+MEDICINES = 20
+DAYS = 90
+LOOP_ROWS = 1_000_000  # the dict loop is too slow to run on the full ledger
+
+
+def build(rows):
+    rng = np.random.default_rng(0)
+    ledger = sales.SalesLedger(rows)
+    now = time.time()
+    ledger.extend(rng.integers(0, MEDICINES, rows, dtype=np.int32),
+                  rng.integers(1, 5, rows, dtype=np.int32),
+                  rng.choice([2, 5, 10, 20, 50, 75], rows).astype(np.float64),
+                  now - rng.random(rows) * DAYS * 86400)
+    return ledger, now
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def dict_loop(records):
+    totals = {}
+    for r in records:
+        agg = totals.setdefault(r["medicine_id"], [0, 0])
+        agg[0] += r["sold_qty"]
+        agg[1] += r["sold_qty"] * r["price"]
+    return totals
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000_000
+    t0 = time.perf_counter()
+    ledger, now = build(rows)
+    print(f"{rows:,} sales built in {time.perf_counter() - t0:.1f}s "
+          f"({sum(c.nbytes for c in ledger.columns()) / 2**20:.0f} MiB of columns)\n")
+
+    cols = ledger.columns()
+    week = now - 7 * 86400
+    cases = [
+        ("by_medicine (all)", lambda: sales.by_medicine(cols)),
+        ("by_medicine (last 7 days)", lambda: sales.by_medicine(cols, week)),
+        ("by_window day", lambda: sales.by_window(cols, 86400)),
+        ("by_window hour, 1 medicine", lambda: sales.by_window(cols, 3600, medicine_id=3)),
+        ("top 5 by revenue", lambda: sales.top(cols, 5)),
+    ]
+    print(f"{'report':<30}{'ms':>10}")
+    for name, fn in cases:
+        print(f"{name:<30}{timed(fn):>10.1f}")
+
+    n = min(rows, LOOP_ROWS)
+    head = sales.SalesLedger(n)
+    head.extend(*(c[:n] for c in cols))
+    records = head.records()
+    loop_ms = timed(lambda: dict_loop(records), repeat=1)
+    print(f"\ndict loop over {n:,} rows: {loop_ms:.1f} ms "
+          f"(~{loop_ms * rows / n:.0f} ms extrapolated to {rows:,})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Scheduling benchmark: next free slots across a large roster.
+
+Builds thousands of doctors with weekly templates, books most of their dated
+slots for the next few months into an AppointmentTable, then times the
+"next N free slots for specialty X" query and single-day availability
+lookups the backend serves.
+
+Usage: python benchmarks/bench_schedule.py [doctors] [days]
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from records import Appointment  # noqa: E402
+from schedule import Schedule, slot_key  # noqa: E402
+from store import AppointmentTable  # noqa: E402
+
+SPECIALTIES = 20
+TIMES = [f"{h:02d}:{m:02d}" for h in range(9, 17) for m in (0, 30)]
+BOOKED_FRACTION = 0.9
+
+
+def build(doctors, days):
+    rng = random.Random(0)
+    roster = []
+    for i in range(doctors):
+        weekly = {wd: rng.sample(TIMES, 8) for wd in ("mon", "tue", "wed", "thu", "fri")}
+        roster.append({"id": i, "name": f"Dr. {i}", "specialty": f"spec{i % SPECIALTIES}",
+                       "available_slots": [], "weekly_template": weekly})
+    schedule = Schedule(roster)
+    table = AppointmentTable()
+    today = date.today()
+    aid = 0
+    for d in roster:
+        for offset in range(days):
+            day = today + timedelta(days=offset)
+            for t in schedule.slots_on(d["id"], day):
+                if rng.random() < BOOKED_FRACTION:
+                    table.put(Appointment(aid, aid % 5000, d["id"], slot_key(day, t)))
+                    aid += 1
+    return schedule, table
+
+
+def timed(fn, repeat=20):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    doctors = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 90
+    t0 = time.perf_counter()
+    schedule, table = build(doctors, days)
+    print(f"{doctors:,} doctors, {days} days, {len(table):,} booked appointments "
+          f"(built in {time.perf_counter() - t0:.1f}s)\n")
+    now = datetime.now()
+    tomorrow = date.today() + timedelta(days=1)
+    spec = schedule.doctors_with("spec3")
+    cases = [
+        (f"next 10 free, 1 specialty ({len(spec)} doctors)", lambda: schedule.next_free(spec, 10, now, days, table.is_booked)),
+        ("next 100 free, 1 specialty", lambda: schedule.next_free(spec, 100, now, days, table.is_booked)),
+        (f"next 10 free, all {doctors:,} doctors", lambda: schedule.next_free(range(doctors), 10, now, days, table.is_booked)),
+        ("free slots of 1 doctor on 1 day", lambda: schedule.free_on(42, tomorrow, table.is_booked)),
+    ]
+    print(f"{'query':<44}{'ms':>10}")
+    for name, fn in cases:
+        print(f"{name:<44}{timed(fn):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Medicine search benchmark: the trigram index vs the old lowercase-and-scan.
+
+Builds a synthetic formulary (brand-like names with strengths and forms),
+indexes it, and times type-ahead prefixes, mid-word substrings and
+misspelled queries for one page of results, next to the old list scan.
+
+Usage: python benchmarks/bench_search.py [skus]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from search import SearchIndex  # noqa: E402
+
+ONSETS = ["b", "c", "d", "f", "g", "l", "m", "n", "p", "pr", "r", "s", "t", "th", "v", "x", "z", "cl", "st", "tr"]
+VOWELS = ["a", "e", "i", "o", "u", "y", "io", "ea"]
+CODAS = ["", "", "l", "n", "m", "r", "x", "s", "ne", "le", "mol", "cin", "zole", "fen", "lin", "pril", "tan"]
+FORMS = ["tablet", "capsule", "syrup", "injection", "cream", "drops"]
+QUERIES = ["p", "par", "parace", "cetam", "syrup", "amoxicillin 250", "paracetmol", "amoxcilin", "zzqx"]
+PAGE = 20
+
+
+def formulary(n):
+    rng = random.Random(0)
+    names = []
+    for _ in range(n):
+        stem = "".join(rng.choice(ONSETS) + rng.choice(VOWELS) + rng.choice(CODAS)
+                       for _ in range(rng.randint(2, 4))).capitalize()
+        names.append(f"{stem} {rng.choice([5, 10, 25, 50, 100, 250, 500])}mg {rng.choice(FORMS)}")
+    names[0] = "Paracetamol 500mg tablet"
+    names[1] = "Amoxicillin 250mg capsule"
+    return names
+
+
+def scan(names, q):
+    return [i for i, n in enumerate(names) if q.lower() in n.lower()][:PAGE]
+
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    names = formulary(n)
+    index = SearchIndex()
+    t0 = time.perf_counter()
+    index.build(enumerate(names))
+    print(f"{n:,} SKUs indexed in {time.perf_counter() - t0:.2f}s\n")
+    print(f"{'query':<18}{'page':>6}{'more':>6}{'index ms':>10}{'scan ms':>10}  top hit")
+    for q in QUERIES:
+        ids, more = index.search(q, PAGE)
+        t_index = timed(lambda: index.search(q, PAGE), 50)
+        t_scan = timed(lambda: scan(names, q), 5)
+        print(f"{q:<18}{len(ids):>6}{'yes' if more else 'no':>6}{t_index:>10.3f}{t_scan:>10.3f}  "
+              f"{names[ids[0]] if ids else '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Replication wire format benchmark.
+
+Encodes and decodes a full state snapshot (what /push_state ships) and a
+burst-sized batch of deltas (what /apply_deltas ships) with every format and
+compression the node supports, reporting body size and CPU time per
+round trip. msgpack and zstd rows only appear when those packages are
+installed.
+
+Usage: python benchmarks/bench_wire.py [appointments]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+import wire  # noqa: E402
+
+SLOTS = ["09:00", "10:00", "11:00", "12:00", "13:00", "15:00"]
+
+
+def snapshot(n):
+    rng = random.Random(0)
+    return {
+        "seq": n,
+        "medicines": [{"id": i, "name": f"Medicine {i}", "stock": 10, "price": 20 + i} for i in range(20)],
+        "users": [{"id": i, "username": f"user{i}", "password": "secret"} for i in range(n // 10)],
+        "appointments": [{"id": i, "user_id": rng.randrange(n // 10), "doctor_id": rng.randrange(15),
+                          "time_slot": rng.choice(SLOTS), "symptoms": ["fever"],
+                          "prescription": [{"medicine_id": 0, "quantity": 2}]} for i in range(n)],
+        "doctor_ratings": {d: [rng.randint(1, 5) for _ in range(50)] for d in range(15)},
+        "medicine_sales": {"medicine_id": [rng.randrange(20) for _ in range(n)], "sold_qty": [1] * n,
+                           "price": [20.0] * n, "timestamp": [1.7e9 + i for i in range(n)]},
+    }
+
+
+def deltas(k):
+    return {"entries": [{"seq": i, "ts": 1.7e9 + i, "op": "medicine_put",
+                         "medicine": {"id": i % 20, "name": "Paracetamol", "stock": 10, "price": 20}}
+                        for i in range(k)]}
+
+
+def bench(payload, fmt, enc, repeat):
+    body, headers = wire.encode(payload, fmt, enc)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        body, headers = wire.encode(payload, fmt, enc)
+    t_enc = (time.perf_counter() - t0) / repeat
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        wire.decode(body, headers["Content-Type"], headers.get("Content-Encoding"))
+    t_dec = (time.perf_counter() - t0) / repeat
+    return len(body), t_enc * 1000, t_dec * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    combos = [(fmt, enc) for fmt in wire.FORMATS for enc in [None] + wire.ENCODINGS]
+    for title, payload, repeat in ((f"snapshot ({n:,} appointments)", snapshot(n), 3),
+                                   ("delta batch (64 entries)", deltas(64), 500)):
+        print(title)
+        print(f"  {'format':<34}{'bytes':>12}{'encode ms':>12}{'decode ms':>12}")
+        for fmt, enc in combos:
+            size, t_enc, t_dec = bench(payload, fmt, enc, repeat)
+            print(f"  {fmt + ' + ' + (enc or 'identity'):<34}{size:>12,}{t_enc:>12.3f}{t_dec:>12.3f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -45,7 +45,7 @@ export default function BookAppointment() {
       const res = await api("/book", "POST", { user_id: user.id, doctor_id: doctorId, time_slot: selectedSlot });
       if (res.status === "SUCCESS") {
         const docName = doctorId != null ? doctorMap[doctorId] : "Doctor";
-        alert(`Appointment booked with ${docName}`);
+        alert(`Appointment booked with ${docName} on ${res.time_slot}`);
         navigate("/patient");
       }
       else { setMessage(res.message || "Failed to book appointment"); }
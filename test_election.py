@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Election tests: which node takes over, run against in-process nodes
+(no servers; peer calls go straight to the other Election objects)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+from election import Election  # noqa: E402
+
+
+class Node(Election):
+    """An Election whose peer calls reach the other nodes of `cluster` directly."""
+
+    def __init__(self, port, cluster, seq, last_term, term):
+        self.cluster = cluster
+        self.log = {"seq": seq, "term": last_term}
+        self.nominated = []
+        super().__init__(port, [p for p in cluster["ports"] if p != port], lambda: self.log["seq"],
+                         lambda leader: None, last_term=lambda: self.log["term"])
+        self.term = term
+        cluster[port] = self
+
+    def _get(self, port, path):
+        assert path == "/election/status"
+        return self.cluster[port].status()
+
+    def _post(self, port, path, payload=None):
+        node = self.cluster[port]
+        if path == "/election/heartbeat":
+            return node.on_heartbeat(payload["term"], payload["leader"], payload["seq"], payload["last_term"])
+        assert path == "/election/nominate"
+        self.nominated.append(port)
+        node.nominate()
+        return {"status": "ok"}
+
+
+def make_cluster(*nodes):
+    cluster = {"ports": [port for port, *_ in nodes]}
+    for port, seq, last_term, term in nodes:
+        Node(port, cluster, seq, last_term, term)
+    return cluster
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_newer_term_beats_longer_log():
+    # 8003 led term 1 and kept two writes nobody acknowledged; 8001 and 8002
+    # have since acknowledged writes of term 2, but their logs are shorter
+    cluster = make_cluster((8001, 8, 2, 2), (8002, 8, 2, 2), (8003, 10, 1, 2))
+    stale = cluster[8003]
+    stale._elect()
+    wait_for(lambda: stale.nominated)
+    assert stale.nominated == [8002]
+    assert not stale.is_leader()
+    winner = cluster[8002]
+    winner._elect()
+    assert winner.is_leader() and winner.term == 3
+    winner._send_heartbeats()
+    assert all(cluster[p].leader == 8002 for p in cluster["ports"])
+    assert winner.has_majority_lease()
+
+
+def test_longer_log_wins_within_a_term():
+    cluster = make_cluster((8001, 9, 2, 2), (8002, 8, 2, 2), (8003, 8, 2, 2))
+    cluster[8003]._elect()
+    wait_for(lambda: cluster[8003].nominated)
+    assert cluster[8003].nominated == [8001]
+
+
+def test_heartbeat_from_stale_log_is_refused():
+    cluster = make_cluster((8001, 8, 2, 3), (8003, 10, 1, 3))
+    node = cluster[8001]
+    with node._lock:
+        node._set_leader(8001)
+    # both think they lead term 3: the one whose last entry has the later term stays
+    assert not node.on_heartbeat(3, 8003, 10, 1)["ok"]
+    assert node.is_leader()
+    assert node.on_heartbeat(3, 8003, 10, 2)["ok"]
+    assert node.leader == 8003
+
+
+def test_status_reports_last_term():
+    cluster = make_cluster((8001, 8, 2, 3))
+    status = cluster[8001].status()
+    assert (status["seq"], status["last_term"], status["term"]) == (8, 2, 3)
+
+
+def test_term_survives_restart(tmp_path):
+    path = str(tmp_path / "term")
+    node = Election(8001, [], lambda: 0, lambda leader: None, term_path=path)
+    node._elect()
+    assert node.is_leader() and node.term == 1
+    assert Election(8001, [], lambda: 0, lambda leader: None, term_path=path).term == 1